@@ -0,0 +1,46 @@
+import sqlite3
+import sys
+
+if __name__ == "__main__":
+    """
+    Run migration for the image metadata recorded on upload.
+
+    This program will add the "width", "height", "image_format" and
+    "orientation" columns to the "file" table. They are null for existing
+    images until `flask backfill-images` is run. It will also create the
+    "file_derivative" table, which stores the responsive copies of images
+    (existing images have none, and are served without them).
+
+    FILEPATH: path to the SQLITE database file
+    """
+    if len(sys.argv) != 2:
+        print("Usage: python run_migration.py [FILEPATH]")
+        sys.exit(1)
+    conn = sqlite3.connect(sys.argv[1])
+    cur = conn.cursor()
+    cur.execute("ALTER TABLE file ADD COLUMN width INTEGER")
+    cur.execute("ALTER TABLE file ADD COLUMN height INTEGER")
+    cur.execute("ALTER TABLE file ADD COLUMN image_format VARCHAR")
+    cur.execute("ALTER TABLE file ADD COLUMN orientation INTEGER")
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS file_derivative (
+            id INTEGER NOT NULL,
+            file_id VARCHAR NOT NULL,
+            filename VARCHAR NOT NULL,
+            width INTEGER NOT NULL,
+            height INTEGER NOT NULL,
+            format VARCHAR NOT NULL,
+            size INTEGER NOT NULL,
+            PRIMARY KEY (id),
+            FOREIGN KEY(file_id) REFERENCES file (id),
+            UNIQUE (filename)
+        )
+        """
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS ix_file_derivative_file_id "
+        "ON file_derivative (file_id)"
+    )
+    conn.commit()
+    conn.close()
@@ -0,0 +1,42 @@
+import sqlite3
+import sys
+
+if __name__ == "__main__":
+    """
+    Run migration for the background job queue.
+
+    This program will create the "job" table, which stores the jobs run by
+    `job_queue` (e.g. sending emails), and its index on ("status",
+    "run_after").
+
+    FILEPATH: path to the SQLITE database file
+    """
+    if len(sys.argv) != 2:
+        print("Usage: python run_migration.py [FILEPATH]")
+        sys.exit(1)
+    conn = sqlite3.connect(sys.argv[1])
+    cur = conn.cursor()
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS job (
+            id INTEGER NOT NULL,
+            kind VARCHAR NOT NULL,
+            payload_json VARCHAR NOT NULL,
+            idempotency_key VARCHAR,
+            status VARCHAR(9) NOT NULL,
+            attempts INTEGER NOT NULL,
+            max_attempts INTEGER NOT NULL,
+            run_after DATETIME NOT NULL,
+            last_error VARCHAR,
+            created_at DATETIME NOT NULL,
+            updated_at DATETIME NOT NULL,
+            PRIMARY KEY (id),
+            UNIQUE (idempotency_key)
+        )
+        """
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS ix_job_status_run_after ON job (status, run_after)"
+    )
+    conn.commit()
+    conn.close()
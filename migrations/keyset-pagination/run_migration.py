@@ -0,0 +1,28 @@
+import sqlite3
+import sys
+
+if __name__ == "__main__":
+    """
+    Run migration for listing files and posts a page at a time.
+
+    This program will create the index on ("upload_date", "id") of the
+    "file" table, which GET /api/v1/files pages over, and the index on
+    ("last_modified", "id") of the "post" table, which GET /api/v1/posts
+    pages over.
+
+    FILEPATH: path to the SQLITE database file
+    """
+    if len(sys.argv) != 2:
+        print("Usage: python run_migration.py [FILEPATH]")
+        sys.exit(1)
+    conn = sqlite3.connect(sys.argv[1])
+    cur = conn.cursor()
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS ix_file_upload_date_id ON file (upload_date, id)"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS ix_post_last_modified_id "
+        "ON post (last_modified, id)"
+    )
+    conn.commit()
+    conn.close()
@@ -0,0 +1,24 @@
+import sqlite3
+import sys
+
+if __name__ == "__main__":
+    """
+    Run migration for detecting duplicate uploads before processing them.
+
+    This program will add the "original_hash" column to the "file" table,
+    and create its index. The column stays null for existing files, whose
+    duplicates are found via their "hash".
+
+    FILEPATH: path to the SQLITE database file
+    """
+    if len(sys.argv) != 2:
+        print("Usage: python run_migration.py [FILEPATH]")
+        sys.exit(1)
+    conn = sqlite3.connect(sys.argv[1])
+    cur = conn.cursor()
+    cur.execute("ALTER TABLE file ADD COLUMN original_hash VARCHAR")
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS ix_file_original_hash ON file (original_hash)"
+    )
+    conn.commit()
+    conn.close()
@@ -0,0 +1,39 @@
+import sqlite3
+import sys
+
+if __name__ == "__main__":
+    """
+    Run migration for the cached post neighbors.
+
+    This program will add the "prev_id" and "next_id" columns to the "post"
+    table, fill them in for all published posts, and create the index on
+    ("is_published", "publish_date").
+
+    FILEPATH: path to the SQLITE database file
+    """
+    if len(sys.argv) != 2:
+        print("Usage: python run_migration.py [FILEPATH]")
+        sys.exit(1)
+    conn = sqlite3.connect(sys.argv[1])
+    cur = conn.cursor()
+    cur.execute("ALTER TABLE post ADD COLUMN prev_id INTEGER")
+    cur.execute("ALTER TABLE post ADD COLUMN next_id INTEGER")
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS ix_post_is_published_publish_date "
+        "ON post (is_published, publish_date)"
+    )
+    cur.execute(
+        "SELECT id FROM post WHERE is_published ORDER BY publish_date ASC, id ASC"
+    )
+    published = [record[0] for record in cur.fetchall()]
+    for i, post_id in enumerate(published):
+        cur.execute(
+            "UPDATE post SET prev_id = ?, next_id = ? WHERE id = ?",
+            (
+                published[i - 1] if i > 0 else None,
+                published[i + 1] if i + 1 < len(published) else None,
+                post_id,
+            ),
+        )
+    conn.commit()
+    conn.close()
@@ -82,19 +82,20 @@ def update_post(post_id: int, path: Path, email: str, password: str, host_url: s
 
     with open(post.md_path, encoding="utf-8", errors="strict") as markdown_file:
         post_md = markdown_file.read()
-    # Get the list of image filenames referenced in the Markdown
-    for filename in renderer.find_images(post_md):
+    # Get the image filenames referenced in the Markdown (without duplicates)
+    references = renderer.find_image_references(post_md)
+    new_filenames = {}
+    for filename in dict.fromkeys(reference.path for reference in references):
         # Resolve absolute path
         full_path = (path / filename).resolve()
         # Upload image and get its online filename
         click.echo(f"Uploading image {full_path}...")
         with open(full_path, mode="rb") as contents:
-            # TODO: not sure if this will work correctly
-            new_filename = client_util.upload_file(
+            new_filenames[filename] = client_util.upload_file(
                 client, UploadFile(contents, full_path.name)
             ).filename
-            # Update Markdown to use the new filename TODO: the naive find-and-replace is risky!
-            post_md = post_md.replace(filename, new_filename)
+    # Update Markdown to use the new filenames
+    post_md = renderer.replace_image_paths(post_md, new_filenames, references)
 
     click.echo("Uploading Markdown...")
     res_content = api_set_post_content.sync_detailed(
@@ -1,4 +1,6 @@
 import sys
+import typing
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import click
@@ -6,6 +8,8 @@ import stefan_on_software_api_client.api.posts.post_posts as api_create_post
 import stefan_on_software_api_client.api.posts.post_posts_post_id_content as api_set_post_content
 import stefan_on_software_api_client.api.posts.post_posts_post_id_tags as api_add_tag_to_post
 from stefan_on_software_api_client import client_util
+from stefan_on_software_api_client.client import Client
+from stefan_on_software_api_client.models.file import File
 from stefan_on_software_api_client.models.post_posts_json_body import PostPostsJsonBody
 from stefan_on_software_api_client.models.post_posts_post_id_content_multipart_data import (
     PostPostsPostIdContentMultipartData,
@@ -19,6 +23,24 @@ from stefan_on_software_api_client.types import HTTPStatus
 from stefan_on_software_renderer import renderer
 
 
+def upload_images(
+    client: Client, paths: typing.Iterable[Path], jobs: int
+) -> typing.Dict[Path, File]:
+    """
+    Upload the images at `paths`, `jobs` at a time, and return the uploaded
+    file for each path. Raises ValueError if an upload fails.
+    """
+    paths = list(dict.fromkeys(paths))
+
+    def upload(path: Path) -> File:
+        click.echo(f"Uploading image {path}...")
+        with open(path, mode="rb") as contents:
+            return client_util.upload_file(client, UploadFile(contents, path.name))
+
+    with ThreadPoolExecutor(jobs) as executor:
+        return dict(zip(paths, executor.map(upload, paths)))
+
+
 # TODO: needs significant revisions and error-handling.
 @click.command()
 @click.argument(
@@ -27,7 +49,10 @@ from stefan_on_software_renderer import renderer
 @click.option("--email", required=True)
 @click.password_option(required=True)
 @click.option("--host_url", required=True)
-def upload_post(path: Path, email: str, password: str, host_url: str):
+@click.option(
+    "--jobs", default=4, show_default=True, help="Number of images to upload at a time"
+)
+def upload_post(path: Path, email: str, password: str, host_url: str, jobs: int):
     """
     Creates and uploads a post. Will fail if a post with the given slug already exists.
 
@@ -42,28 +67,33 @@ def upload_post(path: Path, email: str, password: str, host_url: str):
 
     client = client_util.make_client(host_url, email, password)
 
+    with open(post.md_path, encoding="utf-8", errors="strict") as markdown_file:
+        post_md = markdown_file.read()
+    # Get the image filenames referenced in the Markdown
+    references = renderer.find_image_references(post_md)
+
+    # Upload the featured, banner and thumbnail images and the images
+    # referenced in the Markdown concurrently. The server processes them
+    # in parallel.
     # TODO: should file upload reject duplicates explicitly?
-    # TODO: how to catch failure?
     featured_path = (path / post.metadata.image).resolve()
-    print(f"Uploading featured image {featured_path}...")
-    with open(featured_path, mode="rb") as contents:
-        featured_id = client_util.upload_file(
-            client, UploadFile(contents, featured_path.name)
-        ).id
-
     banner_path = (path / post.metadata.banner).resolve()
-    print(f"Uploading banner image {banner_path}...")
-    with open(banner_path, mode="rb") as contents:
-        banner_id = client_util.upload_file(
-            client, UploadFile(contents, banner_path.name)
-        ).id
-
     thumbnail_path = (path / post.metadata.thumbnail).resolve()
-    print(f"Uploading thumbnail image {thumbnail_path}...")
-    with open(thumbnail_path, mode="rb") as contents:
-        thumbnail_id = client_util.upload_file(
-            client, UploadFile(contents, thumbnail_path.name)
-        ).id
+    reference_paths = {
+        reference.path: (path / reference.path).resolve() for reference in references
+    }
+    try:
+        uploaded = upload_images(
+            client,
+            [featured_path, banner_path, thumbnail_path, *reference_paths.values()],
+            jobs,
+        )
+    except ValueError as e:
+        click.echo(e, err=True)
+        sys.exit(1)
+    featured_id = uploaded[featured_path].id
+    banner_id = uploaded[banner_path].id
+    thumbnail_id = uploaded[thumbnail_path].id
 
     click.echo("Creating post...")
     res_create = api_create_post.sync_detailed(
@@ -93,20 +123,12 @@ def upload_post(path: Path, email: str, password: str, host_url: str):
         if res_add_tag.status_code != HTTPStatus.NO_CONTENT:
             click.echo(f"Warning: failed with content={res_add_tag.content}", err=True)
 
-    with open(post.md_path, encoding="utf-8", errors="strict") as markdown_file:
-        post_md = markdown_file.read()
-    # Get the list of image filenames referenced in the Markdown
-    for filename in renderer.find_images(post_md):
-        # Resolve absolute path
-        full_path = (path / filename).resolve()
-        # Upload image and get its online filename
-        click.echo(f"Uploading image {full_path}...")
-        with open(full_path, mode="rb") as contents:
-            new_filename = client_util.upload_file(
-                client, UploadFile(contents, full_path.name)
-            ).filename
-            # Update Markdown to use the new filename TODO: the naive find-and-replace is risky!
-            post_md = post_md.replace(filename, new_filename)
+    # Update Markdown to use the online filenames of the uploaded images
+    new_filenames = {
+        filename: uploaded[full_path].filename
+        for filename, full_path in reference_paths.items()
+    }
+    post_md = renderer.replace_image_paths(post_md, new_filenames, references)
 
     click.echo("Uploading Markdown...")
     res_content = api_set_post_content.sync_detailed(
@@ -1,3 +1,4 @@
+import datetime
 from http import HTTPStatus
 from typing import Any, Dict, List, Optional, Union, cast
 
@@ -6,14 +7,21 @@ import httpx
 from ... import errors
 from ...client import Client
 from ...models.file import File
-from ...types import UNSET, Response
+from ...models.get_files_filetype import GetFilesFiletype
+from ...types import UNSET, Response, Unset
 
 
 def _get_kwargs(
     *,
     client: Client,
-    limit: int,
-    offset: int,
+    limit: Union[Unset, None, int] = UNSET,
+    cursor: Union[Unset, None, str] = UNSET,
+    filetype: Union[Unset, None, GetFilesFiletype] = UNSET,
+    uploaded_by: Union[Unset, None, int] = UNSET,
+    uploaded_after: Union[Unset, None, datetime.datetime] = UNSET,
+    uploaded_before: Union[Unset, None, datetime.datetime] = UNSET,
+    hash_: Union[Unset, None, str] = UNSET,
+    fields: Union[Unset, None, str] = UNSET,
 ) -> Dict[str, Any]:
     url = "{}/files".format(client.base_url)
 
@@ -23,7 +31,31 @@ def _get_kwargs(
     params: Dict[str, Any] = {}
     params["limit"] = limit
 
-    params["offset"] = offset
+    params["cursor"] = cursor
+
+    json_filetype: Union[Unset, None, str] = UNSET
+    if not isinstance(filetype, Unset):
+        json_filetype = filetype.value if filetype else None
+
+    params["filetype"] = json_filetype
+
+    params["uploaded_by"] = uploaded_by
+
+    json_uploaded_after: Union[Unset, None, str] = UNSET
+    if not isinstance(uploaded_after, Unset):
+        json_uploaded_after = uploaded_after.isoformat() if uploaded_after else None
+
+    params["uploaded_after"] = json_uploaded_after
+
+    json_uploaded_before: Union[Unset, None, str] = UNSET
+    if not isinstance(uploaded_before, Unset):
+        json_uploaded_before = uploaded_before.isoformat() if uploaded_before else None
+
+    params["uploaded_before"] = json_uploaded_before
+
+    params["hash"] = hash_
+
+    params["fields"] = fields
 
     params = {k: v for k, v in params.items() if v is not UNSET and v is not None}
 
@@ -49,6 +81,9 @@ def _parse_response(
             response_200.append(response_200_item)
 
         return response_200
+    if response.status_code == HTTPStatus.BAD_REQUEST:
+        response_400 = cast(Any, None)
+        return response_400
     if response.status_code == HTTPStatus.UNAUTHORIZED:
         response_401 = cast(Any, None)
         return response_401
@@ -75,14 +110,27 @@ def _build_response(
 def sync_detailed(
     *,
     client: Client,
-    limit: int,
-    offset: int,
+    limit: Union[Unset, None, int] = UNSET,
+    cursor: Union[Unset, None, str] = UNSET,
+    filetype: Union[Unset, None, GetFilesFiletype] = UNSET,
+    uploaded_by: Union[Unset, None, int] = UNSET,
+    uploaded_after: Union[Unset, None, datetime.datetime] = UNSET,
+    uploaded_before: Union[Unset, None, datetime.datetime] = UNSET,
+    hash_: Union[Unset, None, str] = UNSET,
+    fields: Union[Unset, None, str] = UNSET,
 ) -> Response[Union[Any, List["File"]]]:
-    """Get a list of files
+    """Get a list of files, most recent first, a page at a time. If there are more files, the URL of
+    the next page is given in the `Link` header and its cursor in the `X-Next-Cursor` header.
 
     Args:
-        limit (int):
-        offset (int):
+        limit (Union[Unset, None, int]):
+        cursor (Union[Unset, None, str]):
+        filetype (Union[Unset, None, GetFilesFiletype]):
+        uploaded_by (Union[Unset, None, int]):
+        uploaded_after (Union[Unset, None, datetime.datetime]):
+        uploaded_before (Union[Unset, None, datetime.datetime]):
+        hash_ (Union[Unset, None, str]):
+        fields (Union[Unset, None, str]):
 
     Raises:
         errors.UnexpectedStatus: If the server returns an undocumented status code and Client.raise_on_unexpected_status is True.
@@ -95,7 +143,13 @@ def sync_detailed(
     kwargs = _get_kwargs(
         client=client,
         limit=limit,
-        offset=offset,
+        cursor=cursor,
+        filetype=filetype,
+        uploaded_by=uploaded_by,
+        uploaded_after=uploaded_after,
+        uploaded_before=uploaded_before,
+        hash_=hash_,
+        fields=fields,
     )
 
     response = httpx.request(
@@ -109,14 +163,27 @@ def sync_detailed(
 def sync(
     *,
     client: Client,
-    limit: int,
-    offset: int,
+    limit: Union[Unset, None, int] = UNSET,
+    cursor: Union[Unset, None, str] = UNSET,
+    filetype: Union[Unset, None, GetFilesFiletype] = UNSET,
+    uploaded_by: Union[Unset, None, int] = UNSET,
+    uploaded_after: Union[Unset, None, datetime.datetime] = UNSET,
+    uploaded_before: Union[Unset, None, datetime.datetime] = UNSET,
+    hash_: Union[Unset, None, str] = UNSET,
+    fields: Union[Unset, None, str] = UNSET,
 ) -> Optional[Union[Any, List["File"]]]:
-    """Get a list of files
+    """Get a list of files, most recent first, a page at a time. If there are more files, the URL of
+    the next page is given in the `Link` header and its cursor in the `X-Next-Cursor` header.
 
     Args:
-        limit (int):
-        offset (int):
+        limit (Union[Unset, None, int]):
+        cursor (Union[Unset, None, str]):
+        filetype (Union[Unset, None, GetFilesFiletype]):
+        uploaded_by (Union[Unset, None, int]):
+        uploaded_after (Union[Unset, None, datetime.datetime]):
+        uploaded_before (Union[Unset, None, datetime.datetime]):
+        hash_ (Union[Unset, None, str]):
+        fields (Union[Unset, None, str]):
 
     Raises:
         errors.UnexpectedStatus: If the server returns an undocumented status code and Client.raise_on_unexpected_status is True.
@@ -129,21 +196,40 @@ def sync(
     return sync_detailed(
         client=client,
         limit=limit,
-        offset=offset,
+        cursor=cursor,
+        filetype=filetype,
+        uploaded_by=uploaded_by,
+        uploaded_after=uploaded_after,
+        uploaded_before=uploaded_before,
+        hash_=hash_,
+        fields=fields,
     ).parsed
 
 
 async def asyncio_detailed(
     *,
     client: Client,
-    limit: int,
-    offset: int,
+    limit: Union[Unset, None, int] = UNSET,
+    cursor: Union[Unset, None, str] = UNSET,
+    filetype: Union[Unset, None, GetFilesFiletype] = UNSET,
+    uploaded_by: Union[Unset, None, int] = UNSET,
+    uploaded_after: Union[Unset, None, datetime.datetime] = UNSET,
+    uploaded_before: Union[Unset, None, datetime.datetime] = UNSET,
+    hash_: Union[Unset, None, str] = UNSET,
+    fields: Union[Unset, None, str] = UNSET,
 ) -> Response[Union[Any, List["File"]]]:
-    """Get a list of files
+    """Get a list of files, most recent first, a page at a time. If there are more files, the URL of
+    the next page is given in the `Link` header and its cursor in the `X-Next-Cursor` header.
 
     Args:
-        limit (int):
-        offset (int):
+        limit (Union[Unset, None, int]):
+        cursor (Union[Unset, None, str]):
+        filetype (Union[Unset, None, GetFilesFiletype]):
+        uploaded_by (Union[Unset, None, int]):
+        uploaded_after (Union[Unset, None, datetime.datetime]):
+        uploaded_before (Union[Unset, None, datetime.datetime]):
+        hash_ (Union[Unset, None, str]):
+        fields (Union[Unset, None, str]):
 
     Raises:
         errors.UnexpectedStatus: If the server returns an undocumented status code and Client.raise_on_unexpected_status is True.
@@ -156,7 +242,13 @@ async def asyncio_detailed(
     kwargs = _get_kwargs(
         client=client,
         limit=limit,
-        offset=offset,
+        cursor=cursor,
+        filetype=filetype,
+        uploaded_by=uploaded_by,
+        uploaded_after=uploaded_after,
+        uploaded_before=uploaded_before,
+        hash_=hash_,
+        fields=fields,
     )
 
     async with httpx.AsyncClient(verify=client.verify_ssl) as _client:
@@ -168,14 +260,27 @@ async def asyncio_detailed(
 async def asyncio(
     *,
     client: Client,
-    limit: int,
-    offset: int,
+    limit: Union[Unset, None, int] = UNSET,
+    cursor: Union[Unset, None, str] = UNSET,
+    filetype: Union[Unset, None, GetFilesFiletype] = UNSET,
+    uploaded_by: Union[Unset, None, int] = UNSET,
+    uploaded_after: Union[Unset, None, datetime.datetime] = UNSET,
+    uploaded_before: Union[Unset, None, datetime.datetime] = UNSET,
+    hash_: Union[Unset, None, str] = UNSET,
+    fields: Union[Unset, None, str] = UNSET,
 ) -> Optional[Union[Any, List["File"]]]:
-    """Get a list of files
+    """Get a list of files, most recent first, a page at a time. If there are more files, the URL of
+    the next page is given in the `Link` header and its cursor in the `X-Next-Cursor` header.
 
     Args:
-        limit (int):
-        offset (int):
+        limit (Union[Unset, None, int]):
+        cursor (Union[Unset, None, str]):
+        filetype (Union[Unset, None, GetFilesFiletype]):
+        uploaded_by (Union[Unset, None, int]):
+        uploaded_after (Union[Unset, None, datetime.datetime]):
+        uploaded_before (Union[Unset, None, datetime.datetime]):
+        hash_ (Union[Unset, None, str]):
+        fields (Union[Unset, None, str]):
 
     Raises:
         errors.UnexpectedStatus: If the server returns an undocumented status code and Client.raise_on_unexpected_status is True.
@@ -189,6 +294,12 @@ async def asyncio(
         await asyncio_detailed(
             client=client,
             limit=limit,
-            offset=offset,
+            cursor=cursor,
+            filetype=filetype,
+            uploaded_by=uploaded_by,
+            uploaded_after=uploaded_after,
+            uploaded_before=uploaded_before,
+            hash_=hash_,
+            fields=fields,
         )
     ).parsed
@@ -35,6 +35,9 @@ def _parse_response(
         response_200 = File(payload=BytesIO(response.content))
 
         return response_200
+    if response.status_code == HTTPStatus.NOT_MODIFIED:
+        response_304 = cast(Any, None)
+        return response_304
     if response.status_code == HTTPStatus.UNAUTHORIZED:
         response_401 = cast(Any, None)
         return response_401
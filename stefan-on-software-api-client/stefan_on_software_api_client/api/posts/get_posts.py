@@ -14,8 +14,11 @@ def _get_kwargs(
     client: Client,
     is_featured: Union[Unset, None, bool] = UNSET,
     is_published: Union[Unset, None, bool] = UNSET,
-    limit: int,
-    offset: int,
+    limit: Union[Unset, None, int] = UNSET,
+    offset: Union[Unset, None, int] = UNSET,
+    cursor: Union[Unset, None, str] = UNSET,
+    slug: Union[Unset, None, str] = UNSET,
+    slugs: Union[Unset, None, str] = UNSET,
 ) -> Dict[str, Any]:
     url = "{}/posts".format(client.base_url)
 
@@ -31,6 +34,12 @@ def _get_kwargs(
 
     params["offset"] = offset
 
+    params["cursor"] = cursor
+
+    params["slug"] = slug
+
+    params["slugs"] = slugs
+
     params = {k: v for k, v in params.items() if v is not UNSET and v is not None}
 
     return {
@@ -55,6 +64,9 @@ def _parse_response(
             response_200.append(response_200_item)
 
         return response_200
+    if response.status_code == HTTPStatus.BAD_REQUEST:
+        response_400 = cast(Any, None)
+        return response_400
     if response.status_code == HTTPStatus.UNAUTHORIZED:
         response_401 = cast(Any, None)
         return response_401
@@ -86,16 +98,24 @@ def sync_detailed(
     client: Client,
     is_featured: Union[Unset, None, bool] = UNSET,
     is_published: Union[Unset, None, bool] = UNSET,
-    limit: int,
-    offset: int,
+    limit: Union[Unset, None, int] = UNSET,
+    offset: Union[Unset, None, int] = UNSET,
+    cursor: Union[Unset, None, str] = UNSET,
+    slug: Union[Unset, None, str] = UNSET,
+    slugs: Union[Unset, None, str] = UNSET,
 ) -> Response[Union[Any, List["Post"]]]:
-    """Get post information, applying optional filters and paging.
+    """Get post information, applying optional filters and paging. Posts are returned most recently
+    modified first. If there are more posts, the URL of the next page is given in the `Link` header and
+    its cursor in the `X-Next-Cursor` header.
 
     Args:
         is_featured (Union[Unset, None, bool]):
         is_published (Union[Unset, None, bool]):
-        limit (int):
-        offset (int):
+        limit (Union[Unset, None, int]):
+        offset (Union[Unset, None, int]):
+        cursor (Union[Unset, None, str]):
+        slug (Union[Unset, None, str]):
+        slugs (Union[Unset, None, str]):
 
     Raises:
         errors.UnexpectedStatus: If the server returns an undocumented status code and Client.raise_on_unexpected_status is True.
@@ -111,6 +131,9 @@ def sync_detailed(
         is_published=is_published,
         limit=limit,
         offset=offset,
+        cursor=cursor,
+        slug=slug,
+        slugs=slugs,
     )
 
     response = httpx.request(
@@ -126,16 +149,24 @@ def sync(
     client: Client,
     is_featured: Union[Unset, None, bool] = UNSET,
     is_published: Union[Unset, None, bool] = UNSET,
-    limit: int,
-    offset: int,
+    limit: Union[Unset, None, int] = UNSET,
+    offset: Union[Unset, None, int] = UNSET,
+    cursor: Union[Unset, None, str] = UNSET,
+    slug: Union[Unset, None, str] = UNSET,
+    slugs: Union[Unset, None, str] = UNSET,
 ) -> Optional[Union[Any, List["Post"]]]:
-    """Get post information, applying optional filters and paging.
+    """Get post information, applying optional filters and paging. Posts are returned most recently
+    modified first. If there are more posts, the URL of the next page is given in the `Link` header and
+    its cursor in the `X-Next-Cursor` header.
 
     Args:
         is_featured (Union[Unset, None, bool]):
         is_published (Union[Unset, None, bool]):
-        limit (int):
-        offset (int):
+        limit (Union[Unset, None, int]):
+        offset (Union[Unset, None, int]):
+        cursor (Union[Unset, None, str]):
+        slug (Union[Unset, None, str]):
+        slugs (Union[Unset, None, str]):
 
     Raises:
         errors.UnexpectedStatus: If the server returns an undocumented status code and Client.raise_on_unexpected_status is True.
@@ -151,6 +182,9 @@ def sync(
         is_published=is_published,
         limit=limit,
         offset=offset,
+        cursor=cursor,
+        slug=slug,
+        slugs=slugs,
     ).parsed
 
 
@@ -159,16 +193,24 @@ async def asyncio_detailed(
     client: Client,
     is_featured: Union[Unset, None, bool] = UNSET,
     is_published: Union[Unset, None, bool] = UNSET,
-    limit: int,
-    offset: int,
+    limit: Union[Unset, None, int] = UNSET,
+    offset: Union[Unset, None, int] = UNSET,
+    cursor: Union[Unset, None, str] = UNSET,
+    slug: Union[Unset, None, str] = UNSET,
+    slugs: Union[Unset, None, str] = UNSET,
 ) -> Response[Union[Any, List["Post"]]]:
-    """Get post information, applying optional filters and paging.
+    """Get post information, applying optional filters and paging. Posts are returned most recently
+    modified first. If there are more posts, the URL of the next page is given in the `Link` header and
+    its cursor in the `X-Next-Cursor` header.
 
     Args:
         is_featured (Union[Unset, None, bool]):
         is_published (Union[Unset, None, bool]):
-        limit (int):
-        offset (int):
+        limit (Union[Unset, None, int]):
+        offset (Union[Unset, None, int]):
+        cursor (Union[Unset, None, str]):
+        slug (Union[Unset, None, str]):
+        slugs (Union[Unset, None, str]):
 
     Raises:
         errors.UnexpectedStatus: If the server returns an undocumented status code and Client.raise_on_unexpected_status is True.
@@ -184,6 +226,9 @@ async def asyncio_detailed(
         is_published=is_published,
         limit=limit,
         offset=offset,
+        cursor=cursor,
+        slug=slug,
+        slugs=slugs,
     )
 
     async with httpx.AsyncClient(verify=client.verify_ssl) as _client:
@@ -197,16 +242,24 @@ async def asyncio(
     client: Client,
     is_featured: Union[Unset, None, bool] = UNSET,
     is_published: Union[Unset, None, bool] = UNSET,
-    limit: int,
-    offset: int,
+    limit: Union[Unset, None, int] = UNSET,
+    offset: Union[Unset, None, int] = UNSET,
+    cursor: Union[Unset, None, str] = UNSET,
+    slug: Union[Unset, None, str] = UNSET,
+    slugs: Union[Unset, None, str] = UNSET,
 ) -> Optional[Union[Any, List["Post"]]]:
-    """Get post information, applying optional filters and paging.
+    """Get post information, applying optional filters and paging. Posts are returned most recently
+    modified first. If there are more posts, the URL of the next page is given in the `Link` header and
+    its cursor in the `X-Next-Cursor` header.
 
     Args:
         is_featured (Union[Unset, None, bool]):
         is_published (Union[Unset, None, bool]):
-        limit (int):
-        offset (int):
+        limit (Union[Unset, None, int]):
+        offset (Union[Unset, None, int]):
+        cursor (Union[Unset, None, str]):
+        slug (Union[Unset, None, str]):
+        slugs (Union[Unset, None, str]):
 
     Raises:
         errors.UnexpectedStatus: If the server returns an undocumented status code and Client.raise_on_unexpected_status is True.
@@ -223,5 +276,8 @@ async def asyncio(
             is_published=is_published,
             limit=limit,
             offset=offset,
+            cursor=cursor,
+            slug=slug,
+            slugs=slugs,
         )
     ).parsed
@@ -33,6 +33,9 @@ def _parse_response(
     if response.status_code == HTTPStatus.OK:
         response_200 = cast(str, response.content)
         return response_200
+    if response.status_code == HTTPStatus.NOT_MODIFIED:
+        response_304 = cast(Any, None)
+        return response_304
     if response.status_code == HTTPStatus.UNAUTHORIZED:
         response_401 = cast(Any, None)
         return response_401
@@ -6,30 +6,37 @@ import httpx
 from ... import errors
 from ...client import Client
 from ...models.tag import Tag
-from ...types import Response
+from ...types import UNSET, Response, Unset
 
 
 def _get_kwargs(
     *,
     client: Client,
+    with_counts: Union[Unset, None, bool] = UNSET,
 ) -> Dict[str, Any]:
     url = "{}/tags".format(client.base_url)
 
     headers: Dict[str, str] = client.get_headers()
     cookies: Dict[str, Any] = client.get_cookies()
 
+    params: Dict[str, Any] = {}
+    params["with_counts"] = with_counts
+
+    params = {k: v for k, v in params.items() if v is not UNSET and v is not None}
+
     return {
         "method": "get",
         "url": url,
         "headers": headers,
         "cookies": cookies,
         "timeout": client.get_timeout(),
+        "params": params,
     }
 
 
 def _parse_response(
     *, client: Client, response: httpx.Response
-) -> Optional[Union[Any, List["Tag"]]]:
+) -> Optional[Union[Any, List["Tag"], str]]:
     if response.status_code == HTTPStatus.OK:
         response_200 = []
         _response_200 = response.json()
@@ -39,6 +46,9 @@ def _parse_response(
             response_200.append(response_200_item)
 
         return response_200
+    if response.status_code == HTTPStatus.BAD_REQUEST:
+        response_400 = cast(str, response.json())
+        return response_400
     if response.status_code == HTTPStatus.UNAUTHORIZED:
         response_401 = cast(Any, None)
         return response_401
@@ -53,7 +63,7 @@ def _parse_response(
 
 def _build_response(
     *, client: Client, response: httpx.Response
-) -> Response[Union[Any, List["Tag"]]]:
+) -> Response[Union[Any, List["Tag"], str]]:
     return Response(
         status_code=HTTPStatus(response.status_code),
         content=response.content,
@@ -65,20 +75,25 @@ def _build_response(
 def sync_detailed(
     *,
     client: Client,
-) -> Response[Union[Any, List["Tag"]]]:
+    with_counts: Union[Unset, None, bool] = UNSET,
+) -> Response[Union[Any, List["Tag"], str]]:
     """Get all tags that have been created. There are not expected to be more than 10-20 tags used on a
     website; therefore, this endpoint does not support paging.
 
+    Args:
+        with_counts (Union[Unset, None, bool]):
+
     Raises:
         errors.UnexpectedStatus: If the server returns an undocumented status code and Client.raise_on_unexpected_status is True.
         httpx.TimeoutException: If the request takes longer than Client.timeout.
 
     Returns:
-        Response[Union[Any, List['Tag']]]
+        Response[Union[Any, List['Tag'], str]]
     """
 
     kwargs = _get_kwargs(
         client=client,
+        with_counts=with_counts,
     )
 
     response = httpx.request(
@@ -92,40 +107,50 @@ def sync_detailed(
 def sync(
     *,
     client: Client,
-) -> Optional[Union[Any, List["Tag"]]]:
+    with_counts: Union[Unset, None, bool] = UNSET,
+) -> Optional[Union[Any, List["Tag"], str]]:
     """Get all tags that have been created. There are not expected to be more than 10-20 tags used on a
     website; therefore, this endpoint does not support paging.
 
+    Args:
+        with_counts (Union[Unset, None, bool]):
+
     Raises:
         errors.UnexpectedStatus: If the server returns an undocumented status code and Client.raise_on_unexpected_status is True.
         httpx.TimeoutException: If the request takes longer than Client.timeout.
 
     Returns:
-        Response[Union[Any, List['Tag']]]
+        Response[Union[Any, List['Tag'], str]]
     """
 
     return sync_detailed(
         client=client,
+        with_counts=with_counts,
     ).parsed
 
 
 async def asyncio_detailed(
     *,
     client: Client,
-) -> Response[Union[Any, List["Tag"]]]:
+    with_counts: Union[Unset, None, bool] = UNSET,
+) -> Response[Union[Any, List["Tag"], str]]:
     """Get all tags that have been created. There are not expected to be more than 10-20 tags used on a
     website; therefore, this endpoint does not support paging.
 
+    Args:
+        with_counts (Union[Unset, None, bool]):
+
     Raises:
         errors.UnexpectedStatus: If the server returns an undocumented status code and Client.raise_on_unexpected_status is True.
         httpx.TimeoutException: If the request takes longer than Client.timeout.
 
     Returns:
-        Response[Union[Any, List['Tag']]]
+        Response[Union[Any, List['Tag'], str]]
     """
 
     kwargs = _get_kwargs(
         client=client,
+        with_counts=with_counts,
     )
 
     async with httpx.AsyncClient(verify=client.verify_ssl) as _client:
@@ -137,20 +162,25 @@ async def asyncio_detailed(
 async def asyncio(
     *,
     client: Client,
-) -> Optional[Union[Any, List["Tag"]]]:
+    with_counts: Union[Unset, None, bool] = UNSET,
+) -> Optional[Union[Any, List["Tag"], str]]:
     """Get all tags that have been created. There are not expected to be more than 10-20 tags used on a
     website; therefore, this endpoint does not support paging.
 
+    Args:
+        with_counts (Union[Unset, None, bool]):
+
     Raises:
         errors.UnexpectedStatus: If the server returns an undocumented status code and Client.raise_on_unexpected_status is True.
         httpx.TimeoutException: If the request takes longer than Client.timeout.
 
     Returns:
-        Response[Union[Any, List['Tag']]]
+        Response[Union[Any, List['Tag'], str]]
     """
 
     return (
         await asyncio_detailed(
             client=client,
+            with_counts=with_counts,
         )
     ).parsed
@@ -5,9 +5,10 @@ import json
 import re
 from datetime import date
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 
 import marshmallow as msh
+import stefan_on_software_api_client.api.files.get_files as api_get_files
 import stefan_on_software_api_client.api.files.post_files as api_post_files
 import stefan_on_software_api_client.api.posts.get_posts as api_get_posts
 from stefan_on_software_api_client.client import Client
@@ -166,11 +167,64 @@ def make_auth_headers(email: str, password: str) -> Dict:
     return {"Authorization": "Basic " + auth_binary.decode()}
 
 
+def iter_posts(client: Client, page_size: int = 100, **filters) -> Iterator[Post]:
+    """
+    Iterate over all posts on the server, most recently modified first,
+    requesting them a page at a time. `filters` are passed to `get_posts`
+    (e.g. `is_published`).
+    """
+    cursor = None
+    while True:
+        res = api_get_posts.sync_detailed(
+            client=client, limit=page_size, cursor=cursor, **filters
+        )
+        if res.status_code != HTTPStatus.OK:
+            raise ValueError(f"Failed with content={res.content}")
+        yield from res.parsed
+        cursor = res.headers.get("X-Next-Cursor")
+        if not cursor:
+            return
+
+
 def get_post_by_slug(client: Client, slug: str) -> Optional[Post]:
-    # TODO: a better way to do this
-    all_posts = api_get_posts.sync(client=client, limit=1000, offset=0)
-    res = [post for post in all_posts if post.slug == slug]
-    return res[0] if res else None
+    """Return the post with the given slug, or None if there is none."""
+    res = api_get_posts.sync_detailed(client=client, slug=slug)
+    if res.status_code != HTTPStatus.OK:
+        raise ValueError(f"Failed with content={res.content}")
+    return res.parsed[0] if res.parsed else None
+
+
+def get_posts_by_slug(client: Client, slugs: List[str]) -> Dict[str, Post]:
+    """Return the posts with the given slugs, keyed by slug. Slugs without a post are omitted."""
+    posts = {}
+    # The server looks up at most 100 slugs at a time
+    for start in range(0, len(slugs), 100):
+        res = api_get_posts.sync_detailed(
+            client=client, slugs=",".join(slugs[start : start + 100])
+        )
+        if res.status_code != HTTPStatus.OK:
+            raise ValueError(f"Failed with content={res.content}")
+        posts.update({post.slug: post for post in res.parsed})
+    return posts
+
+
+def iter_files(client: Client, page_size: int = 100, **filters) -> Iterator[File]:
+    """
+    Iterate over all files on the server, most recent first, requesting
+    them a page at a time. `filters` are passed to `get_files` (e.g.
+    `filetype`, `uploaded_after` or `hash_`).
+    """
+    cursor = None
+    while True:
+        res = api_get_files.sync_detailed(
+            client=client, limit=page_size, cursor=cursor, **filters
+        )
+        if res.status_code != HTTPStatus.OK:
+            raise ValueError(f"Failed with content={res.content}")
+        yield from res.parsed
+        cursor = res.headers.get("X-Next-Cursor")
+        if not cursor:
+            return
 
 
 def upload_file(client: Client, file: UploadFile) -> File:
@@ -2,6 +2,7 @@
 
 from .file import File
 from .file_filetype import FileFiletype
+from .get_files_filetype import GetFilesFiletype
 from .post import Post
 from .post_commands_feature_json_body import PostCommandsFeatureJsonBody
 from .post_commands_publish_json_body import PostCommandsPublishJsonBody
@@ -22,6 +23,7 @@ from .user import User
 __all__ = (
     "File",
     "FileFiletype",
+    "GetFilesFiletype",
     "Post",
     "PostCommandsFeatureJsonBody",
     "PostCommandsPublishJsonBody",
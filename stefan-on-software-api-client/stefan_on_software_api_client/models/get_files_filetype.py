@@ -0,0 +1,9 @@
+from enum import Enum
+
+
+class GetFilesFiletype(str, Enum):
+    IMAGE = "IMAGE"
+    DOCUMENT = "DOCUMENT"
+
+    def __str__(self) -> str:
+        return str(self.value)
@@ -1,7 +1,9 @@
-from typing import Any, Dict, List, Type, TypeVar
+from typing import Any, Dict, List, Type, TypeVar, Union
 
 import attr
 
+from ..types import UNSET, Unset
+
 T = TypeVar("T", bound="Tag")
 
 
@@ -16,12 +18,15 @@ class Tag:
         description (str): A short description used to help readers understand the tag. Example: Posts that have to do
             with data analysis and visualization..
         color (str): Hex color used when displaying the tag Example: #FFFFFF.
+        post_count (Union[Unset, int]): Number of published posts with this tag. Only returned if requested via
+            `with_counts`. Example: 4.
     """
 
     slug: str
     name: str
     description: str
     color: str
+    post_count: Union[Unset, int] = UNSET
     additional_properties: Dict[str, Any] = attr.ib(init=False, factory=dict)
 
     def to_dict(self) -> Dict[str, Any]:
@@ -29,6 +34,7 @@ class Tag:
         name = self.name
         description = self.description
         color = self.color
+        post_count = self.post_count
 
         field_dict: Dict[str, Any] = {}
         field_dict.update(self.additional_properties)
@@ -40,6 +46,8 @@ class Tag:
                 "color": color,
             }
         )
+        if post_count is not UNSET:
+            field_dict["post_count"] = post_count
 
         return field_dict
 
@@ -54,11 +62,14 @@ class Tag:
 
         color = d.pop("color")
 
+        post_count = d.pop("post_count", UNSET)
+
         tag = cls(
             slug=slug,
             name=name,
             description=description,
             color=color,
+            post_count=post_count,
         )
 
         tag.additional_properties = d
@@ -0,0 +1,86 @@
+import pathlib
+import re
+import sys
+import timeit
+
+import bs4
+from stefan_on_software_renderer import renderer, tokenizer
+
+"""
+Benchmark for finding and parsing the custom tags in a post.
+
+Compares the single-pass tokenizer against the previous approaches:
+- Parsing tags for rendering used to slice the remaining document for every
+  tag and parse each tag with its own BeautifulSoup instance.
+- `find_images()` used to parse the whole document with BeautifulSoup.
+The post is also repeated a number of times to show how the approaches scale
+with the length of the document.
+
+Usage: python benchmark.py [POST_PATH]
+POST_PATH defaults to the `example-post` in the root of the repository.
+"""
+
+DEFAULT_POST_PATH = pathlib.Path(__file__).parent.parent / "example-post" / "post.md"
+# Number of times to repeat each measurement
+NUM_RUNS = 20
+
+
+def parse_tags_legacy(text: str):
+    """The custom-tag parsing from the previous version of `render_string()`."""
+    elements = []
+    for match_open in re.finditer(tokenizer.MATCH_TAG_OPEN, text):
+        tag_name = match_open.group(1)
+        match_close = re.search(tokenizer.MATCH_TAG_CLOSE, text[match_open.end() :])
+        if not match_close or match_close.group(1) != tag_name:
+            raise ValueError(f"An {tag_name} tag is not closed")
+        close_end = match_open.end() + match_close.end()
+        raw_segment = text[match_open.start() : close_end]
+        elements.append(
+            bs4.BeautifulSoup(raw_segment, features="html.parser").contents[0]
+        )
+    return elements
+
+
+def parse_tags(text: str):
+    return list(tokenizer.tokenize(text))
+
+
+def find_images_legacy(text: str):
+    """The previous version of `find_images()`."""
+    soup = bs4.BeautifulSoup(text, features="html.parser")
+    return [
+        elem.findChildren("path", recursive=False)[0].contents[0].replace('"', "")
+        for elem in soup.find_all("x-image")
+    ]
+
+
+def time_per_run(func, text: str) -> float:
+    """Return the average time of `func(text)`, in milliseconds."""
+    return timeit.timeit(lambda: func(text), number=NUM_RUNS) / NUM_RUNS * 1000
+
+
+if __name__ == "__main__":
+    post_path = pathlib.Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_POST_PATH
+    with open(post_path, encoding="utf-8") as f:
+        post_text = f.read()
+
+    print(f"Benchmarking {post_path} ({NUM_RUNS} runs each)")
+    for name, legacy_func, current_func in (
+        ("Parse tags", parse_tags_legacy, parse_tags),
+        ("Find images", find_images_legacy, renderer.find_images),
+    ):
+        print(name)
+        print(
+            f'{"copies":>8}{"tags":>8}{"legacy (ms)":>14}{"tokenizer (ms)":>17}{"speedup":>10}'
+        )
+        for copies in (1, 10, 50):
+            text = "\n\n".join([post_text] * copies)
+            legacy = time_per_run(legacy_func, text)
+            current = time_per_run(current_func, text)
+            num_tags = len(parse_tags(text))
+            print(
+                f"{copies:>8}{num_tags:>8}{legacy:>14.2f}{current:>17.2f}{legacy / current:>9.1f}x"
+            )
+
+    render_ms = time_per_run(renderer.render_string, post_text)
+    print(f"Full render_string() of the post: {render_ms:.2f} ms")
@@ -0,0 +1,174 @@
+"""
+An in-process cache for rendered output.
+
+Entries are keyed by a hash of the input text and the renderer version (see
+`make_key()`), so a cache never needs to be invalidated: changed input simply
+produces a different key. The cache is bounded and evicts the least-recently
+used entry once it is full. Optionally, a `CacheStore` can be plugged in as a
+second level, e.g. a `DiskStore` that is shared by several worker processes.
+"""
+import abc
+import collections
+import hashlib
+import os
+import tempfile
+import threading
+import typing
+from pathlib import Path
+
+# Version of the rendering logic. This is part of every cache key, so it
+# must be bumped whenever a change to the renderer changes its output.
+RENDERER_VERSION = "0.2.0"
+
+
+def make_key(text: str, namespace: str = "") -> str:
+    """
+    Create a cache key for the given input text.
+
+    `namespace` separates different kinds of cached output (e.g. full
+    documents and single code blocks) that may have the same input text.
+    """
+    hasher = hashlib.sha256()
+    for part in (RENDERER_VERSION, namespace, text):
+        hasher.update(part.encode("utf-8"))
+        # Separator, so that ("ab", "c") and ("a", "bc") hash differently
+        hasher.update(b"\0")
+    return hasher.hexdigest()
+
+
+class CacheStore(abc.ABC):
+    """Interface for a secondary store backing a `RenderCache`."""
+
+    @abc.abstractmethod
+    def get(self, key: str) -> typing.Optional[str]:
+        """Return the value stored under `key`, or None if there is none."""
+
+    @abc.abstractmethod
+    def set(self, key: str, value: str):
+        """Store `value` under `key`."""
+
+
+class DiskStore(CacheStore):
+    """
+    Stores each entry as a file in `directory`.
+
+    Writes are atomic, so a single directory can safely be shared by
+    multiple processes. At most `max_entries` entries are kept: once there
+    are more, the least recently used entries (by modification time, which
+    is updated on every read) are deleted. The directory is created on the
+    first write.
+    """
+
+    def __init__(self, directory: Path, max_entries: int = 1024):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self._directory = Path(directory)
+        self.max_entries = max_entries
+
+    def get(self, key: str) -> typing.Optional[str]:
+        path = self._directory / key
+        try:
+            with open(path, encoding="utf-8") as f:
+                value = f.read()
+            # Mark the entry as recently used
+            os.utime(path)
+            return value
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, value: str):
+        # Write to a temporary file first and then move it into place, so
+        # that readers never see a partially-written entry.
+        self._directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self._directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as out:
+                out.write(value)
+            os.replace(tmp_path, self._directory / key)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._evict()
+
+    def _evict(self):
+        """Delete the least recently used entries while there are too many."""
+        with os.scandir(self._directory) as entries:
+            names = [entry.name for entry in entries if not entry.name.startswith(".")]
+        if len(names) <= self.max_entries:
+            return
+        last_used = {}
+        for name in names:
+            try:
+                last_used[name] = os.stat(self._directory / name).st_mtime_ns
+            except FileNotFoundError:
+                # Deleted by another process
+                pass
+        num_excess = len(last_used) - self.max_entries
+        for name in sorted(last_used, key=last_used.__getitem__)[:num_excess]:
+            try:
+                os.unlink(self._directory / name)
+            except FileNotFoundError:
+                pass
+
+
+class RenderCache:
+    """
+    A bounded, thread-safe LRU cache of rendered output.
+
+    `max_size`: maximum number of entries kept in memory.
+    `store`: optional secondary store that is consulted on a miss and
+      written to on every `set()`.
+    """
+
+    def __init__(self, max_size: int = 128, store: typing.Optional[CacheStore] = None):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.max_size = max_size
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: typing.OrderedDict[str, str] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> typing.Optional[str]:
+        """Return the value cached under `key`, or None on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        value = self.store.get(key) if self.store is not None else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._insert(key, value)
+        return value
+
+    def set(self, key: str, value: str):
+        """Cache `value` under `key`."""
+        with self._lock:
+            self._insert(key, value)
+        if self.store is not None:
+            self.store.set(key, value)
+
+    def clear(self):
+        """Remove all in-memory entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def _insert(self, key: str, value: str):
+        """Insert into the in-memory LRU. Caller must hold the lock."""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
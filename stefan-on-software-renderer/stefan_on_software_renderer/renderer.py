@@ -4,25 +4,83 @@ and custom XML tags.
 
 TODO: needs significant cleanup and clear documentation.
 """
-import re
+import dataclasses as dc
+import functools
+import json
+import time
 import typing
 
-import bs4
 import markdown2
 import pygments
 from pygments.formatters import HtmlFormatter
+from pygments.lexer import Lexer
 from pygments.lexers import get_lexer_by_name
+from pygments.styles import get_style_by_name
 
-IMAGE_TAG = "x-image"
-CODE_TAG = "x-code"
-CUSTOM_TAGS = [IMAGE_TAG, CODE_TAG]
+from .cache import RenderCache, make_key
+from .tokenizer import CODE_TAG, IMAGE_TAG, CustomTag, tokenize
 
-# Note: this will not support tags such as "<x-code/>". Each tag needs an open and a close.
-MATCH_TAG_OPEN = re.compile(f'<({"|".join(CUSTOM_TAGS)})[^>]*>')
-MATCH_TAG_CLOSE = re.compile(f'</({"|".join(CUSTOM_TAGS)})>')
+# Pygments style used to highlight code (see https://pygments.org/styles/)
+DEFAULT_CODE_STYLE = "default"
+# CSS class of the element wrapping each highlighted code block
+CODE_CSS_CLASS = "highlight"
+# `sizes` of images in documents, which are displayed at most 800px wide
+FIGURE_SIZES = "(max-width: 800px) 100vw, 800px"
 
 
-def render_string(post_text: str) -> str:
+@dc.dataclass(frozen=True)
+class ImageSource:
+    """A copy of an image in a given width and format, for responsive images."""
+
+    url: str
+    width: int
+    # E.g. "image/webp"
+    mime_type: str
+
+
+# Copies of each image, by the image's path
+ImageSources = typing.Dict[str, typing.List[ImageSource]]
+
+
+@dc.dataclass
+class RenderResult:
+    """The output of `render()`, along with information about the document."""
+
+    html: str
+    # Image paths given in "x-image" tags, in order of appearance
+    images: typing.List[str] = dc.field(default_factory=list)
+    # Languages of the "x-code" blocks, without duplicates ("text" if none given)
+    languages: typing.List[str] = dc.field(default_factory=list)
+    # Problems that don't prevent rendering, e.g. an image without alt text
+    warnings: typing.List[str] = dc.field(default_factory=list)
+    # Time taken by the call to `render()`, in seconds
+    render_time: float = 0.0
+    # Whether the result was served from the cache
+    from_cache: bool = False
+
+    def to_json(self) -> str:
+        """Serialize the rendered output (but not the timing) to JSON."""
+        return json.dumps(
+            {
+                "html": self.html,
+                "images": self.images,
+                "languages": self.languages,
+                "warnings": self.warnings,
+            }
+        )
+
+    @staticmethod
+    def from_json(serialized: str) -> "RenderResult":
+        return RenderResult(**json.loads(serialized))
+
+
+def render(
+    post_text: str,
+    cache: typing.Optional[RenderCache] = None,
+    code_style: str = DEFAULT_CODE_STYLE,
+    css_classes: bool = False,
+    image_sources: typing.Optional[ImageSources] = None,
+) -> RenderResult:
     """
     Render the provided text into HTML. This will also render custom tags.
 
@@ -31,111 +89,229 @@ def render_string(post_text: str) -> str:
     then run through the Markdown-to-HTML renderer, which will ignore
     the custom generated HTML.
 
-    Returns the rendered HTML as a string.
+    If a `cache` is provided, the rendered document and each rendered code
+    block are looked up in and stored to it.
+
+    Code is highlighted with the Pygments style `code_style`. By default,
+    styles are inlined into every token. If `css_classes` is True, tokens
+    are given CSS classes instead, and the page must include the stylesheet
+    returned by `get_code_stylesheet()` for the same style.
+
+    `image_sources` gives the copies of images, by the path used in the
+    "x-image" tag. An image with copies is rendered as a <picture> that
+    lets the browser choose the smallest suitable copy.
+
+    Returns a `RenderResult`. Raises ValueError if the text is invalid, so
+    a successful call both validates and renders the text.
     """
+    start_time = time.perf_counter()
+    if not is_code_style_valid(code_style):
+        raise ValueError(f'Invalid code style "{code_style}"')
+    if cache is not None:
+        key_text = post_text
+        if image_sources:
+            key_text += "\0" + json.dumps(
+                {
+                    path: [dc.astuple(source) for source in sources]
+                    for path, sources in sorted(image_sources.items())
+                }
+            )
+        key = make_key(key_text, _make_namespace("document", code_style, css_classes))
+        cached = cache.get(key)
+        if cached is not None:
+            result = RenderResult.from_json(cached)
+            result.from_cache = True
+        else:
+            result = _render(post_text, cache, code_style, css_classes, image_sources)
+            cache.set(key, result.to_json())
+    else:
+        result = _render(post_text, None, code_style, css_classes, image_sources)
+    result.render_time = time.perf_counter() - start_time
+    return result
+
+
+def render_string(
+    post_text: str,
+    cache: typing.Optional[RenderCache] = None,
+    code_style: str = DEFAULT_CODE_STYLE,
+    css_classes: bool = False,
+    image_sources: typing.Optional[ImageSources] = None,
+) -> str:
+    """Render the provided text into HTML. See `render()`."""
+    return render(post_text, cache, code_style, css_classes, image_sources).html
+
+
+def _render(
+    post_text: str,
+    cache: typing.Optional[RenderCache],
+    code_style: str,
+    css_classes: bool,
+    image_sources: typing.Optional[ImageSources] = None,
+) -> RenderResult:
+    """Render the provided text. See `render()`."""
+    result = RenderResult(html="")
     prev_index = 0
     segments: typing.List[str] = []
-    # Note: unfortunately we can't use BeautifulSoup here because it can cause
-    # problems with x-code elements, which may contain "<" and ">".
-    # We need to maintain access to the raw strings.
-    for match_open in re.finditer(MATCH_TAG_OPEN, post_text):
-        tag_name = match_open.group(1)
-        close_start, close_end = _find_closing_tag(
-            tag_name, post_text, match_open.end()
-        )
-        raw_segment = post_text[match_open.start() : close_end]
-
-        # Run BeautifulSoup *on the segment* for parsing the XML
-        element = bs4.BeautifulSoup(raw_segment, features="html.parser").contents[0]
-        if tag_name == IMAGE_TAG:
-            rendered_segment = _render_image(element) + "\n"
-        elif tag_name == CODE_TAG:
-            raw_contents = post_text[match_open.end() : close_start]
-            rendered_segment = _render_code(element, raw_contents)
+    # Note: we can't use an HTML parser such as BeautifulSoup here because
+    # x-code elements may contain "<" and ">". The tokenizer gives us the
+    # offsets of each tag, so we maintain access to the raw strings.
+    for tag in tokenize(post_text):
+        if tag.name == IMAGE_TAG:
+            rendered_segment = _render_image(tag, result, image_sources) + "\n"
+        elif tag.name == CODE_TAG:
+            raw_contents = post_text[tag.contents_start : tag.contents_end]
+            language = tag.attributes.get("language")
+            if not language:
+                result.warnings.append(
+                    '"x-code" tag has no "language" and will not be highlighted'
+                )
+            for attribute in tag.attributes:
+                if attribute != "language":
+                    result.warnings.append(
+                        f'"x-code" tag has unsupported attribute "{attribute}"'
+                    )
+            rendered_segment = _render_code(
+                language,
+                raw_contents,
+                cache,
+                code_style,
+                css_classes,
+            )
+            if (language or "text") not in result.languages:
+                result.languages.append(language or "text")
         else:
             raise ValueError(
-                f'Unsupported tag "{tag_name}". This is a programmer error'
+                f'Unsupported tag "{tag.name}". This is a programmer error'
             )
 
-        segments.append(post_text[prev_index : match_open.start()])
+        segments.append(post_text[prev_index : tag.start])
         segments.append(rendered_segment)
-        prev_index = close_end
+        prev_index = tag.end
 
     segments.append(post_text[prev_index:])
     # Filter out empty strings
     processed = "\n".join([s for s in segments if s and s != "\n"])
 
     # Run the Markdown renderer over the processed result
-    return markdown2.markdown(processed)
-
+    result.html = markdown2.markdown(processed)
+    return result
 
-def _find_closing_tag(tag_name: str, text: str, pos: int) -> typing.Tuple[int, int]:
-    """
-    Find the closing tag for `tag_name` in `text` starting at `pos`.
 
-    Returns a tuple containing (start, end) of the closing tag, indexed in `text`.
+def _render_image(
+    image_tag: CustomTag,
+    result: RenderResult,
+    image_sources: typing.Optional[ImageSources] = None,
+) -> str:
     """
-    # Search for the next closing tag after the current open
-    match_close = re.search(MATCH_TAG_CLOSE, text[pos:])
-    if not match_close or match_close.group(1) != tag_name:
-        raise ValueError(f"An {tag_name} tag is not closed")
-    return (pos + match_close.start(), pos + match_close.end())
-
-
-def _render_image(image_elem: bs4.element.Tag) -> str:
+    Render custom <x-image> tag into an HTML string. The image and any
+    warnings are recorded in `result`.
     """
-    Render custom <x-image> tag into an HTML string.
+    path_elems = image_tag.get_children("path")
+    caption_elems = image_tag.get_children("caption")
+    alt_elems = image_tag.get_children("alt")
 
-    `image_elem`: the tag as it exists in the current BS4 tree
-    """
-    path_elems = image_elem.findChildren("path", recursive=False)
-    caption_elems = image_elem.findChildren("caption", recursive=False)
-    alt_elems = image_elem.findChildren("alt", recursive=False)
-
-    if len(path_elems) != 1:
+    if len(path_elems) != 1 or not path_elems[0].text:
         raise ValueError('"x-image" tag does not have exactly one "path" specified')
-    if len(caption_elems) == 2:
+    if len(caption_elems) > 1:
         raise ValueError('"x-image" tag has more than one "caption" specified')
-    if len(alt_elems) == 2:
+    if len(alt_elems) > 1:
         raise ValueError('"x-image" tag has more than one "alt" specified')
 
-    path = path_elems[0].contents[0]
-    caption = caption_elems[0].contents[0] if caption_elems else None
-    alt = alt_elems[0].contents[0] if alt_elems else ""
+    path = path_elems[0].text
+    caption = caption_elems[0].text if caption_elems else None
+    alt = alt_elems[0].text if alt_elems else ""
+
+    result.images.append(path.replace('"', ""))
+    if not alt:
+        result.warnings.append(f'Image "{path}" has no "alt" text')
 
     # Render custom <figure> HTML
-    return _create_figure_html(path, caption, alt)
+    sources = image_sources.get(path, []) if image_sources else []
+    return _create_figure_html(path, caption, alt, sources)
 
 
-def _create_figure_html(url: str, caption: str = None, alt: str = "") -> str:
+def _create_figure_html(
+    url: str,
+    caption: str = None,
+    alt: str = "",
+    sources: typing.Sequence[ImageSource] = (),
+) -> str:
     """Given parameters, return an HTML string of a `figure` element."""
+    if sources:
+        return _create_picture_figure_html(url, caption, alt, sources)
     if caption:
-        # This is a dumb workaround to render the caption but remove the leading "<p>"
-        # TODO: ALL WE NEED IS SIMPLE LINK-HANDLING. THIS COULD PROBABLY BE DONE WITH REGEX
-        caption_html = (
-            markdown2.markdown(caption).replace(r"<p>", "").replace(r"<\p>", "").strip()
-        )
         return (
             f"<figure>"
             f'    <img src="{url}" alt="{alt}">'
-            f"    <figcaption>{caption_html}</figcaption>"
+            f"    <figcaption>{_render_caption(caption)}</figcaption>"
             f"</figure>"
         )
     else:
         return f"<figure>" f'    <img src="{url}" alt="{alt}">' f"</figure>"
 
 
-def _render_code(code_elem: bs4.element.Tag, raw_contents: str) -> str:
+def _render_caption(caption: str) -> str:
+    """Render the caption of a figure into an HTML string."""
+    # This is a dumb workaround to render the caption but remove the leading "<p>"
+    # TODO: ALL WE NEED IS SIMPLE LINK-HANDLING. THIS COULD PROBABLY BE DONE WITH REGEX
+    return markdown2.markdown(caption).replace(r"<p>", "").replace(r"<\p>", "").strip()
+
+
+def _create_picture_figure_html(
+    url: str,
+    caption: typing.Optional[str],
+    alt: str,
+    sources: typing.Sequence[ImageSource],
+) -> str:
+    """
+    Return an HTML string of a `figure` element whose image is a `picture`
+    with a `source` for every format of `sources`. JPG copies form the
+    `srcset` of the fallback `img`.
+    """
+    srcsets: typing.Dict[str, typing.List[str]] = {}
+    for source in sorted(sources, key=lambda source: source.width):
+        srcsets.setdefault(source.mime_type, []).append(f"{source.url} {source.width}w")
+    img_srcset = srcsets.pop("image/jpeg", None)
+    html = "<figure><picture>"
+    for mime_type, srcset in srcsets.items():
+        html += (
+            f'<source type="{mime_type}" srcset="{", ".join(srcset)}" '
+            f'sizes="{FIGURE_SIZES}">'
+        )
+    if img_srcset:
+        html += (
+            f'<img src="{url}" srcset="{", ".join(img_srcset)}" '
+            f'sizes="{FIGURE_SIZES}" alt="{alt}">'
+        )
+    else:
+        html += f'<img src="{url}" alt="{alt}">'
+    html += "</picture>"
+    if caption:
+        html += f"<figcaption>{_render_caption(caption)}</figcaption>"
+    return html + "</figure>"
+
+
+def _render_code(
+    language: typing.Optional[str],
+    raw_contents: str,
+    cache: typing.Optional[RenderCache] = None,
+    code_style: str = DEFAULT_CODE_STYLE,
+    css_classes: bool = False,
+) -> str:
     """Render custom <x-code> element into an HTML string."""
-    language = code_elem["language"] if code_elem.has_attr("language") else None
-    try:
-        # Use `TextLexer` as default if no language specified
-        lexer = get_lexer_by_name(language if language else "text")
-    except pygments.util.ClassNotFound:
-        raise ValueError(f'Invalid "language" parameter in <x-code> element {language}')
-    # TODO: COULD PROVIDE A GLOBAL SETTING FOR THE 'STYLE' TO USE (see https://pygments.org/styles/)
-    # https://pygments.org/docs/formatters/#HtmlFormatter
-    formatter = HtmlFormatter(noclasses=True)
+    if cache is not None:
+        key = make_key(
+            f"{language}\0{raw_contents}",
+            _make_namespace("code", code_style, css_classes),
+        )
+        cached = cache.get(key)
+        if cached is None:
+            cached = _render_code(language, raw_contents, None, code_style, css_classes)
+            cache.set(key, cached)
+        return cached
+    # Use `TextLexer` as default if no language specified
+    lexer = _get_lexer(language if language else "text")
+    formatter = _get_formatter(code_style, css_classes)
     # Render pygments within a Jinja "raw" block to avoid inadvertent template evaluation
     return (
         r"<div>{% raw %}"
@@ -144,28 +320,131 @@ def _render_code(code_elem: bs4.element.Tag, raw_contents: str) -> str:
     )
 
 
+def get_code_stylesheet(code_style: str = DEFAULT_CODE_STYLE) -> str:
+    """
+    Return the CSS for code rendered with `css_classes=True` in the
+    given Pygments style.
+    """
+    if not is_code_style_valid(code_style):
+        raise ValueError(f'Invalid code style "{code_style}"')
+    return _get_formatter(code_style, True).get_style_defs(f".{CODE_CSS_CLASS}")
+
+
+@functools.lru_cache(maxsize=None)
+def is_code_style_valid(code_style: str) -> bool:
+    """Return whether `code_style` is the name of a Pygments style."""
+    try:
+        get_style_by_name(code_style)
+        return True
+    except pygments.util.ClassNotFound:
+        return False
+
+
+@functools.lru_cache(maxsize=None)
+def _get_lexer(language: str) -> Lexer:
+    """
+    Return the lexer for `language`.
+
+    Looking up a lexer by name searches Pygments' registry of lexers and
+    plugins, so lexers are memoized. Lexers hold no state between calls
+    to `highlight()`, so they can be shared. Invalid languages are not
+    memoized, as `lru_cache` does not cache exceptions.
+    """
+    try:
+        return get_lexer_by_name(language)
+    except pygments.util.ClassNotFound:
+        raise ValueError(f'Invalid "language" parameter in <x-code> element {language}')
+
+
+@functools.lru_cache(maxsize=None)
+def _get_formatter(code_style: str, css_classes: bool) -> HtmlFormatter:
+    """Return the (shared) formatter for the given style and CSS mode."""
+    # https://pygments.org/docs/formatters/#HtmlFormatter
+    return HtmlFormatter(
+        style=code_style, noclasses=not css_classes, cssclass=CODE_CSS_CLASS
+    )
+
+
+def _make_namespace(kind: str, code_style: str, css_classes: bool) -> str:
+    """Make the cache namespace for output rendered with the given options."""
+    return f"{kind}:{code_style}:{'classes' if css_classes else 'inline'}"
+
+
+@dc.dataclass
+class ImageReference:
+    """
+    An image path given in a custom "x-image" tag.
+
+    `start` and `end` are the offsets of the path in the original text.
+    """
+
+    path: str
+    start: int
+    end: int
+
+
+def find_image_references(post_markdown: str) -> typing.List[ImageReference]:
+    """
+    Read the provided Markdown string and return the image paths given in
+    custom "x-image" tags, along with their offsets.
+
+    Raises ValueError if a custom tag is not closed.
+    """
+    return [
+        ImageReference(path.text.replace('"', ""), path.start, path.end)
+        for tag in tokenize(post_markdown)
+        if tag.name == IMAGE_TAG
+        for path in tag.get_children("path")
+    ]
+
+
 def find_images(post_markdown: str) -> typing.List[str]:
     """
     Read the provided Markdown string and return a list of found image
-    paths as given in custom "<figure>" tags.
+    paths as given in custom "x-image" tags.
 
     These will likely be paths relative to the original Markdown file's location).
     """
-    soup = bs4.BeautifulSoup(post_markdown, features="html.parser")
-    paths = []
-    for image_elem in soup.find_all("x-image"):
-        paths.append(
-            image_elem.findChildren("path", recursive=False)[0]
-            .contents[0]
-            .replace('"', "")
-        )
-    return paths
+    return [reference.path for reference in find_image_references(post_markdown)]
+
+
+def replace_image_paths(
+    post_markdown: str,
+    new_paths: typing.Dict[str, str],
+    references: typing.Optional[typing.List[ImageReference]] = None,
+) -> str:
+    """
+    Return a copy of the provided Markdown string in which each image path
+    that is a key of `new_paths` is replaced with the corresponding value.
+
+    Only the paths themselves are replaced, so other occurrences of the same
+    string in the text are left untouched. `references` may be passed in if
+    `find_image_references()` has already been called on the text.
+    """
+    if references is None:
+        references = find_image_references(post_markdown)
+    segments = []
+    prev_index = 0
+    for reference in references:
+        if reference.path in new_paths:
+            segments.append(post_markdown[prev_index : reference.start])
+            segments.append(new_paths[reference.path])
+            prev_index = reference.end
+    segments.append(post_markdown[prev_index:])
+    return "".join(segments)
 
 
-def is_markdown_valid(markdown: str) -> bool:
-    # Render HTML to check for errors
+def is_markdown_valid(
+    markdown: str,
+    cache: typing.Optional[RenderCache] = None,
+    code_style: str = DEFAULT_CODE_STYLE,
+    css_classes: bool = False,
+) -> bool:
+    # Render HTML to check for errors. Only successful renders are cached,
+    # so a cache hit means that the Markdown is valid. Prefer calling
+    # `render()` directly if the HTML is needed as well.
     try:
-        render_string(markdown)
+        render(markdown, cache, code_style, css_classes)
         return True
     except Exception:
         return False
@@ -0,0 +1,89 @@
+import os
+
+from stefan_on_software_renderer import renderer
+from stefan_on_software_renderer.cache import DiskStore, RenderCache
+
+"""Tests for the render cache."""
+
+
+def test_lru_eviction():
+    """The least-recently used entry should be evicted once the cache is full."""
+    cache = RenderCache(max_size=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    # Access "a" so that "b" becomes the least-recently used entry
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+    assert len(cache) == 2
+    assert cache.evictions == 1
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+
+
+def test_counters():
+    cache = RenderCache()
+    html = renderer.render_string("# Title", cache)
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert renderer.render_string("# Title", cache) == html
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_shared_code_blocks():
+    """Identical code blocks in different documents should only be rendered once."""
+    cache = RenderCache()
+    code = '<x-code language="python">\nprint("Hello world")\n</x-code>'
+    html_1 = renderer.render_string(f"# First\n\n{code}", cache)
+    html_2 = renderer.render_string(f"# Second\n\n{code}", cache)
+    assert html_1 == renderer.render_string(f"# First\n\n{code}")
+    assert html_2 == renderer.render_string(f"# Second\n\n{code}")
+    # Two document misses, one code block miss, one code block hit
+    assert cache.misses == 3
+    assert cache.hits == 1
+
+
+def test_options_in_key():
+    """Output rendered with different code options should be cached separately."""
+    cache = RenderCache()
+    code = '<x-code language="python">x = 1</x-code>'
+    inline_html = renderer.render_string(code, cache)
+    classes_html = renderer.render_string(code, cache, css_classes=True)
+    monokai_html = renderer.render_string(code, cache, code_style="monokai")
+    assert len({inline_html, classes_html, monokai_html}) == 3
+    assert cache.hits == 0
+
+
+def test_invalid_not_cached():
+    cache = RenderCache()
+    assert not renderer.is_markdown_valid(
+        '<x-code language="not-a-language">x</x-code>', cache
+    )
+    assert len(cache) == 0
+
+
+def test_disk_store(tmp_path):
+    """Entries written by one cache should be readable by another sharing the store."""
+    cache_1 = RenderCache(store=DiskStore(tmp_path / "cache"))
+    html = renderer.render_string("# Title", cache_1)
+
+    cache_2 = RenderCache(store=DiskStore(tmp_path / "cache"))
+    assert renderer.render_string("# Title", cache_2) == html
+    assert cache_2.hits == 1
+    assert cache_2.misses == 0
+
+
+def test_disk_store_eviction(tmp_path):
+    """The least recently used entries should be deleted once the store is full."""
+    store = DiskStore(tmp_path / "cache", max_entries=3)
+    for i, key in enumerate(["a", "b", "c"]):
+        store.set(key, key)
+        # Give each entry a distinct time of last use
+        os.utime(tmp_path / "cache" / key, ns=(i * 10**9, i * 10**9))
+    assert store.get("a") == "a"
+
+    store.set("d", "d")
+    assert sorted(os.listdir(tmp_path / "cache")) == ["a", "c", "d"]
+    assert store.get("b") is None
+    for _ in range(5):
+        store.set("d", "d")
+    assert len(os.listdir(tmp_path / "cache")) == 3
@@ -2,6 +2,8 @@ import pathlib
 
 import pytest
 from stefan_on_software_renderer import renderer
+from stefan_on_software_renderer.cache import RenderCache
+from stefan_on_software_renderer.renderer import ImageSource
 
 """
 A couple very simple tests.
@@ -61,3 +63,115 @@ unordered_map<ItemType, list<InvCoordinate>> hotbarMappings;
 unordered_map<span style="color: #666666">&lt;</span>ItemType,<span style="color: #bbbbbb"> </span>list<span style="color: #666666">&lt;</span>InvCoordinate<span style="color: #666666">&gt;&gt;</span><span style="color: #bbbbbb"> </span>hotbarMappings;<span style="color: #bbbbbb"></span>
 </pre></div>{% endraw %}</div>"""
     assert renderer.render_string(str).strip() == expected
+
+
+def test_find_image_references(example_markdown):
+    """The offsets of each reference should point to the path in the text."""
+    references = renderer.find_image_references(example_markdown)
+    assert [ref.path for ref in references] == renderer.find_images(example_markdown)
+    for ref in references:
+        assert example_markdown[ref.start : ref.end] == ref.path
+
+
+def test_replace_image_paths():
+    """Only the image paths should be replaced, not other occurrences of the string."""
+    text = (
+        "See image.jpg below.\n"
+        "<x-image><path>image.jpg</path><caption>image.jpg</caption></x-image>\n"
+        "<x-image><path>other.jpg</path></x-image>"
+    )
+    expected = (
+        "See image.jpg below.\n"
+        "<x-image><path>/static/1234.jpg</path><caption>image.jpg</caption></x-image>\n"
+        "<x-image><path>other.jpg</path></x-image>"
+    )
+    actual = renderer.replace_image_paths(text, {"image.jpg": "/static/1234.jpg"})
+    assert actual == expected
+
+
+def test_render_code_css_classes():
+    """With `css_classes`, tokens should get classes that the stylesheet defines."""
+    text = '<x-code language="python">x = 1</x-code>'
+    html = renderer.render_string(text, css_classes=True)
+    assert 'class="highlight"' in html
+    assert "style=" not in html
+    assert '<span class="n">x</span>' in html
+    stylesheet = renderer.get_code_stylesheet()
+    assert ".highlight .n" in stylesheet
+
+
+def test_render_code_style():
+    """The configured Pygments style should be used for highlighting."""
+    text = '<x-code language="python">x = 1</x-code>'
+    default_html = renderer.render_string(text)
+    monokai_html = renderer.render_string(text, code_style="monokai")
+    assert default_html != monokai_html
+    assert renderer.get_code_stylesheet("monokai") != renderer.get_code_stylesheet()
+    with pytest.raises(ValueError):
+        renderer.render_string(text, code_style="not-a-style")
+    with pytest.raises(ValueError):
+        renderer.get_code_stylesheet("not-a-style")
+
+
+def test_render_result():
+    """`render()` should report the images, languages and warnings of the document."""
+    text = (
+        "<x-image><path>a.jpg</path><alt>A</alt></x-image>\n"
+        "<x-image><path>b.jpg</path></x-image>\n"
+        '<x-code language="python">x = 1</x-code>\n'
+        '<x-code lang="python">y = 2</x-code>\n'
+        '<x-code language="python">z = 3</x-code>'
+    )
+    result = renderer.render(text)
+    assert result.html == renderer.render_string(text)
+    assert result.images == ["a.jpg", "b.jpg"]
+    assert result.languages == ["python", "text"]
+    assert result.warnings == [
+        'Image "b.jpg" has no "alt" text',
+        '"x-code" tag has no "language" and will not be highlighted',
+        '"x-code" tag has unsupported attribute "lang"',
+    ]
+    assert result.render_time > 0
+    assert not result.from_cache
+
+
+def test_render_result_cached():
+    """A cached result should be equal to the original one."""
+    cache = RenderCache()
+    text = "<x-image><path>a.jpg</path></x-image>"
+    result = renderer.render(text, cache)
+    cached_result = renderer.render(text, cache)
+    assert cached_result.from_cache
+    assert cached_result.html == result.html
+    assert cached_result.images == result.images
+    assert cached_result.warnings == result.warnings
+
+
+def test_render_image_sources():
+    """An image with copies should be rendered as a <picture> with a <source> per format."""
+    text = "<x-image><path>a.jpg</path><alt>A</alt><caption>Cap</caption></x-image>"
+    sources = {
+        "a.jpg": [
+            ImageSource("a-400w.webp", 400, "image/webp"),
+            ImageSource("a-400w.jpg", 400, "image/jpeg"),
+            ImageSource("a.jpg", 1000, "image/jpeg"),
+            ImageSource("a-1000w.webp", 1000, "image/webp"),
+        ]
+    }
+    html = renderer.render_string(text, image_sources=sources)
+    assert "<picture>" in html
+    assert (
+        '<source type="image/webp" srcset="a-400w.webp 400w, a-1000w.webp 1000w"'
+        in html
+    )
+    assert '<img src="a.jpg" srcset="a-400w.jpg 400w, a.jpg 1000w"' in html
+    assert "<figcaption>Cap" in html
+    # Images without copies are rendered as before
+    assert renderer.render_string(text, image_sources={}) == renderer.render_string(
+        text
+    )
+
+    # The copies are part of the cache key
+    cache = RenderCache()
+    assert "<picture>" not in renderer.render(text, cache).html
+    assert "<picture>" in renderer.render(text, cache, image_sources=sources).html
@@ -0,0 +1,40 @@
+import pytest
+from stefan_on_software_renderer import tokenizer
+
+"""Tests for the custom-tag tokenizer."""
+
+EXAMPLE = """Some text.
+<x-image>
+    <path>image.jpg</path>
+    <caption>A &quot;caption&quot;</caption>
+</x-image>
+More text.
+<x-code language="c++">
+std::vector<int> v;
+</x-code>
+"""
+
+
+def test_tokenize():
+    tags = list(tokenizer.tokenize(EXAMPLE))
+    assert [tag.name for tag in tags] == ["x-image", "x-code"]
+
+    image, code = tags
+    assert EXAMPLE[image.start : image.end].startswith("<x-image>")
+    assert EXAMPLE[image.start : image.end].endswith("</x-image>")
+    path = image.get_children("path")[0]
+    assert path.text == "image.jpg"
+    assert EXAMPLE[path.start : path.end] == "image.jpg"
+    assert image.get_children("caption")[0].text == 'A "caption"'
+    assert not image.get_children("alt")
+
+    assert code.attributes == {"language": "c++"}
+    assert EXAMPLE[code.contents_start : code.contents_end] == "\nstd::vector<int> v;\n"
+    assert not code.children
+
+
+def test_tokenize_unclosed():
+    with pytest.raises(ValueError):
+        list(tokenizer.tokenize("<x-code>\nint a;\n"))
+    with pytest.raises(ValueError):
+        list(tokenizer.tokenize("<x-image><path>a.jpg</path></x-code>"))
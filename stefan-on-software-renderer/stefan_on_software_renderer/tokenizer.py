@@ -0,0 +1,123 @@
+"""
+A single-pass tokenizer for the custom XML tags that may be embedded in
+post text.
+
+The tokenizer walks the document once and reports each custom tag with its
+offsets in the original text, along with its attributes and (for tags that
+have them) its child elements. It never copies the remainder of the document
+and does not build a parse tree, so its cost is linear in the document size.
+"""
+import dataclasses as dc
+import html
+import re
+import typing
+
+IMAGE_TAG = "x-image"
+CODE_TAG = "x-code"
+CUSTOM_TAGS = [IMAGE_TAG, CODE_TAG]
+# Child elements supported by the "x-image" tag
+IMAGE_CHILDREN = ["path", "caption", "alt"]
+
+# Note: this will not support tags such as "<x-code/>". Each tag needs an open and a close.
+MATCH_TAG_OPEN = re.compile(f'<({"|".join(CUSTOM_TAGS)})[^>]*>')
+MATCH_TAG_CLOSE = re.compile(f'</({"|".join(CUSTOM_TAGS)})>')
+# Matches a child element, e.g. "<path>image.jpg</path>"
+MATCH_CHILD = re.compile(
+    f'<({"|".join(IMAGE_CHILDREN)})>(.*?)</\\1>', re.DOTALL | re.IGNORECASE
+)
+# Matches an attribute in an opening tag, e.g. 'language="java"'
+MATCH_ATTRIBUTE = re.compile(
+    r"""([^\s=/>"']+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?"""
+)
+
+
+@dc.dataclass
+class ChildElement:
+    """
+    A child element of a custom tag, e.g. the "path" of an "x-image".
+
+    `start` and `end` are the offsets of the element's *text* in the
+    original document.
+    """
+
+    name: str
+    text: str
+    start: int
+    end: int
+
+
+@dc.dataclass
+class CustomTag:
+    """
+    A custom tag found in a document.
+
+    `start` and `end` are the offsets of the whole tag (including the opening
+    and closing tags) in the original document. `contents_start` and
+    `contents_end` are the offsets of the raw text between them.
+    """
+
+    name: str
+    start: int
+    end: int
+    contents_start: int
+    contents_end: int
+    attributes: typing.Dict[str, str]
+    children: typing.List[ChildElement]
+
+    def get_children(self, name: str) -> typing.List[ChildElement]:
+        """Return all child elements with the given name."""
+        return [child for child in self.children if child.name == name]
+
+
+def tokenize(text: str) -> typing.Iterator[CustomTag]:
+    """
+    Find the custom tags in `text`, in order of appearance.
+
+    Raises ValueError if a tag is not closed.
+    """
+    pos = 0
+    while True:
+        match_open = MATCH_TAG_OPEN.search(text, pos)
+        if not match_open:
+            return
+        tag_name = match_open.group(1)
+        match_close = MATCH_TAG_CLOSE.search(text, match_open.end())
+        if not match_close or match_close.group(1) != tag_name:
+            raise ValueError(f"An {tag_name} tag is not closed")
+
+        yield CustomTag(
+            name=tag_name,
+            start=match_open.start(),
+            end=match_close.end(),
+            contents_start=match_open.end(),
+            contents_end=match_close.start(),
+            attributes=_parse_attributes(
+                text, match_open.start(1) + len(tag_name), match_open.end() - 1
+            ),
+            children=_parse_children(text, match_open.end(), match_close.start())
+            if tag_name == IMAGE_TAG
+            else [],
+        )
+        pos = match_close.end()
+
+
+def _parse_attributes(text: str, start: int, end: int) -> typing.Dict[str, str]:
+    """Parse the attributes found in `text[start:end]` of an opening tag."""
+    attributes = {}
+    for match in MATCH_ATTRIBUTE.finditer(text, start, end):
+        value = next((v for v in match.group(2, 3, 4) if v is not None), "")
+        attributes[match.group(1).lower()] = html.unescape(value)
+    return attributes
+
+
+def _parse_children(text: str, start: int, end: int) -> typing.List[ChildElement]:
+    """Parse the child elements found in `text[start:end]`."""
+    return [
+        ChildElement(
+            name=match.group(1).lower(),
+            text=html.unescape(match.group(2)),
+            start=match.start(2),
+            end=match.end(2),
+        )
+        for match in MATCH_CHILD.finditer(text, start, end)
+    ]
@@ -1,9 +1,11 @@
+import atexit
 import copy
 import datetime
 import os
 
 import flask
 from stefan_on_software.site_config import ConfigKeys, SiteConfig
+from stefan_on_software_renderer.cache import DiskStore, RenderCache
 from stefansearch.engine.search_engine import SearchEngine
 
 # Note: initialization order matters. db must be initialized first.
@@ -32,7 +34,18 @@ def create_app(config: SiteConfig = None):
     # Set path for where the sitemap file should be stored.
     app.config[ConfigKeys.SITEMAP_PATH] = os.path.join(app.static_folder, "sitemap.xml")
 
-    from . import auth, cli, defaults
+    from . import (
+        auth,
+        cli,
+        defaults,
+        email_provider,
+        image_pipeline,
+        job_queue,
+        page_cache,
+        site_logger,
+        sitemapper,
+        tag_manager,
+    )
 
     # Populate app.config with paths that are set by default
     app.config.update(defaults.make_defaults(app.instance_path))
@@ -63,10 +76,78 @@ def create_app(config: SiteConfig = None):
     # Init search engine
     app.search_engine = SearchEngine(app.config[ConfigKeys.SEARCH_INDEX_PATH])
 
+    # Init cache for rendered post content
+    app.render_cache = RenderCache(
+        app.config[ConfigKeys.RENDER_CACHE_SIZE],
+        DiskStore(app.config[ConfigKeys.RENDER_CACHE_PATH])
+        if app.config[ConfigKeys.RENDER_CACHE_ON_DISK]
+        else None,
+    )
+
+    # Init cache for rendered public pages
+    app.page_cache = page_cache.PageCache(
+        page_cache.SQLiteStore(
+            app.config[ConfigKeys.PAGE_CACHE_PATH],
+            app.config[ConfigKeys.PAGE_CACHE_SIZE],
+        ),
+        app.config[ConfigKeys.PAGE_CACHE_SIZE],
+        app.config[ConfigKeys.PAGE_CACHE_SHARED],
+    )
+
+    # Init processing of uploaded images. Images are processed synchronously
+    # when testing.
+    app.image_pipeline = image_pipeline.ImagePipeline(
+        0 if app.config[ConfigKeys.TESTING] else app.config[ConfigKeys.IMAGE_WORKERS]
+    )
+    atexit.register(app.image_pipeline.close)
+
+    # Init cache for the number of posts per tag
+    app.post_counts_cache = tag_manager.PostCountsCache()
+
+    # Init background logging of visits
+    app.traffic_logger = site_logger.TrafficLogger(
+        app.config[ConfigKeys.TRAFFIC_LOG_PATH],
+        app.config[ConfigKeys.SITE_ANALYTICS_URL]
+        if app.config[ConfigKeys.USE_SITE_ANALYTICS]
+        else None,
+        app.config[ConfigKeys.SITE_ANALYTICS_KEY],
+        max_queue_size=app.config[ConfigKeys.TRAFFIC_QUEUE_SIZE],
+        timeout=app.config[ConfigKeys.SITE_ANALYTICS_TIMEOUT],
+        max_log_bytes=app.config[ConfigKeys.TRAFFIC_LOG_MAX_BYTES],
+        max_log_age=datetime.timedelta(
+            days=app.config[ConfigKeys.TRAFFIC_LOG_MAX_DAYS]
+        ),
+        logger=app.logger,
+    )
+    app.traffic_logger.start()
+    atexit.register(app.traffic_logger.close)
+
+    # Init background regeneration of the sitemap
+    app.sitemap_scheduler = sitemapper.SitemapScheduler(
+        app,
+        delay=app.config[ConfigKeys.SITEMAP_UPDATE_DELAY],
+        ping_interval=app.config[ConfigKeys.SITEMAP_PING_INTERVAL],
+    )
+    atexit.register(app.sitemap_scheduler.close)
+
+    # Init background jobs. Handlers are registered by the modules defining
+    # them (e.g. `email_provider`, imported by the API blueprints).
+    app.job_worker = job_queue.JobWorker(app)
+    if app.config[ConfigKeys.JOB_WORKER_ENABLED] and not app.config[ConfigKeys.TESTING]:
+        # Started by the first request rather than here, so that CLI commands
+        # (e.g. `flask init_site` or `flask jobs work`) don't run jobs
+        app.before_request(app.job_worker.start)
+        atexit.register(app.job_worker.close)
+    # The email provider is created on first use (see `get_email_provider()`)
+    atexit.register(email_provider.close_email_provider, app)
+
     # Register click commands
     app.cli.add_command(cli.init_site)
     app.cli.add_command(cli.delete_site)
     app.cli.add_command(cli.add_user)
+    app.cli.add_command(cli.traffic_stats)
+    app.cli.add_command(cli.backfill_images)
+    app.cli.add_command(cli.jobs)
 
     @app.template_filter("iso8601")
     def _jinja2_format_datetime_iso8601(dt: datetime.datetime) -> str:
@@ -2,7 +2,7 @@ import flask
 import marshmallow
 from flask import Response, current_app, request
 from stefan_on_software.contracts.register_email import RegisterEmailContract
-from stefan_on_software.email_provider import get_email_provider
+from stefan_on_software.email_provider import queue_registration
 from stefan_on_software.site_config import ConfigKeys
 
 # Blueprint under which all views will be assigned
@@ -27,8 +27,7 @@ def register_email():
     except marshmallow.exceptions.ValidationError:
         return Response(status=400, response="Invalid email address")
 
-    try:
-        get_email_provider().register_email(contract.address)
-        return flask.Response(status=200)
-    except ValueError as e:
-        return flask.Response(status=500, response=str(e))
+    # Registered in the background. Failures are retried and can be
+    # inspected via `flask jobs list`.
+    queue_registration(contract.address)
+    return flask.Response(status=200)
@@ -1,8 +1,15 @@
+from datetime import datetime
+
 import flask
+import marshmallow
 import stefan_on_software.file_manager as file_manager
 from flask import Response, current_app, jsonify, request
 from flask_login import current_user, login_required
-from stefan_on_software.models.file import File
+from sqlalchemy import desc, or_
+from sqlalchemy.orm import joinedload
+from stefan_on_software import pagination
+from stefan_on_software.contracts.get_files import GetFilesContract
+from stefan_on_software.models.file import File, FileType
 
 BLUEPRINT = flask.Blueprint("files", __name__, url_prefix="/api/v1/files")
 
@@ -10,8 +17,67 @@ BLUEPRINT = flask.Blueprint("files", __name__, url_prefix="/api/v1/files")
 @BLUEPRINT.route("", methods=["GET"])
 @login_required
 def get_files():
-    """Get files that have been uploaded."""
-    return jsonify([f.make_contract().make_json() for f in File.query.all()])
+    """
+    Get files that have been uploaded, most recent first, a page at a time.
+
+    If there are more files, the URL of the next page is given in the `Link`
+    header and its cursor in the `X-Next-Cursor` header. `fields` limits the
+    returned JSON to the given comma-separated keys. The JSON is streamed.
+    """
+    try:
+        contract = GetFilesContract.from_json(request.args)
+    except marshmallow.exceptions.ValidationError as e:
+        return jsonify(f"Invalid parameters: {e}"), 400
+
+    query = File.query.options(joinedload(File.uploaded_by))
+    if contract.filetype is not None:
+        query = query.filter(File.filetype == FileType(contract.filetype))
+    if contract.uploaded_by is not None:
+        query = query.filter(File.uploaded_by_id == contract.uploaded_by)
+    if contract.uploaded_after is not None:
+        query = query.filter(File.upload_date >= contract.uploaded_after)
+    if contract.uploaded_before is not None:
+        query = query.filter(File.upload_date < contract.uploaded_before)
+    if contract.hash is not None:
+        # Match the hash of the stored file or of the file as it was uploaded
+        query = query.filter(
+            or_(File.hash == contract.hash, File.original_hash == contract.hash)
+        )
+    if contract.cursor is not None:
+        try:
+            values = pagination.decode_cursor(
+                contract.cursor, datetime.fromisoformat, str
+            )
+        except pagination.InvalidCursor as e:
+            return jsonify(str(e)), 400
+        query = query.filter(pagination.after((File.upload_date, File.id), values))
+    # Fetch one more file than requested to find out whether there is a next page
+    files = (
+        query.order_by(desc(File.upload_date), desc(File.id))
+        .limit(contract.limit + 1)
+        .all()
+    )
+
+    headers = {}
+    if len(files) > contract.limit:
+        files = files[: contract.limit]
+        cursor = pagination.encode_cursor(files[-1].upload_date, files[-1].id)
+        headers = pagination.make_next_headers("files.get_files", cursor)
+
+    def generate():
+        yield "["
+        for i, file in enumerate(files):
+            _json = file.make_contract().make_json()
+            if contract.fields:
+                _json = {key: _json[key] for key in contract.fields}
+            yield ("," if i else "") + flask.json.dumps(_json)
+        yield "]"
+
+    return Response(
+        flask.stream_with_context(generate()),
+        mimetype="application/json",
+        headers=headers,
+    )
 
 
 @BLUEPRINT.route("", methods=["POST"])
@@ -29,6 +95,8 @@ def upload_file():
         return jsonify(created.make_contract().make_json()), 201
     except file_manager.InvalidExtension:
         return jsonify("Unsupported or missing file extension"), 400
+    except file_manager.InvalidFile as e:
+        return jsonify(f"Invalid file: {e}"), 400
     except file_manager.FileAlreadyExists as e:
         return jsonify(e.duplicate.make_contract().make_json()), 200
     except Exception as e:
@@ -42,7 +110,8 @@ def download_file(file_id: str):
     file = File.query.filter_by(id=file_id).first()
     if not file:
         return Response(status=404)
-    return flask.send_file(file.get_path())
+    # Files are stored by content, so their hash is a strong ETag
+    return flask.send_file(file.get_path(), etag=file.hash)
 
 
 @BLUEPRINT.route("/<string:file_id>", methods=["DELETE"])
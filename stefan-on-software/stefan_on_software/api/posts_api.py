@@ -1,9 +1,11 @@
+from datetime import datetime
+
 import marshmallow
 import stefan_on_software.api.util as util
 from flask import Blueprint, Response, current_app, jsonify, request, send_file
 from flask_login import current_user, login_required
 from sqlalchemy import desc
-from stefan_on_software import post_manager
+from stefan_on_software import page_cache, pagination, post_manager, tag_manager
 from stefan_on_software.contracts.add_tag import AddTagContract
 from stefan_on_software.contracts.create_post import CreatePostContract
 from stefan_on_software.contracts.get_posts import GetPostsContract
@@ -36,20 +38,47 @@ def get_posts():
         return jsonify(f"Invalid parameters: {e}"), 400
 
     # Create query dynamically based on the parameters passed in the request
-    query = Post.query
+    query = Post.query.options(*Post.eager_loading(for_contract=True))
     if contract.is_featured is not None:
         query = query.filter(Post.is_featured == contract.is_featured)
     if contract.is_published is not None:
         query = query.filter(Post.is_published == contract.is_published)
-    query = query.order_by(desc(Post.last_modified))
-    res = query.paginate(
-        page=contract.offset if contract.offset else 1,
-        per_page=contract.limit if contract.limit else 20,
-    )
+    # Look up posts by slug via its unique index
+    if contract.slug is not None:
+        query = query.filter(Post.slug == contract.slug)
+    if contract.slugs is not None:
+        query = query.filter(Post.slug.in_(contract.slugs))
+    query = query.order_by(desc(Post.last_modified), desc(Post.id))
+    if contract.limit:
+        limit = contract.limit
+    elif contract.slugs:
+        # Return all requested posts at once
+        limit = len(contract.slugs)
+    else:
+        limit = 20
+    if contract.cursor is not None:
+        try:
+            values = pagination.decode_cursor(
+                contract.cursor, datetime.fromisoformat, int
+            )
+        except pagination.InvalidCursor as e:
+            return jsonify(str(e)), 400
+        query = query.filter(pagination.after((Post.last_modified, Post.id), values))
+    elif contract.offset:
+        # Page numbers are still supported, but have to skip the previous pages
+        query = query.offset((contract.offset - 1) * limit)
+    # Fetch one more post than requested to find out whether there is a next page
+    posts = query.limit(limit + 1).all()
     # Offset specified but no results: request is out of range
-    if contract.offset and not res:
+    if contract.offset and not posts:
         return Response(status=404)
-    return jsonify([post.make_contract().make_json() for post in res.items])
+
+    headers = {}
+    if len(posts) > limit:
+        posts = posts[:limit]
+        cursor = pagination.encode_cursor(posts[-1].last_modified, posts[-1].id)
+        headers = pagination.make_next_headers("posts.get_posts", cursor)
+    return jsonify([post.make_contract().make_json() for post in posts]), headers
 
 
 @BLUEPRINT.route("", methods=["POST"])
@@ -77,7 +106,11 @@ def create_post():
 @login_required
 def get_single_post(post_id: int):
     """Get a single post by its ID."""
-    post = Post.query.filter_by(id=post_id).first()
+    post = (
+        Post.query.options(*Post.eager_loading(for_contract=True))
+        .filter_by(id=post_id)
+        .first()
+    )
     if not post:
         return Response(status=404)
     return jsonify(post.make_contract().make_json())
@@ -134,13 +167,13 @@ def set_content(post_id: int):
     try:
         raw_markdown, _ = util.get_uploaded_file(request)
     except ValueError as e:
-        return jsonify(e), 400
+        return jsonify(str(e)), 400
 
     try:
         post_manager.set_content(post_id, raw_markdown)
         return Response(status=204)
     except InvalidMarkdown as e:
-        return jsonify(e), 400
+        return jsonify(str(e)), 400
     except Exception as e:
         current_app.logger.error(f"Unknown exception while setting content: {e}")
         return Response(status=500)
@@ -173,6 +206,8 @@ def add_tag(post_id: int):
     if tag not in post.tags:
         post.tags.append(tag)
         db.session.commit()
+        tag_manager.invalidate_post_counts()
+        page_cache.invalidate()
     return Response(status=204)
 
 
@@ -185,5 +220,7 @@ def remove_tag(post_id: int, tag: str):
     if tag in (t.slug for t in post.tags):
         post.tags = [t for t in post.tags if t.slug != tag]
         db.session.commit()
+        tag_manager.invalidate_post_counts()
+        page_cache.invalidate()
         return Response(status=204)
     return Response(status=400)
@@ -2,8 +2,9 @@ import marshmallow
 import stefan_on_software.api.util as util
 from flask import Blueprint, Response, jsonify, request
 from flask_login import login_required
-from stefan_on_software import sitemapper
+from stefan_on_software import page_cache, sitemapper, tag_manager
 from stefan_on_software.contracts.create_tag import CreateTagContract
+from stefan_on_software.contracts.get_tags import GetTagsContract
 from stefan_on_software.contracts.update_tag import UpdateTagContract
 from stefan_on_software.database import db
 from stefan_on_software.models.tag import Tag
@@ -16,7 +17,17 @@ BLUEPRINT = Blueprint("tags", __name__, url_prefix="/api/v1/tags")
 @login_required
 def get_all_tags():
     """Get all tags that have been created."""
-    return jsonify([tag.make_contract().make_json() for tag in Tag.query.all()])
+    try:
+        contract = GetTagsContract.from_json(request.args)
+    except marshmallow.exceptions.ValidationError as e:
+        return jsonify(f"Invalid parameters: {e}"), 400
+
+    tags = [tag.make_contract() for tag in Tag.query.all()]
+    if contract.with_counts:
+        post_counts = tag_manager.get_post_counts()
+        for tag in tags:
+            tag.post_count = post_counts.get(tag.slug, 0)
+    return jsonify([tag.make_json() for tag in tags])
 
 
 @BLUEPRINT.route("", methods=["POST"])
@@ -41,6 +52,7 @@ def create_tag():
     )
     db.session.add(tag)
     db.session.commit()
+    page_cache.invalidate()
     # Update the sitemap
     sitemapper.update_sitemap()
     return jsonify(tag.make_contract().make_json()), 201
@@ -73,6 +85,7 @@ def update_tag(tag: str):
     tag.description = contract.description
     tag.color = contract.color
     db.session.commit()
+    page_cache.invalidate()
     return jsonify(tag.make_contract().make_json()), 200
 
 
@@ -86,6 +99,8 @@ def delete_tag(tag: str):
 
     db.session.delete(tag)
     db.session.commit()
+    tag_manager.invalidate_post_counts()
+    page_cache.invalidate()
     # Update the sitemap
     sitemapper.update_sitemap()
     return Response(status=204)
@@ -1,12 +1,17 @@
 import os
 import shutil
+import time
 
 import click
 import flask
 from flask import current_app
+from sqlalchemy import or_
 from werkzeug.security import generate_password_hash
 
+from . import file_manager, job_queue, traffic_log
 from .database import db
+from .models.file import File, FileType
+from .models.job import Job, JobStatus
 from .models.user import User
 from .site_config import ConfigKeys
 
@@ -48,11 +53,66 @@ def init_site():
 @flask.cli.with_appcontext
 def delete_site():
     """Deletes instance and static folders."""
+    # Stop writing to the traffic log and sitemap before they are deleted
+    current_app.traffic_logger.close()
+    current_app.sitemap_scheduler.close(run_pending=False)
     shutil.rmtree(current_app.instance_path)
     shutil.rmtree(current_app.static_folder)
     click.echo("Deleted site")
 
 
+@click.command("traffic-stats")
+@click.option("--top", default=10, show_default=True, help="Number of top URLs to show")
+@flask.cli.with_appcontext
+def traffic_stats(top: int):
+    """
+    Print statistics over all segments of the traffic log. The number of
+    unique IPs and the hits of the top URLs are estimates.
+    """
+    stats = traffic_log.compute_stats(
+        traffic_log.read_visits(current_app.config[ConfigKeys.TRAFFIC_LOG_PATH]), top
+    )
+    click.echo(f"Total hits: {stats.total_hits}")
+    click.echo(f"Unique IPs: ~{stats.unique_ips}")
+    click.echo("Top URLs:")
+    for url, hits in stats.top_urls:
+        click.echo(f"  {hits:>8}  {url}")
+    click.echo("Hits per day:")
+    for day, hits in stats.hits_per_day.items():
+        click.echo(f"  {day.isoformat()}  {hits:>8}")
+
+
+@click.command("backfill-images")
+@click.option(
+    "--batch-size", default=100, show_default=True, help="Images to commit at a time"
+)
+@flask.cli.with_appcontext
+def backfill_images(batch_size: int):
+    """
+    Record the dimensions, format and orientation of images uploaded
+    before this metadata was recorded on upload.
+    """
+    file_ids = [
+        file_id
+        for (file_id,) in db.session.query(File.id).filter(
+            File.filetype == FileType.Image,
+            or_(File.width.is_(None), File.image_format.is_(None)),
+        )
+    ]
+    num_failed = 0
+    for start in range(0, len(file_ids), batch_size):
+        for file in File.query.filter(
+            File.id.in_(file_ids[start : start + batch_size])
+        ):
+            try:
+                file_manager.backfill_metadata(file)
+            except file_manager.InvalidFile as e:
+                click.echo(e, err=True)
+                num_failed += 1
+        db.session.commit()
+    click.echo(f"Backfilled {len(file_ids) - num_failed} images ({num_failed} failed)")
+
+
 @click.command("add_user")
 @click.argument("name")
 @click.argument("email")
@@ -81,3 +141,59 @@ def add_user(
     db.session.add(user)
     db.session.commit()
     click.echo("Created user")
+
+
+@click.group("jobs")
+def jobs():
+    """Inspect and run background jobs."""
+
+
+@jobs.command("list")
+@click.option(
+    "--status",
+    type=click.Choice([status.value for status in JobStatus], case_sensitive=False),
+    help="Only show jobs with this status",
+)
+@click.option("--limit", default=20, show_default=True)
+@flask.cli.with_appcontext
+def list_jobs(status: str, limit: int):
+    """List the most recent jobs."""
+    query = Job.query
+    if status:
+        query = query.filter(Job.status == JobStatus(status.upper()))
+    for job in query.order_by(Job.id.desc()).limit(limit):
+        click.echo(
+            f"{job.id:>6}  {job.kind:<20} {job.status.value:<10} attempts={job.attempts}/{job.max_attempts}  run_after={job.run_after:%Y-%m-%d %H:%M:%S}"
+            + (f"  error={job.last_error}" if job.last_error else "")
+        )
+
+
+@jobs.command("retry")
+@click.argument("job_id", type=int)
+@flask.cli.with_appcontext
+def retry_job(job_id: int):
+    """Run the job with JOB_ID again, e.g. after it has failed."""
+    job = db.session.get(Job, job_id)
+    if not job:
+        raise click.ClickException(f"No job with id={job_id}")
+    job_queue.retry(job)
+    click.echo(f"Job {job_id} will be retried")
+
+
+@jobs.command("work")
+@click.option("--once", is_flag=True, help="Run the jobs that are due, then exit")
+@click.option("--poll-interval", default=5.0, show_default=True)
+@flask.cli.with_appcontext
+def work(once: bool, poll_interval: float):
+    """Run jobs in the foreground, e.g. in a separate worker process."""
+    if once:
+        click.echo(f"Ran {job_queue.run_pending()} jobs")
+        return
+    worker = job_queue.JobWorker(current_app, poll_interval)
+    worker.start()
+    click.echo("Running jobs. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        worker.close()
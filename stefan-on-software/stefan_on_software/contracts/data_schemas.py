@@ -23,14 +23,19 @@ class TagContract:
     name: str
     description: str
     color: str
+    # Number of published posts with this tag. Only set if requested.
+    post_count: Optional[int] = None
 
     def make_json(self) -> Dict:
-        return {
+        res = {
             "slug": self.slug,
             "name": self.name,
             "description": self.description,
             "color": self.color,
         }
+        if self.post_count is not None:
+            res["post_count"] = self.post_count
+        return res
 
 
 @dc.dataclass
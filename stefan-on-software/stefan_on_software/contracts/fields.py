@@ -0,0 +1,12 @@
+from typing import List
+
+import marshmallow as msh
+
+
+class CommaSeparatedList(msh.fields.Field):
+    """A list of strings given as one comma-separated string, e.g. "id,url"."""
+
+    def _deserialize(self, value, attr, data, **kwargs) -> List[str]:
+        if not isinstance(value, str):
+            raise msh.ValidationError("Not a string.")
+        return [item.strip() for item in value.split(",") if item.strip()]
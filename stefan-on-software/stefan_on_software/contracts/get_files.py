@@ -0,0 +1,62 @@
+import dataclasses as dc
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import marshmallow as msh
+from stefan_on_software.contracts.fields import CommaSeparatedList
+
+# Number of files returned per page, by default and at most
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+# Fields of a file that can be requested via `fields`
+FILE_FIELDS = (
+    "id",
+    "upload_name",
+    "upload_date",
+    "uploaded_by",
+    "filetype",
+    "filename",
+    "url",
+    "size",
+    "hash",
+)
+
+
+@dc.dataclass
+class GetFilesContract:
+    limit: int = DEFAULT_LIMIT
+    cursor: Optional[str] = None
+    filetype: Optional[str] = None
+    uploaded_by: Optional[int] = None
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+    hash: Optional[str] = None
+    fields: Optional[List[str]] = None
+
+    @staticmethod
+    def get_schema() -> "GetFilesSchema":
+        return GetFilesSchema()
+
+    @staticmethod
+    def from_json(_json: Optional[Dict]) -> "GetFilesContract":
+        return GetFilesContract.get_schema().load(_json if _json else {})
+
+
+class GetFilesSchema(msh.Schema):
+    limit = msh.fields.Integer(validate=msh.validate.Range(1, MAX_LIMIT))
+    cursor = msh.fields.String()
+    filetype = msh.fields.String(validate=msh.validate.OneOf(["IMAGE", "DOCUMENT"]))
+    uploaded_by = msh.fields.Integer()
+    uploaded_after = msh.fields.DateTime()
+    uploaded_before = msh.fields.DateTime()
+    hash = msh.fields.String()
+    fields = CommaSeparatedList(
+        validate=msh.validate.And(
+            msh.validate.Length(min=1),
+            msh.validate.ContainsOnly(FILE_FIELDS),
+        )
+    )
+
+    @msh.post_load
+    def make_contract(self, data, **kwargs) -> GetFilesContract:
+        return GetFilesContract(**data)
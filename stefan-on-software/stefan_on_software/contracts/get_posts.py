@@ -1,7 +1,13 @@
 import dataclasses as dc
-from typing import Dict, Optional
+import re
+from typing import Dict, List, Optional
 
 import marshmallow as msh
+import stefan_on_software.contracts.constants as constants
+from stefan_on_software.contracts.fields import CommaSeparatedList
+
+# Maximum number of slugs that can be looked up at once
+MAX_SLUGS = 100
 
 
 @dc.dataclass
@@ -9,7 +15,11 @@ class GetPostsContract:
     is_featured: Optional[bool] = None
     is_published: Optional[bool] = None
     limit: Optional[int] = None
+    # Page number. Superseded by `cursor`, which is faster for deep pages.
     offset: Optional[int] = None
+    cursor: Optional[str] = None
+    slug: Optional[str] = None
+    slugs: Optional[List[str]] = None
 
     @staticmethod
     def get_schema() -> "GetPostsSchema":
@@ -23,8 +33,23 @@ class GetPostsContract:
 class GetPostsSchema(msh.Schema):
     is_featured = msh.fields.Boolean()
     is_published = msh.fields.Boolean()
-    limit = msh.fields.Integer()
+    limit = msh.fields.Integer(validate=msh.validate.Range(min=1))
     offset = msh.fields.Integer()
+    cursor = msh.fields.String()
+    slug = msh.fields.String(validate=msh.validate.Regexp(constants.SLUG_REGEX))
+    slugs = CommaSeparatedList(
+        validate=msh.validate.And(
+            msh.validate.Length(min=1, max=MAX_SLUGS),
+            lambda slugs: all(re.match(constants.SLUG_REGEX, slug) for slug in slugs),
+        )
+    )
+
+    @msh.validates_schema
+    def validate_exclusive(self, data, **kwargs):
+        if data.get("offset") and data.get("cursor"):
+            raise msh.ValidationError("Specify either offset or cursor, not both")
+        if "slug" in data and "slugs" in data:
+            raise msh.ValidationError("Specify either slug or slugs, not both")
 
     @msh.post_load
     def make_contract(self, data, **kwargs) -> GetPostsContract:
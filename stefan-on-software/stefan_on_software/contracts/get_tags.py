@@ -0,0 +1,25 @@
+import dataclasses as dc
+from typing import Dict, Optional
+
+import marshmallow as msh
+
+
+@dc.dataclass
+class GetTagsContract:
+    with_counts: Optional[bool] = None
+
+    @staticmethod
+    def get_schema() -> "GetTagsSchema":
+        return GetTagsSchema()
+
+    @staticmethod
+    def from_json(_json: Optional[Dict]) -> "GetTagsContract":
+        return GetTagsContract.get_schema().load(_json if _json else {})
+
+
+class GetTagsSchema(msh.Schema):
+    with_counts = msh.fields.Boolean()
+
+    @msh.post_load
+    def make_contract(self, data, **kwargs) -> GetTagsContract:
+        return GetTagsContract(**data)
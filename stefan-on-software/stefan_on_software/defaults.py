@@ -8,6 +8,9 @@ DATABASE_REL_PATH = "posts.sqlite"
 # LOG_REL_PATH = 'log.txt'  TODO
 TRAFFIC_LOG_REL_PATH = "traffic.txt"  # TODO: should this be .csv?
 SEARCH_INDEX_REL_PATH = "index.json"
+RENDER_CACHE_REL_PATH = "render-cache"
+PAGE_CACHE_REL_PATH = "page-cache.sqlite"
+SITEMAP_PING_REL_PATH = "sitemap-ping.txt"
 
 # Paths relative from the static folder (TODO)
 # SITE_BANNER_REL_PATH = 'site_banner.jpg'
@@ -27,4 +30,11 @@ def make_defaults(instance_path: str) -> Dict:
         ConfigKeys.SEARCH_INDEX_PATH: os.path.join(
             instance_path, SEARCH_INDEX_REL_PATH
         ),
+        ConfigKeys.RENDER_CACHE_PATH: os.path.join(
+            instance_path, RENDER_CACHE_REL_PATH
+        ),
+        ConfigKeys.PAGE_CACHE_PATH: os.path.join(instance_path, PAGE_CACHE_REL_PATH),
+        ConfigKeys.SITEMAP_PING_PATH: os.path.join(
+            instance_path, SITEMAP_PING_REL_PATH
+        ),
     }
@@ -1,5 +1,9 @@
+import threading
+import typing
+
+import flask
 import sib_api_v3_sdk
-from flask import current_app, g, render_template
+from flask import current_app, render_template
 from sib_api_v3_sdk import (
     ApiClient,
     ContactsApi,
@@ -10,6 +14,9 @@ from sib_api_v3_sdk import (
     TransactionalEmailsApi,
 )
 from sib_api_v3_sdk.rest import ApiException
+from stefan_on_software import job_queue
+from stefan_on_software.database import db
+from stefan_on_software.models.job import Job
 from stefan_on_software.models.post import Post
 
 from .site_config import ConfigKeys
@@ -21,59 +28,65 @@ class EmailProvider:
     Provides functionality for the site's email list. Uses the Sendinblue API.
 
     Do not instantiate this directly. Instead, call `get_email_provider()`
-    to get an instance on the executing web thread.
+    to get the app's instance, which is shared by all threads.
+
+    A single ApiClient is kept for the lifetime of the provider, so that
+    its pool of connections to Sendinblue is reused across calls rather
+    than set up (including the TLS handshake) for every call. Calls time
+    out after `connect_timeout` and `read_timeout` seconds. Call `close()`
+    to release the connections.
 
     Note: see here for information on Sendinblue template parameters
     https://help.sendinblue.com/hc/en-us/articles/360000946299-About-Sendinblue-Template-Language
     """
 
-    def __init__(self, api_key: str, list_id: int):
-        self._config = sib_api_v3_sdk.Configuration()
-        self._config.api_key["api-key"] = api_key
+    def __init__(
+        self,
+        api_key: str,
+        list_id: int,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 10.0,
+    ):
+        config = sib_api_v3_sdk.Configuration()
+        config.api_key["api-key"] = api_key
         self._list_id = list_id
+        self._timeout = (connect_timeout, read_timeout)
+        self._client = ApiClient(config)
+        self._contacts_api = ContactsApi(self._client)
+        self._transactional_api = TransactionalEmailsApi(self._client)
+        self._campaigns_api = EmailCampaignsApi(self._client)
 
-    def _make_client(self) -> ApiClient:
-        """Make and return an ApiClient instance using configured values."""
-        return ApiClient(self._config)
-
-    def register_email(self, address: str):
-        """
-        Register a new email address to the subscriber list.
-        May raise ValueError.
-        """
-        current_app.logger.debug("Registering an email address")
-        self._create_contact(address)
-        self._send_welcome_email(address)
-        current_app.logger.debug("Email has been registered successfully")
+    def close(self):
+        """Close the pooled connections to the Sendinblue API."""
+        self._client.rest_client.pool_manager.clear()
 
-    def _create_contact(self, address: str):
+    def create_contact(self, address: str):
         """
         Add the specified email address to the contact list.
         May raise ValueError.
 
         See https://developers.sendinblue.com/reference/createcontact
         """
-        api = ContactsApi(self._make_client())
         try:
-            api.create_contact(
+            self._contacts_api.create_contact(
                 CreateContact(
                     email=address,
                     update_enabled=True,
                     list_ids=[self._list_id],
-                )
+                ),
+                _request_timeout=self._timeout,
             )
         except ApiException as e:
             current_app.logger.error(f"Error creating contact: {e}")
             raise ValueError("Error creating contact")
 
-    def _send_welcome_email(self, address: str):
+    def send_welcome_email(self, address: str):
         """
         Send a transactional "welcome" email to the specified address.
         May raise ValueError.
 
         See https://developers.sendinblue.com/reference/sendtransacemail
         """
-        api = TransactionalEmailsApi(self._make_client())
         # Render the email in HTML
         email_html = render_template(
             "email/welcome_email.html",
@@ -83,7 +96,7 @@ class EmailProvider:
             recipient=address,
         )
         try:
-            api.send_transac_email(
+            self._transactional_api.send_transac_email(
                 SendSmtpEmail(
                     to=[{"email": address}],
                     reply_to={
@@ -96,34 +109,20 @@ class EmailProvider:
                         "email": "stefan@stefanonsoftware.com",
                     },
                     subject="Welcome to the StefanOnSoftware Email List!",
-                )
+                ),
+                _request_timeout=self._timeout,
             )
         except ApiException as e:
             current_app.logger.error(f"Error sending transactional email: {e}")
             raise ValueError("Error sending welcome email")
 
-    def broadcast_new_post(self, post: Post):
-        """
-        Creates and sends an email campaign notifying subscribers of
-        the new post. May raise ValueError.
-        """
-        current_app.logger.info(
-            f"Broadcasting email campaign for post with slug {post.slug}"
-        )
-        campaign_id = self._create_campaign(post)
-        self._send_campaign(campaign_id)
-        current_app.logger.info(
-            f"Email campaign has been scheduled for delivery. id={campaign_id}"
-        )
-
-    def _create_campaign(self, post: Post) -> int:
+    def create_campaign(self, post: Post) -> int:
         """
         Create a campaign notifying subscribers of the given post.
         Returns the campaign ID. May raise ValueError.
 
         See https://developers.sendinblue.com/reference/createemailcampaign-1
         """
-        api = EmailCampaignsApi(self._make_client())
         email_html = render_template(
             "email/new_post_email.html",
             header_url=post.banner_image.absolute_url,
@@ -133,7 +132,7 @@ class EmailProvider:
         # send_time = datetime.datetime.now(datetime.timezone.utc)
         # CreateEmailCampaign.scheduled_at = send_time.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z',
         try:
-            api_response = api.create_email_campaign(
+            api_response = self._campaigns_api.create_email_campaign(
                 CreateEmailCampaign(
                     tag="New Post",
                     sender={
@@ -145,7 +144,8 @@ class EmailProvider:
                     subject="A new post from StefanOnSoftware!",
                     reply_to="stefan@stefanonsoftware.com",
                     recipients={"listIds": [self._list_id]},
-                )
+                ),
+                _request_timeout=self._timeout,
             )
             current_app.logger.debug(
                 f"Email campaign created with id={api_response.id}"
@@ -155,28 +155,145 @@ class EmailProvider:
             current_app.logger.error(f"Error creating campaign: {e}")
             raise ValueError("Error creating campaign")
 
-    def _send_campaign(self, campaign_id: int):
+    def send_campaign(self, campaign_id: int):
         """Send the specified campaign now. May raise ValueError."""
-        api = EmailCampaignsApi(self._make_client())
         try:
-            api.send_email_campaign_now(campaign_id)
+            self._campaigns_api.send_email_campaign_now(
+                campaign_id, _request_timeout=self._timeout
+            )
             current_app.logger.debug("Campaign has been sent")
         except ApiException as e:
             current_app.logger.error(f"Error sending campaign: {e}")
             raise ValueError("Error sending campaign")
 
 
-def get_email_provider() -> EmailProvider:
+class FakeEmailProvider:
     """
-    Get an instance of EmailProvider for the current thread.
+    Stand-in for `EmailProvider` that records calls instead of sending
+    emails. Used when EMAIL_PROVIDER = "fake", e.g. for testing offline.
+
+    Set `num_failures` to make the next calls raise ValueError.
+    """
+
+    def __init__(self):
+        self.contacts: typing.List[str] = []
+        self.welcome_emails: typing.List[str] = []
+        # Slug of the post of each created campaign, by campaign ID
+        self.campaigns: typing.Dict[int, str] = {}
+        self.sent_campaigns: typing.List[int] = []
+        self.num_failures = 0
+
+    def create_contact(self, address: str):
+        self._maybe_fail()
+        self.contacts.append(address)
+
+    def send_welcome_email(self, address: str):
+        self._maybe_fail()
+        self.welcome_emails.append(address)
+
+    def create_campaign(self, post: Post) -> int:
+        self._maybe_fail()
+        campaign_id = len(self.campaigns) + 1
+        self.campaigns[campaign_id] = post.slug
+        return campaign_id
+
+    def send_campaign(self, campaign_id: int):
+        self._maybe_fail()
+        self.sent_campaigns.append(campaign_id)
+
+    def close(self):
+        pass
+
+    def _maybe_fail(self):
+        if self.num_failures > 0:
+            self.num_failures -= 1
+            raise ValueError("Simulated failure")
+
+
+# Guards the creation of the app's email provider
+_provider_lock = threading.Lock()
+
+
+def get_email_provider() -> typing.Union[EmailProvider, FakeEmailProvider]:
+    """
+    Get the app's email provider. It is created on first use and then
+    shared by all threads until `close_email_provider()` is called.
 
     Throws ValueError if the current app is not configured for sending emails.
     """
     if not current_app.config[ConfigKeys.USE_EMAIL_LIST]:
         raise ValueError("App has not been configured to use the email API")
-    if "email_provider" not in g:
-        g.email_provider = EmailProvider(
-            current_app.config[ConfigKeys.EMAIL_API_KEY],
-            current_app.config[ConfigKeys.EMAIL_LIST_ID],
+    provider = current_app.extensions.get("email_provider")
+    if provider is None:
+        with _provider_lock:
+            provider = current_app.extensions.get("email_provider")
+            if provider is None:
+                provider = current_app.extensions["email_provider"] = _make_provider()
+    return provider
+
+
+def _make_provider() -> typing.Union[EmailProvider, FakeEmailProvider]:
+    if current_app.config[ConfigKeys.EMAIL_PROVIDER] == "fake":
+        return FakeEmailProvider()
+    return EmailProvider(
+        current_app.config[ConfigKeys.EMAIL_API_KEY],
+        current_app.config[ConfigKeys.EMAIL_LIST_ID],
+        connect_timeout=current_app.config[ConfigKeys.EMAIL_CONNECT_TIMEOUT],
+        read_timeout=current_app.config[ConfigKeys.EMAIL_READ_TIMEOUT],
+    )
+
+
+def close_email_provider(app: flask.Flask):
+    """Close the app's email provider, if it has been created."""
+    with _provider_lock:
+        provider = app.extensions.pop("email_provider", None)
+    if provider is not None:
+        provider.close()
+
+
+def queue_registration(address: str) -> Job:
+    """Queue a job that registers the address with the email list."""
+    return job_queue.enqueue("register_email", {"address": address})
+
+
+def queue_broadcast(post: Post) -> Job:
+    """
+    Queue a job that broadcasts an email campaign about the post. Only one
+    campaign is ever created per post, however often this is called.
+    """
+    return job_queue.enqueue(
+        "broadcast_new_post",
+        {"post_id": post.id},
+        idempotency_key=f"broadcast_new_post:{post.id}",
+    )
+
+
+@job_queue.handler("register_email")
+def _run_registration(job: Job):
+    provider = get_email_provider()
+    address = job.payload["address"]
+    if not job.payload.get("contact_created"):
+        provider.create_contact(address)
+        job_queue.save_progress(job, contact_created=True)
+    provider.send_welcome_email(address)
+    current_app.logger.debug("Email has been registered successfully")
+
+
+@job_queue.handler("broadcast_new_post")
+def _run_broadcast(job: Job):
+    provider = get_email_provider()
+    campaign_id = job.payload.get("campaign_id")
+    if campaign_id is None:
+        post = db.session.get(Post, job.payload["post_id"])
+        if not post:
+            raise ValueError(f"No post with id={job.payload['post_id']}")
+        current_app.logger.info(
+            f"Broadcasting email campaign for post with slug {post.slug}"
         )
-    return g.email_provider
+        campaign_id = provider.create_campaign(post)
+        # Record the campaign so that a retry doesn't create another one
+        job_queue.save_progress(job, campaign_id=campaign_id)
+    provider.send_campaign(campaign_id)
+    current_app.logger.info(
+        f"Email campaign has been scheduled for delivery. id={campaign_id}"
+    )
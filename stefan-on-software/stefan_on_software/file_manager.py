@@ -1,16 +1,18 @@
-import dataclasses as dc
+import concurrent.futures
 import hashlib
-import io
 import os
+import shutil
+import tempfile
+import typing
 import uuid
 from datetime import datetime
 
-import stefan_on_software.contracts.constants as constants
 import werkzeug
 from flask import current_app
-from PIL import Image, UnidentifiedImageError
-from stefan_on_software import db
-from stefan_on_software.models.file import File, FileType
+from sqlalchemy import or_
+from stefan_on_software import db, image_pipeline, page_cache
+from stefan_on_software.models.file import File, FileDerivative, FileType
+from stefan_on_software.models.post import Post
 from stefan_on_software.models.user import User
 
 
@@ -45,6 +47,11 @@ ALLOWED_EXTENSIONS = [
     ".txt",
     ".pdf",
 ]
+# Uploads larger than this many bytes are spooled to disk rather than
+# kept in memory while they are hashed
+SPOOL_MAX_SIZE = 1024 * 1024
+# Number of bytes read at a time when copying and hashing files
+CHUNK_SIZE = 64 * 1024
 
 
 def file_exists(file_id: str) -> bool:
@@ -53,6 +60,16 @@ def file_exists(file_id: str) -> bool:
 
 
 def store_file(file: werkzeug.datastructures.FileStorage, created_by: User) -> File:
+    """
+    Store the uploaded file and return it. Raises InvalidExtension,
+    InvalidFile or FileAlreadyExists.
+
+    The upload is streamed to a temporary file while its hash is computed.
+    If the same bytes have been uploaded before, FileAlreadyExists is raised
+    before the file is processed. Otherwise, the processed file is written
+    to a temporary file next to its final location and then moved into
+    place.
+    """
     file_name = werkzeug.utils.secure_filename(file.filename)
     current_app.logger.debug(f"Storing file with filename {file_name}")
 
@@ -61,55 +78,133 @@ def store_file(file: werkzeug.datastructures.FileStorage, created_by: User) -> F
     if original_extension not in ALLOWED_EXTENSIONS:
         raise InvalidExtension(original_extension)
 
-    # TODO: I don't know whether it's a good idea to directly modify the file.
-    #  It would be good to store the original, but serve a compressed or CDN version
-    # Process the file
-    contents = io.BytesIO(file.read())
-    processed = _process_file(contents, original_extension)
-
-    # Check if a file with the same hash already exists
-    file_hash = hashlib.md5(processed.contents.getbuffer()).hexdigest()
-    query = File.query.filter_by(hash=file_hash)
-    if query.first():
-        current_app.logger.debug(f"File is a duplicate of {query.first().id}")
-        raise FileAlreadyExists(query.first())
-
-    file_id = uuid.uuid4().hex
-    file = File(
-        id=file_id,
-        upload_name=file_name,
-        upload_date=datetime.now(),
-        uploaded_by=created_by,
-        filetype=get_file_type(processed.extension),
-        filename=file_id + processed.extension,
-        hash=file_hash,
-    )
-
-    # Save to file system
-    with open(file.get_path(), "wb") as out:
-        out.write(processed.contents.getbuffer())
-    file.size = os.path.getsize(file.get_path())
-
+    with tempfile.SpooledTemporaryFile(SPOOL_MAX_SIZE) as original:
+        original_hash = _copy_and_hash(file.stream, original)
+        # Check whether the same upload has been stored before. Files that
+        # are stored unprocessed (and files uploaded before original hashes
+        # were recorded) are found via their hash.
+        duplicate = File.query.filter(
+            or_(File.original_hash == original_hash, File.hash == original_hash)
+        ).first()
+        if duplicate:
+            current_app.logger.debug(f"File is a duplicate of {duplicate.id}")
+            raise FileAlreadyExists(duplicate)
+
+        # TODO: I don't know whether it's a good idea to directly modify the file.
+        #  It would be good to store the original, but serve a compressed or CDN version
+        # Process the file into a temporary file in the static folder, from
+        # where it can be moved into place atomically
+        original.seek(0)
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=".upload-", dir=current_app.static_folder
+        )
+        os.close(fd)
+        try:
+            extension, metadata = _process_file(original, original_extension, tmp_path)
+            is_processed = metadata is not None
+            if not is_processed and get_file_type(extension) == FileType.Image:
+                # Images that aren't processed (GIFs) only have their header read
+                try:
+                    metadata = image_pipeline.read_metadata(tmp_path)
+                except image_pipeline.InvalidImage as e:
+                    raise InvalidFile(str(e))
+            with open(tmp_path, "rb") as processed:
+                file_hash = _copy_and_hash(processed)
+            size = os.path.getsize(tmp_path)
+
+            # Check if a file with the same processed contents already exists
+            duplicate = File.query.filter_by(hash=file_hash).first()
+            if duplicate:
+                current_app.logger.debug(f"File is a duplicate of {duplicate.id}")
+                raise FileAlreadyExists(duplicate)
+
+            file_id = uuid.uuid4().hex
+            file = File(
+                id=file_id,
+                upload_name=file_name,
+                upload_date=datetime.now(),
+                uploaded_by=created_by,
+                filetype=get_file_type(extension),
+                filename=file_id + extension,
+                size=size,
+                hash=file_hash,
+                original_hash=original_hash,
+            )
+            if metadata:
+                file.set_metadata(metadata)
+            # mkstemp() creates the file readable by the owner only
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, file.get_path())
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    if is_processed:
+        _make_derivatives(file)
     db.session.add(file)
     db.session.commit()
     current_app.logger.debug(f"File stored successfully with ID={file.id}")
     return file
 
 
-def delete_file(file: File):
-    """Delete the given file from the file system and the database."""
-    # TODO: fail if references exist
+def _make_derivatives(file: File):
+    """
+    Make copies of the image in different sizes and formats, for responsive
+    images. If this fails, the image is still stored, just without copies.
+    """
     try:
-        # Delete from filesystem
-        file.get_path().unlink()
-    except FileNotFoundError:
-        # Doesn't exist anymore... strange but doesn't matter at this point
-        current_app.logger.warning(
-            f"Attempted to delete {file.get_path()}, which doesn't exist"
+        derivatives = current_app.image_pipeline.make_derivatives(file.get_path())
+    except Exception as e:
+        current_app.logger.error(f"Couldn't make copies of image {file.id}: {e}")
+        # Remove the copies that were made before the error
+        for path in file.get_path().parent.glob(f"{file.id}-*"):
+            path.unlink()
+        return
+    file.derivatives = [
+        FileDerivative(
+            filename=derivative.filename,
+            width=derivative.width,
+            height=derivative.height,
+            format=derivative.format,
+            size=derivative.size,
         )
+        for derivative in derivatives
+    ]
+
+
+def backfill_metadata(file: File):
+    """
+    Record the metadata of an image that was uploaded before metadata was
+    recorded. Does not commit. Raises InvalidFile.
+    """
+    try:
+        file.set_metadata(image_pipeline.read_metadata(file.get_path()))
+    except (image_pipeline.InvalidImage, FileNotFoundError) as e:
+        raise InvalidFile(f"Cannot read image {file.id}: {e}")
+
+
+def delete_file(file: File):
+    """Delete the given file and its copies from the file system and the database."""
+    # TODO: fail if references exist
+    for path in [file.get_path()] + [d.get_path() for d in file.derivatives]:
+        try:
+            # Delete from filesystem
+            path.unlink()
+        except FileNotFoundError:
+            # Doesn't exist anymore... strange but doesn't matter at this point
+            current_app.logger.warning(
+                f"Attempted to delete {path}, which doesn't exist"
+            )
 
     db.session.delete(file)
     db.session.commit()
+    # Clear the pre-rendered posts that reference the deleted file, so that
+    # they will be re-rendered on their next view
+    for post in Post.query.all():
+        if post.references_file(file.filename):
+            post.clear_prerendered()
+    page_cache.invalidate()
     current_app.logger.debug(f"Deleted file with id={file.id}")
 
 
@@ -128,33 +223,42 @@ def get_file_type(extension: str) -> FileType:
         raise ValueError(f"Unsupported extension {extension}")
 
 
-@dc.dataclass
-class ProcessedFile:
-    contents: io.BytesIO
-    extension: str
+def _copy_and_hash(
+    src: typing.BinaryIO, dest: typing.Optional[typing.BinaryIO] = None
+) -> str:
+    """
+    Read `src` in chunks and return the MD5 hash of its contents. If `dest`
+    is given, the chunks are also written to it.
+    """
+    md5 = hashlib.md5()
+    while chunk := src.read(CHUNK_SIZE):
+        md5.update(chunk)
+        if dest is not None:
+            dest.write(chunk)
+    return md5.hexdigest()
 
 
-def _process_file(file: io.BytesIO, extension: str) -> ProcessedFile:
+def _process_file(
+    src: typing.BinaryIO, extension: str, dest_path: str
+) -> typing.Tuple[str, typing.Optional[image_pipeline.ImageMetadata]]:
+    """
+    Write the processed contents of `src` to `dest_path`. Returns the
+    extension of the processed file and, for processed images, its
+    metadata. Raises InvalidFile.
+    """
     if extension in (".jpg", ".png"):
         # Convert still images to JPG and limit to MAX_IMG_SIZE
         try:
-            image: Image = Image.open(file)
-        except UnidentifiedImageError:
-            raise InvalidFile("Cannot read image")
-        # Bound to MAX_IMG_SIZE
-        if (
-            image.width > constants.MAX_IMG_WIDTH
-            or image.height > constants.MAX_IMG_HEIGHT
-        ):
-            image.thumbnail(
-                (constants.MAX_IMG_WIDTH, constants.MAX_IMG_HEIGHT), Image.ANTIALIAS
-            )
-        # Convert to RGB (for saving to JPG)
-        image = image.convert("RGB")
-        # Write out to buffer
-        image_bytes = io.BytesIO()
-        image.save(image_bytes, format="JPEG")
-        return ProcessedFile(image_bytes, ".jpg")
+            metadata = current_app.image_pipeline.process(src, dest_path)
+        except image_pipeline.InvalidImage as e:
+            raise InvalidFile(str(e))
+        except concurrent.futures.TimeoutError:
+            raise InvalidFile("Processing the image took too long")
+        except concurrent.futures.process.BrokenProcessPool:
+            raise InvalidFile("Processing the image failed")
+        return ".jpg", metadata
     else:
         # Do nothing
-        return ProcessedFile(file, extension)
+        with open(dest_path, "wb") as dest:
+            shutil.copyfileobj(src, dest, CHUNK_SIZE)
+        return extension, None
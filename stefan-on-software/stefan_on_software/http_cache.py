@@ -0,0 +1,103 @@
+"""
+Conditional GET support for the public pages.
+
+A page's validators are derived from the modification times of the posts it
+shows, combined with the page cache's generation (see `page_cache`), which
+changes whenever any content shown on the site changes. Both are stored
+(in the database and the page cache's SQLite file), so every worker process
+gives the same validators, also after a restart. This lets clients
+that already have the current version of a page receive a 304 response
+before the page is rendered or even looked up in the page cache.
+"""
+import functools
+import typing
+from datetime import datetime, timezone
+
+from flask import current_app, request
+from sqlalchemy import func
+from stefan_on_software.database import db
+from stefan_on_software.models.post import Post
+from stefan_on_software.models.tag import Tag
+from stefan_on_software_renderer.cache import make_key
+from werkzeug.http import is_resource_modified
+
+
+def conditional(get_last_modified: typing.Callable[..., typing.Optional[datetime]]):
+    """
+    Decorator that adds an ETag and Last-Modified header to the view's
+    response, and answers conditional requests with a 304 response if the
+    page hasn't changed.
+
+    `get_last_modified` is called with the view's arguments and returns the
+    most recent modification time of the content shown on the page. If it
+    returns None, the view is called as usual and the response is not
+    given validators (e.g. so that the view can return a 404).
+
+    Place it below `logged_visit` and above `page_cache.cached`.
+    """
+
+    def decorator(f: typing.Callable):
+        @functools.wraps(f)
+        def decorated_function(*args, **kwargs):
+            content_modified = get_last_modified(*args, **kwargs)
+            if content_modified is None:
+                return f(*args, **kwargs)
+            _, generation, invalidated_at = current_app.page_cache.get_version()
+            # Naive datetimes are in local time
+            last_modified = max(content_modified, invalidated_at).astimezone(
+                timezone.utc
+            )
+            etag = make_key(
+                f"{request.url}\0{last_modified.isoformat()}", f"etag:{generation}"
+            )
+
+            if not is_resource_modified(
+                request.environ, etag=etag, last_modified=last_modified
+            ):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            # Clients may store the page but must revalidate it before use
+            response.cache_control.public = True
+            response.cache_control.no_cache = True
+            return response
+
+        return decorated_function
+
+    return decorator
+
+
+def get_published_modified(*args, **kwargs) -> typing.Optional[datetime]:
+    """Return the most recent modification time of any published post."""
+    return (
+        db.session.query(func.max(Post.last_modified))
+        .filter(Post.is_published)
+        .scalar()
+    ) or datetime.min
+
+
+def get_post_modified(slug: str) -> typing.Optional[datetime]:
+    """Return the modification time of the published post with the given slug."""
+    return (
+        db.session.query(Post.last_modified)
+        .filter(Post.slug == slug, Post.is_published)
+        .scalar()
+    )
+
+
+def get_tag_modified(slug: str) -> typing.Optional[datetime]:
+    """
+    Return the most recent modification time of the published posts with
+    the given tag.
+    """
+    if not db.session.query(Tag.query.filter(Tag.slug == slug).exists()).scalar():
+        return None
+    return (
+        db.session.query(func.max(Post.last_modified))
+        .filter(Post.is_published, Post.tags.any(Tag.slug == slug))
+        .scalar()
+    ) or datetime.min
@@ -0,0 +1,236 @@
+"""
+Processing of uploaded images. Images are processed in a pool of worker
+processes, so that decoding and encoding them doesn't hold up the web
+worker or serialize concurrent uploads.
+"""
+import concurrent.futures
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import typing
+from pathlib import Path
+
+import stefan_on_software.contracts.constants as constants
+from PIL import Image, UnidentifiedImageError, features
+
+# Widths of the smaller copies made of each image, for responsive images
+DERIVATIVE_WIDTHS = (200, 400, 800)
+# Formats of the copies, in order of preference. Formats not supported by
+# the installed Pillow (e.g. AVIF in builds without libavif) are skipped.
+DERIVATIVE_FORMATS = ("avif", "webp", "jpeg")
+# File extension of each format
+EXTENSIONS = {"avif": ".avif", "webp": ".webp", "jpeg": ".jpg"}
+# EXIF tag giving the orientation of a photo
+EXIF_ORIENTATION = 0x0112
+
+
+class InvalidImage(ValueError):
+    """Exception thrown when an image can't be read."""
+
+
+class ImageMetadata(typing.NamedTuple):
+    """Information about an image that is stored with its `File`."""
+
+    width: int
+    height: int
+    # Pillow's name for the format, e.g. "JPEG"
+    format: str
+    # EXIF orientation (1-8, where 1 is upright), if given
+    orientation: typing.Optional[int]
+
+
+class Derivative(typing.NamedTuple):
+    """A copy of an image made by `make_derivatives()`."""
+
+    # Name of the file, which is stored next to the image
+    filename: str
+    width: int
+    height: int
+    # One of DERIVATIVE_FORMATS
+    format: str
+    # Size of the file, in bytes
+    size: int
+
+
+def process_image(
+    src: typing.Union[str, typing.BinaryIO], dest_path: typing.Union[str, os.PathLike]
+) -> ImageMetadata:
+    """
+    Convert the image at `src` to a JPG bounded to MAX_IMG_WIDTH x
+    MAX_IMG_HEIGHT and write it to `dest_path`. Returns the metadata of the
+    JPG, with the orientation of the original image (the JPG doesn't keep
+    its EXIF data). Raises InvalidImage.
+    """
+    try:
+        image = Image.open(src)
+    except UnidentifiedImageError:
+        raise InvalidImage("Cannot read image")
+    with image:
+        orientation = image.getexif().get(EXIF_ORIENTATION)
+        max_size = (constants.MAX_IMG_WIDTH, constants.MAX_IMG_HEIGHT)
+        if image.width > max_size[0] or image.height > max_size[1]:
+            # Let JPEGs decode at the smallest scale (1/2, 1/4 or 1/8) that
+            # is still at least `max_size`. Much faster for large photos.
+            image.draft("RGB", max_size)
+            image.thumbnail(max_size, Image.Resampling.LANCZOS)
+        # Convert to RGB (for saving to JPG)
+        image.convert("RGB").save(dest_path, format="JPEG")
+        return ImageMetadata(image.width, image.height, "JPEG", orientation)
+
+
+def read_metadata(path: typing.Union[str, os.PathLike]) -> ImageMetadata:
+    """
+    Return the metadata of the image at `path`. Only reads the image's
+    header, without decoding it. Raises InvalidImage.
+    """
+    try:
+        with Image.open(path) as image:
+            return ImageMetadata(
+                image.width,
+                image.height,
+                image.format,
+                image.getexif().get(EXIF_ORIENTATION),
+            )
+    except UnidentifiedImageError:
+        raise InvalidImage("Cannot read image")
+
+
+def get_derivative_formats() -> typing.List[str]:
+    """Return the formats of DERIVATIVE_FORMATS supported by the installed Pillow."""
+    return [
+        format
+        for format in DERIVATIVE_FORMATS
+        if format == "jpeg" or features.check(format)
+    ]
+
+
+def make_derivatives(path: typing.Union[str, os.PathLike]) -> typing.List[Derivative]:
+    """
+    Make copies of the JPG at `path` for responsive images, and store them
+    next to it. Copies are made at each of DERIVATIVE_WIDTHS narrower than
+    the image, and at the image's own width, in each supported format. The
+    image itself serves as the JPG at its own width.
+    """
+    path = Path(path)
+    derivatives = []
+    with Image.open(path) as image:
+        widths = [width for width in DERIVATIVE_WIDTHS if width < image.width]
+        for width in widths + [image.width]:
+            height = max(1, round(image.height * width / image.width))
+            resized = (
+                image.resize((width, height), Image.Resampling.LANCZOS)
+                if width != image.width
+                else image
+            )
+            for format in get_derivative_formats():
+                if format == "jpeg" and width == image.width:
+                    continue
+                filename = f"{path.stem}-{width}w{EXTENSIONS[format]}"
+                resized.save(path.with_name(filename), format=format.upper())
+                derivatives.append(
+                    Derivative(
+                        filename,
+                        width,
+                        height,
+                        format,
+                        path.with_name(filename).stat().st_size,
+                    )
+                )
+    return derivatives
+
+
+class ImagePipeline:
+    """
+    Runs `process_image()` and `make_derivatives()` in a pool of
+    `max_workers` processes, which is
+    started on first use. If `max_workers` is 0, images are processed on
+    the calling thread instead (e.g. for testing).
+
+    Processing an image times out after `timeout` seconds, raising
+    `concurrent.futures.TimeoutError`. The pool is then terminated, so
+    that runaway work doesn't tie up its processes, and a new pool is
+    started for the next image. Images being processed by the terminated
+    pool fail with `BrokenProcessPool`. Call `close()` to shut down the pool.
+    """
+
+    def __init__(self, max_workers: int, timeout: float = 60.0):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor: typing.Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def process(
+        self, src: typing.BinaryIO, dest_path: typing.Union[str, os.PathLike]
+    ) -> ImageMetadata:
+        """
+        Process the image read from `src` and write it to `dest_path`.
+        Returns the metadata of the processed image.
+        """
+        if not self.max_workers:
+            return process_image(src, dest_path)
+        # Hand the image to the worker as a file, rather than pickling it.
+        # The file is created next to `dest_path`, i.e. in the static folder.
+        fd, src_path = tempfile.mkstemp(
+            prefix=".upload-src-", dir=os.path.dirname(dest_path)
+        )
+        try:
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(src, out)
+            return self._run(process_image, src_path, dest_path)
+        finally:
+            os.unlink(src_path)
+
+    def make_derivatives(
+        self, path: typing.Union[str, os.PathLike]
+    ) -> typing.List[Derivative]:
+        """Run `make_derivatives()` on the image at `path`."""
+        if not self.max_workers:
+            return make_derivatives(path)
+        return self._run(make_derivatives, path)
+
+    def close(self):
+        """Shut down the pool, once the images being processed are done."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _run(self, f: typing.Callable, *args):
+        executor = self._get_executor()
+        try:
+            return executor.submit(f, *args).result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            # The worker keeps running the call: terminate the pool
+            self._discard(executor, terminate=True)
+            raise
+        except concurrent.futures.process.BrokenProcessPool:
+            # A worker died (e.g. killed for using too much memory)
+            self._discard(executor)
+            raise
+
+    def _discard(
+        self, executor: concurrent.futures.ProcessPoolExecutor, terminate: bool = False
+    ):
+        """Stop using `executor`, so that a new pool is started for the next image."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        if terminate:
+            # Copied first, as shutting down clears the processes
+            processes = list((executor._processes or {}).values())
+            executor.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                process.terminate()
+
+    def _get_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    self.max_workers,
+                    # Forking would copy the app's background threads' locks
+                    # in whatever state they are in
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
@@ -1,43 +1,62 @@
+"""
+Validation of the featured, banner and thumbnail images of posts. Images are
+validated using the metadata stored with their `File`, without reading them.
+"""
 from typing import Optional
 
 import stefan_on_software.contracts.constants as constants
-from PIL import Image
+from stefan_on_software import file_manager
 from stefan_on_software.models.file import File, FileType
 
 
-def is_featured_image_valid(file_id: Optional[str]) -> bool:
-    return _is_image_valid(
-        file_id, constants.FEATURED_IMAGE_WIDTH, constants.FEATURED_IMAGE_HEIGHT
-    )
-
-
-def is_banner_image_valid(file_id: Optional[str]) -> bool:
-    return _is_image_valid(file_id, constants.BANNER_WIDTH, constants.BANNER_HEIGHT)
-
-
-def is_thumbnail_image_valid(file_id: Optional[str]) -> bool:
-    return _is_image_valid(
-        file_id, constants.THUMBNAIL_WIDTH, constants.THUMBNAIL_HEIGHT
+def find_invalid_image(
+    featured_id: Optional[str],
+    banner_id: Optional[str],
+    thumbnail_id: Optional[str],
+) -> Optional[str]:
+    """
+    Return the ID of the first of the given images that is invalid, or None
+    if all of them are valid. An image is valid if it is not given, or if
+    it is a still image of the prescribed size. Looks up all images with a
+    single query.
+    """
+    required_sizes = [
+        (featured_id, constants.FEATURED_IMAGE_WIDTH, constants.FEATURED_IMAGE_HEIGHT),
+        (banner_id, constants.BANNER_WIDTH, constants.BANNER_HEIGHT),
+        (thumbnail_id, constants.THUMBNAIL_WIDTH, constants.THUMBNAIL_HEIGHT),
+    ]
+    file_ids = {file_id for file_id, _, _ in required_sizes if file_id is not None}
+    files = (
+        {file.id: file for file in File.query.filter(File.id.in_(file_ids))}
+        if file_ids
+        else {}
     )
+    for file_id, required_width, required_height in required_sizes:
+        if file_id is not None and not _is_image_valid(
+            files.get(file_id), required_width, required_height
+        ):
+            return file_id
+    return None
 
 
 def _is_image_valid(
-    file_id: str,
+    file: Optional[File],
     required_width: int,
     required_height: int,
-    allow_none: bool = True,
 ) -> bool:
-    if file_id is None:
-        return allow_none
-    file = File.query.filter_by(id=file_id).first()
     # File does not exist
     if file is None:
         return False
     # File is not an image
     if file.filetype != FileType.Image:
         return False
+    if not file.has_metadata:
+        # Uploaded before metadata was recorded, and not yet backfilled
+        try:
+            file_manager.backfill_metadata(file)
+        except file_manager.InvalidFile:
+            return False
     # File is a gif
-    if file.filename.endswith(".gif"):
+    if file.image_format == "GIF":
         return False
-    as_image = Image.open(file.get_path())
-    return as_image.width == required_width and as_image.height == required_height
+    return file.width == required_width and file.height == required_height
@@ -0,0 +1,240 @@
+"""
+A durable queue of background jobs, stored in the `job` table of the site's
+database.
+
+Jobs are created with `enqueue()` and run by a `JobWorker` thread (or by
+`flask jobs work`). Each kind of job is run by a handler registered with
+`@handler(kind)`. A job whose handler raises an exception is retried with
+exponential backoff until it has failed `max_attempts` times. Jobs are
+claimed atomically, so several workers can share the same database.
+"""
+import threading
+import typing
+from datetime import datetime, timedelta
+
+import flask
+from flask import current_app
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from stefan_on_software.database import db
+from stefan_on_software.models.job import Job, JobStatus
+
+# Number of attempts after which a job is marked as failed
+DEFAULT_MAX_ATTEMPTS = 5
+# Delay before the first retry. Doubles with every further attempt.
+BACKOFF_BASE = timedelta(seconds=30)
+MAX_BACKOFF = timedelta(hours=1)
+# A job that has been running for longer than this is assumed to belong to
+# a worker that died, and is run again
+RUNNING_TIMEOUT = timedelta(minutes=10)
+
+# Registered handlers, by job kind
+HANDLERS: typing.Dict[str, typing.Callable[[Job], None]] = {}
+
+
+def handler(kind: str):
+    """Decorator that registers the function as the handler for jobs of `kind`."""
+
+    def decorator(f: typing.Callable[[Job], None]):
+        HANDLERS[kind] = f
+        return f
+
+    return decorator
+
+
+def enqueue(
+    kind: str,
+    payload: typing.Dict,
+    idempotency_key: typing.Optional[str] = None,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+) -> Job:
+    """
+    Add a job to the queue and commit it. If a job with the given
+    `idempotency_key` already exists, no job is added and the existing job
+    is returned instead.
+
+    If called during a request, the request's host URL is stored with the
+    job so that the handler can build external URLs.
+    """
+    if idempotency_key:
+        existing = Job.query.filter_by(idempotency_key=idempotency_key).first()
+        if existing:
+            return existing
+    payload = dict(payload)
+    if flask.has_request_context():
+        payload.setdefault("base_url", flask.request.host_url)
+    now = datetime.now()
+    job = Job(
+        kind=kind,
+        idempotency_key=idempotency_key,
+        status=JobStatus.Pending,
+        attempts=0,
+        max_attempts=max_attempts,
+        run_after=now,
+        created_at=now,
+        updated_at=now,
+    )
+    job.payload = payload
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request created a job with the same key in the meantime
+        db.session.rollback()
+        return Job.query.filter_by(idempotency_key=idempotency_key).one()
+    worker = getattr(current_app, "job_worker", None)
+    if worker is not None:
+        worker.notify()
+    return job
+
+
+def save_progress(job: Job, **updates):
+    """
+    Update the job's payload and commit it. Handlers use this to record
+    steps that have succeeded, so that they aren't repeated on a retry.
+    """
+    job.payload = {**job.payload, **updates}
+    db.session.commit()
+
+
+def get_backoff(attempts: int) -> timedelta:
+    """Return the delay before retrying a job that has failed `attempts` times."""
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), MAX_BACKOFF)
+
+
+def claim_next(now: typing.Optional[datetime] = None) -> typing.Optional[Job]:
+    """
+    Claim the next job that is due and mark it as running. Returns None if
+    no job is due.
+    """
+    now = now if now else datetime.now()
+    while True:
+        job = (
+            Job.query.filter(
+                or_(
+                    and_(Job.status == JobStatus.Pending, Job.run_after <= now),
+                    and_(
+                        Job.status == JobStatus.Running,
+                        Job.updated_at <= now - RUNNING_TIMEOUT,
+                    ),
+                )
+            )
+            .order_by(Job.run_after, Job.id)
+            .first()
+        )
+        if not job:
+            return None
+        # Only claim the job if no other worker has claimed it in the meantime
+        num_claimed = Job.query.filter(
+            Job.id == job.id,
+            Job.status == job.status,
+            Job.updated_at == job.updated_at,
+        ).update(
+            {
+                Job.status: JobStatus.Running,
+                Job.attempts: Job.attempts + 1,
+                Job.updated_at: now,
+            },
+            synchronize_session=False,
+        )
+        db.session.commit()
+        if num_claimed:
+            db.session.refresh(job)
+            return job
+
+
+def run_job(job: Job, now: typing.Optional[datetime] = None):
+    """Run a claimed job and record the outcome."""
+    try:
+        job_handler = HANDLERS.get(job.kind)
+        if not job_handler:
+            raise ValueError(f"No handler for jobs of kind {job.kind}")
+        with current_app.test_request_context(base_url=job.payload.get("base_url")):
+            job_handler(job)
+    except Exception as e:
+        db.session.rollback()
+        job.last_error = f"{type(e).__name__}: {e}"
+        if job.attempts >= job.max_attempts:
+            job.status = JobStatus.Failed
+            current_app.logger.error(
+                f"Job {job.id} ({job.kind}) failed permanently: {job.last_error}"
+            )
+        else:
+            job.status = JobStatus.Pending
+            job.run_after = (now if now else datetime.now()) + get_backoff(job.attempts)
+            current_app.logger.warning(
+                f"Job {job.id} ({job.kind}) failed, retrying after {job.run_after}: {job.last_error}"
+            )
+    else:
+        job.status = JobStatus.Succeeded
+        job.last_error = None
+    job.updated_at = datetime.now()
+    db.session.commit()
+
+
+def run_pending(
+    now: typing.Optional[datetime] = None, limit: typing.Optional[int] = None
+) -> int:
+    """Run jobs until none are due (or `limit` jobs have run). Returns the number run."""
+    num_run = 0
+    while limit is None or num_run < limit:
+        job = claim_next(now)
+        if not job:
+            break
+        run_job(job, now)
+        num_run += 1
+    return num_run
+
+
+def retry(job: Job):
+    """Reset a job so that it is run again as soon as possible."""
+    job.status = JobStatus.Pending
+    job.attempts = 0
+    job.run_after = job.updated_at = datetime.now()
+    db.session.commit()
+
+
+class JobWorker:
+    """
+    Runs due jobs in a background thread. Checks for jobs every
+    `poll_interval` seconds, and immediately after `notify()`.
+    """
+
+    def __init__(self, app: flask.Flask, poll_interval: float = 5.0):
+        self.app = app
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: typing.Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the background thread, unless it has already been started."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="job-worker", daemon=True
+                )
+                self._thread.start()
+
+    def notify(self):
+        """Wake up the worker, e.g. because a job has been added."""
+        self._wakeup.set()
+
+    def close(self, timeout: float = 10.0):
+        """Stop the worker once it has finished the current job."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+            with self.app.app_context():
+                try:
+                    run_pending()
+                except Exception as e:
+                    self.app.logger.error(f"Error while running jobs: {e}")
+            self._wakeup.wait(self.poll_interval)
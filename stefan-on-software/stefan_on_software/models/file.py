@@ -1,9 +1,16 @@
+import typing
 from enum import Enum
 from pathlib import Path
 
 from flask import current_app, url_for
 from stefan_on_software import db
 from stefan_on_software.contracts.data_schemas import FileContract
+from stefan_on_software.image_pipeline import ImageMetadata
+from stefan_on_software_renderer.renderer import ImageSource
+
+# Formats of the copies of images served via <source> elements, in order
+# of preference. JPG copies are served via the `srcset` of the <img>.
+SOURCE_FORMATS = ("avif", "webp")
 
 
 class FileType(Enum):
@@ -18,6 +25,10 @@ class File(db.Model):
     """Represents a file uploaded to the server."""
 
     __tablename__ = "file"
+    __table_args__ = (
+        # Used to list files a page at a time, most recent first
+        db.Index("ix_file_upload_date_id", "upload_date", "id"),
+    )
     # UUID
     id = db.Column(db.String, primary_key=True)
     # User-given name at time of upload
@@ -37,6 +48,25 @@ class File(db.Model):
     size = db.Column(db.Integer, nullable=False)
     # MD5 hash of the file contents
     hash = db.Column(db.String, unique=True, nullable=False, index=True)
+    # MD5 hash of the file as it was uploaded, before processing. Used to
+    # detect re-uploads without processing them. Null for older files.
+    original_hash = db.Column(db.String, nullable=True, index=True)
+    # Metadata of images, recorded on upload (or by `flask backfill-images`).
+    # Null for documents.
+    # Dimensions, in pixels
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    # Pillow's name for the format, e.g. "JPEG"
+    image_format = db.Column(db.String, nullable=True)
+    # EXIF orientation of the uploaded image (1-8, where 1 is upright)
+    orientation = db.Column(db.Integer, nullable=True)
+    # Smaller and re-encoded copies of this image, for responsive images
+    derivatives = db.relationship(
+        "FileDerivative",
+        back_populates="file",
+        cascade="all, delete-orphan",
+        order_by="FileDerivative.width",
+    )
     # The posts that reference this file
     # references = db.relationship('Post')
 
@@ -54,6 +84,53 @@ class File(db.Model):
     def absolute_url(self) -> str:
         return self.make_url(True)
 
+    @property
+    def has_metadata(self) -> bool:
+        """Whether the image's metadata has been recorded."""
+        return self.width is not None and self.image_format is not None
+
+    def set_metadata(self, metadata: ImageMetadata):
+        self.width = metadata.width
+        self.height = metadata.height
+        self.image_format = metadata.format
+        self.orientation = metadata.orientation
+
+    def get_image_sources(self) -> typing.List[ImageSource]:
+        """
+        Return the copies of this image, ordered by preference of format
+        and then by width. If there are copies, the JPG copies include this
+        file itself.
+        """
+        sources = [
+            ImageSource(derivative.relative_url, derivative.width, derivative.mime_type)
+            for format in SOURCE_FORMATS + ("jpeg",)
+            for derivative in self.derivatives
+            if derivative.format == format
+        ]
+        if sources and self.width:
+            sources.append(ImageSource(self.relative_url, self.width, "image/jpeg"))
+        return sources
+
+    def get_srcset(self, mime_type: str) -> str:
+        """
+        Return a `srcset` listing the copies of this image of the given
+        MIME type by width, or "" if there are none.
+        """
+        return ", ".join(
+            f"{source.url} {source.width}w"
+            for source in self.get_image_sources()
+            if source.mime_type == mime_type
+        )
+
+    @property
+    def source_mime_types(self) -> typing.List[str]:
+        """MIME types of the <source> elements to serve for this image."""
+        return [
+            f"image/{format}"
+            for format in SOURCE_FORMATS
+            if any(derivative.format == format for derivative in self.derivatives)
+        ]
+
     def make_contract(self) -> FileContract:
         return FileContract(
             id=self.id,
@@ -66,3 +143,33 @@ class File(db.Model):
             size=self.size,
             hash=self.hash,
         )
+
+
+class FileDerivative(db.Model):
+    """A smaller or re-encoded copy of an image, generated on upload."""
+
+    __tablename__ = "file_derivative"
+    id = db.Column(db.Integer, primary_key=True)
+    # ID of the image this is a copy of
+    file_id = db.Column(db.String, db.ForeignKey("file.id"), nullable=False, index=True)
+    file = db.relationship("File", back_populates="derivatives")
+    # Name of the copy as it is stored on the system
+    filename = db.Column(db.String, unique=True, nullable=False)
+    # Dimensions, in pixels
+    width = db.Column(db.Integer, nullable=False)
+    height = db.Column(db.Integer, nullable=False)
+    # Image format: "jpeg", "webp" or "avif"
+    format = db.Column(db.String, nullable=False)
+    # Size of the copy, in bytes
+    size = db.Column(db.Integer, nullable=False)
+
+    def get_path(self) -> Path:
+        return Path(current_app.static_folder) / self.filename
+
+    @property
+    def mime_type(self) -> str:
+        return f"image/{self.format}"
+
+    @property
+    def relative_url(self) -> str:
+        return url_for("static", filename=self.filename)
@@ -0,0 +1,55 @@
+import json
+import typing
+from enum import Enum
+
+from stefan_on_software import db
+
+
+class JobStatus(Enum):
+    """Lifecycle of a background job."""
+
+    # Waiting to be run, possibly after a failed attempt
+    Pending = "PENDING"
+    # Currently being run by a worker
+    Running = "RUNNING"
+    Succeeded = "SUCCEEDED"
+    # Failed on every attempt. Can be retried manually via the CLI.
+    Failed = "FAILED"
+
+
+class Job(db.Model):
+    """A task that is run in the background by `job_queue`."""
+
+    __tablename__ = "job"
+    __table_args__ = (
+        # Used to find the next job to run
+        db.Index("ix_job_status_run_after", "status", "run_after"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Name of the handler that runs this job
+    kind = db.Column(db.String, nullable=False)
+    # JSON-encoded arguments of the job. Handlers may also use it to record
+    # progress, so that a retry doesn't repeat steps that have succeeded.
+    payload_json = db.Column(db.String, nullable=False, default="{}")
+    # Optional key that identifies the work this job does. At most one job
+    # is created per key, which prevents e.g. a campaign from being sent twice.
+    idempotency_key = db.Column(db.String, unique=True, nullable=True)
+    status = db.Column(db.Enum(JobStatus), nullable=False, default=JobStatus.Pending)
+    # Number of attempts that have been made to run this job
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    # The job should not be run before this time
+    run_after = db.Column(db.DateTime, nullable=False)
+    # Error raised by the last failed attempt
+    last_error = db.Column(db.String, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    @property
+    def payload(self) -> typing.Dict:
+        return json.loads(self.payload_json)
+
+    @payload.setter
+    def payload(self, payload: typing.Dict):
+        self.payload_json = json.dumps(payload)
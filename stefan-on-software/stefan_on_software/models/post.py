@@ -1,17 +1,24 @@
 import pathlib
 import re
-from typing import Optional
+from typing import List, Optional, Tuple
 
 import flask
+import jinja2
 import stefan_on_software.models.relations as relations
-from sqlalchemy import asc, desc
+from sqlalchemy import asc
+from sqlalchemy.orm import joinedload, selectinload
 from stefan_on_software import db
 from stefan_on_software.contracts.data_schemas import PostContract
 from stefan_on_software.models.file import File
+from stefan_on_software.site_config import ConfigKeys
 from stefan_on_software_renderer import renderer
+from stefan_on_software_renderer.cache import make_key
 
 # Regex used to match a HEX color for the `title_color` field
 COLOR_REGEX = re.compile("^#[0-9a-fA-F]{6}$")
+# Strategies that may be used to eager-load the images of posts. See
+# https://docs.sqlalchemy.org/en/14/orm/loading_relationships.html
+LOADING_STRATEGIES = {"selectin": selectinload, "joined": joinedload}
 
 
 # TODO: CURRENTLY, MARKDOWN FILES ARE PUBLICLY ACCESSIBLE VIA THE 'STATIC' ROUTE. THIS SHOULD NOT BE THE CASE
@@ -19,6 +26,12 @@ COLOR_REGEX = re.compile("^#[0-9a-fA-F]{6}$")
 # TODO: It's probably not great practice to mix flask stuff with SQLAlchemy models.
 class Post(db.Model):
     __tablename__ = "post"
+    __table_args__ = (
+        # Used to list published posts in order of publication
+        db.Index("ix_post_is_published_publish_date", "is_published", "publish_date"),
+        # Used to list posts a page at a time, most recently modified first
+        db.Index("ix_post_last_modified_id", "last_modified", "id"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     # ID of the user who created this post
     author_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
@@ -35,14 +48,23 @@ class Post(db.Model):
     publish_date = db.Column(db.DateTime)
 
     # Images associated with the post
-    featured_id = db.Column(db.Integer, db.ForeignKey("file.id"))
-    banner_id = db.Column(db.Integer, db.ForeignKey("file.id"))
-    thumbnail_id = db.Column(db.Integer, db.ForeignKey("file.id"))
+    featured_id = db.Column(db.String, db.ForeignKey("file.id"))
+    banner_id = db.Column(db.String, db.ForeignKey("file.id"))
+    thumbnail_id = db.Column(db.String, db.ForeignKey("file.id"))
+    # Note: `foreign_keys` is required because there are several foreign
+    # keys to the "file" table
+    featured_image = db.relationship("File", foreign_keys=[featured_id])
+    banner_image = db.relationship("File", foreign_keys=[banner_id])
+    thumbnail_image = db.relationship("File", foreign_keys=[thumbnail_id])
 
     # Whether this post is featured
     is_featured = db.Column(db.Boolean, default=False)
     # Whether this post is published
     is_published = db.Column(db.Boolean, default=False)
+    # IDs of the published posts published directly before and after this one.
+    # Only set for published posts. Kept up-to-date by `update_neighbors()`.
+    prev_id = db.Column(db.Integer)
+    next_id = db.Column(db.Integer)
 
     # Tags associated with this post (Many to Many)
     tags = db.relationship(
@@ -71,18 +93,6 @@ class Post(db.Model):
     def absolute_url(self) -> str:
         return self.make_url(True)
 
-    @property
-    def featured_image(self) -> Optional[File]:
-        return File.query.filter_by(id=self.featured_id).first()
-
-    @property
-    def banner_image(self) -> Optional[File]:
-        return File.query.filter_by(id=self.banner_id).first()
-
-    @property
-    def thumbnail_image(self) -> Optional[File]:
-        return File.query.filter_by(id=self.thumbnail_id).first()
-
     # TODO: probably refactor this out and just have a `posts` folder
     def get_directory(self) -> pathlib.Path:
         """Return path of this post's directory."""
@@ -92,6 +102,17 @@ class Post(db.Model):
         """Return path of this post's Markdown content."""
         return self.get_directory() / "post.md"
 
+    def get_rendered_path(self) -> pathlib.Path:
+        """Return path of this post's pre-rendered HTML."""
+        return self.get_directory() / "post.html"
+
+    def get_rendered_key_path(self) -> pathlib.Path:
+        """
+        Return path of the file storing the key of the options (and renderer
+        version) that this post's pre-rendered HTML was rendered with.
+        """
+        return self.get_directory() / "post.html.key"
+
     def write_content(self, markdown_text: str):
         """Write this post's markdown file. Does not update `last_modified`!"""
         with open(self.get_markdown_path(), "w+", encoding="utf-8") as out:
@@ -99,40 +120,183 @@ class Post(db.Model):
         db.session.commit()
 
     def render_html(self) -> str:
-        """Retrieve the Markdown file containing the post's contents and render to HTML."""
+        """
+        Return this post's contents as HTML.
+
+        Serves the pre-rendered HTML if it exists and is up-to-date with the
+        Markdown file. Otherwise, falls back to a live render (see `prerender()`).
+        """
+        if self._is_prerendered_fresh():
+            with open(self.get_rendered_path(), encoding="utf-8") as f:
+                return f.read()
+        return self.prerender()
+
+    def prerender(self) -> str:
+        """
+        Render the Markdown file containing the post's contents to HTML and
+        store the result next to the Markdown file. Returns the HTML.
+        """
         with open(self.get_markdown_path(), encoding="utf-8", errors="strict") as f:
-            markdown = f.read()  # TODO: this is very inefficient. Fix!
-            # Resolve file URLs
-            for file_name in renderer.find_images(markdown):
-                found_file = File.query.filter_by(filename=file_name).first()
-                if found_file:
-                    markdown = markdown.replace(file_name, found_file.relative_url)
-                else:
-                    flask.current_app.logger.error(
-                        f"Couldn't find file reference {file_name} in post {self.slug}"
-                    )
-            html = renderer.render_string(markdown)
-
-            # Render as a template to allow expanding `url_for()` calls (for example)
-            return flask.render_template_string(html)
+            markdown = f.read()
+        result, is_complete = self.render(markdown)
+        self.store_rendered(result.html, is_complete)
+        return result.html
 
-    def get_prev(self) -> Optional["Post"]:
-        return (
-            Post.query.filter(
-                Post.is_published and Post.publish_date < self.publish_date
+    def render(self, markdown: str) -> Tuple[renderer.RenderResult, bool]:
+        """
+        Render the given Markdown as this post's contents. File references
+        are resolved to their URLs, and the HTML is expanded as a template.
+
+        Returns the `RenderResult` and whether all file references could be
+        resolved. Raises ValueError if the Markdown is invalid.
+        """
+        # Resolve file URLs, looking up all referenced files at once
+        references = renderer.find_image_references(markdown)
+        file_names = {reference.path for reference in references}
+        files = File.query.options(selectinload(File.derivatives)).filter(
+            File.filename.in_(file_names)
+        )
+        urls = {}
+        # Copies of the images, for responsive images
+        image_sources = {}
+        for file in files:
+            urls[file.filename] = file.relative_url
+            image_sources[file.relative_url] = file.get_image_sources()
+        missing = sorted(file_names - urls.keys())
+        if missing:
+            flask.current_app.logger.error(
+                f"Couldn't find file references {', '.join(missing)} in post {self.slug}"
             )
-            .order_by(desc(Post.publish_date))
-            .first()
+        markdown = renderer.replace_image_paths(markdown, urls, references)
+        is_complete = not missing
+        result = renderer.render(
+            markdown,
+            flask.current_app.render_cache,
+            flask.current_app.config[ConfigKeys.CODE_STYLE],
+            flask.current_app.config[ConfigKeys.CODE_CSS_CLASSES],
+            image_sources,
         )
+        # Render as a template to allow expanding `url_for()` calls (for example)
+        try:
+            result.html = flask.render_template_string(result.html)
+        except jinja2.TemplateError as e:
+            raise ValueError(f"Error expanding the rendered HTML as a template: {e}")
+        return result, is_complete
 
-    def get_next(self) -> Optional["Post"]:
+    def store_rendered(self, html: str, is_complete: bool):
+        """
+        Store the given HTML as this post's pre-rendered HTML.
+
+        The HTML is only stored if it is complete, i.e. all file references
+        could be resolved, so that a post referencing a not-yet-uploaded file
+        will be re-rendered once the file exists.
+        """
+        if is_complete:
+            with open(self.get_rendered_path(), "w", encoding="utf-8") as out:
+                out.write(html)
+            with open(self.get_rendered_key_path(), "w", encoding="utf-8") as out:
+                out.write(Post._make_render_options_key())
+        else:
+            self.clear_prerendered()
+
+    def clear_prerendered(self):
+        """Delete the pre-rendered HTML, if any. It will be re-created on demand."""
+        for path in (self.get_rendered_path(), self.get_rendered_key_path()):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _is_prerendered_fresh(self) -> bool:
+        """
+        Return whether the pre-rendered HTML exists, is not older than the
+        Markdown, and was rendered with the current options and renderer.
+        """
+        try:
+            rendered_mtime = self.get_rendered_path().stat().st_mtime_ns
+            with open(self.get_rendered_key_path(), encoding="utf-8") as f:
+                key = f.read()
+        except FileNotFoundError:
+            return False
         return (
-            Post.query.filter(
-                Post.is_published and Post.publish_date > self.publish_date
-            )
-            .order_by(asc(Post.publish_date))
-            .first()
+            rendered_mtime >= self.get_markdown_path().stat().st_mtime_ns
+            and key == Post._make_render_options_key()
+        )
+
+    @staticmethod
+    def _make_render_options_key() -> str:
+        """Make a key of the current render options and renderer version."""
+        config = flask.current_app.config
+        return make_key(
+            f"{config[ConfigKeys.CODE_STYLE]}\0{config[ConfigKeys.CODE_CSS_CLASSES]}",
+            "prerendered",
+        )
+
+    def references_file(self, filename: str) -> bool:
+        """Return whether this post's Markdown references the file with the given name."""
+        try:
+            with open(self.get_markdown_path(), encoding="utf-8") as f:
+                markdown = f.read()
+        except FileNotFoundError:
+            return False
+        # Cheap check first, since most posts don't mention the file at all
+        if filename not in markdown:
+            return False
+        try:
+            return filename in renderer.find_images(markdown)
+        except ValueError:
+            # Can't tell for invalid Markdown, so assume it does
+            return True
+
+    def get_prev(self) -> Optional["Post"]:
+        """Return the published post published before this one, if any."""
+        return db.session.get(Post, self.prev_id) if self.prev_id else None
+
+    def get_next(self) -> Optional["Post"]:
+        """Return the published post published after this one, if any."""
+        return db.session.get(Post, self.next_id) if self.next_id else None
+
+    @staticmethod
+    def update_neighbors():
+        """
+        Recompute `prev_id` and `next_id` of all posts. Must be called
+        whenever a post is published, unpublished, or deleted. Does not commit.
+        """
+        published = (
+            Post.query.filter(Post.is_published)
+            .order_by(asc(Post.publish_date), asc(Post.id))
+            .all()
         )
+        for i, post in enumerate(published):
+            post.prev_id = published[i - 1].id if i > 0 else None
+            post.next_id = published[i + 1].id if i + 1 < len(published) else None
+        Post.query.filter(
+            db.or_(Post.is_published.is_(None), ~Post.is_published)
+        ).update({Post.prev_id: None, Post.next_id: None}, synchronize_session="fetch")
+
+    @staticmethod
+    def eager_loading(for_contract: bool = False) -> List:
+        """
+        Return query options that load the relationships of the queried posts
+        up-front, so that displaying a list of posts takes a constant number
+        of queries. Images are loaded using the configured
+        `POST_LOADING_STRATEGY`.
+
+        Set `for_contract` to also load everything used by `make_contract()`.
+
+        Example: `Post.query.options(*Post.eager_loading()).all()`
+        """
+        load = LOADING_STRATEGIES[
+            flask.current_app.config[ConfigKeys.POST_LOADING_STRATEGY]
+        ]
+        images = [Post.featured_image, Post.banner_image, Post.thumbnail_image]
+        if for_contract:
+            options = [load(image).joinedload(File.uploaded_by) for image in images]
+        else:
+            # Copies of the images are used to display responsive images
+            options = [load(image).selectinload(File.derivatives) for image in images]
+        # Tags are a collection, which is best loaded in a separate query
+        return options + [load(Post.author), selectinload(Post.tags)]
 
     def make_contract(self) -> PostContract:
         return PostContract(
@@ -144,11 +308,13 @@ class Post(db.Model):
             byline=self.byline,
             publish_date=self.publish_date,
             featured_image=self.featured_image.make_contract()
-            if self.featured_id
+            if self.featured_image
+            else None,
+            banner_image=self.banner_image.make_contract()
+            if self.banner_image
             else None,
-            banner_image=self.banner_image.make_contract() if self.banner_id else None,
             thumbnail_image=self.thumbnail_image.make_contract()
-            if self.thumbnail_id
+            if self.thumbnail_image
             else None,
             tags=[t.make_contract() for t in self.tags],
             is_featured=self.is_featured,
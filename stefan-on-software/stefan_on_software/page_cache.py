@@ -0,0 +1,199 @@
+"""
+A cache of fully-rendered public pages.
+
+Pages are cached under their URL, without the query string. Every key also includes the cache's
+current "generation", which is incremented by `invalidate()` whenever the
+site's content changes. This makes all previously-cached pages unreachable
+at once, without having to know which pages a change affects. Stale pages
+are then evicted from memory as new pages are cached.
+
+The generation is always kept in a `SQLiteStore`, so that an invalidation
+by one worker process is seen by all others, and survives restarts. By
+default, the cached pages are kept in the memory of each process. With
+`shared=True`, they are kept in the `SQLiteStore` too.
+"""
+import functools
+import sqlite3
+import threading
+import typing
+from datetime import datetime
+from pathlib import Path
+
+from flask import current_app, has_request_context, request
+from stefan_on_software_renderer.cache import CacheStore, RenderCache, make_key
+
+from .site_config import ConfigKeys
+
+# Key under which the generation read during a request is kept in its WSGI environ
+VERSION_ENVIRON_KEY = "stefan_on_software.page_cache_version"
+
+
+class SQLiteStore(CacheStore):
+    """
+    Stores cached pages and the cache generation in a SQLite database.
+
+    At most `max_pages` pages are stored; once there are more, the pages
+    that were stored first are deleted. The database is created on first
+    use. Each thread uses its own connection.
+    """
+
+    def __init__(self, path: Path, max_pages: int = 256):
+        self._path = Path(path)
+        self.max_pages = max_pages
+        self._local = threading.local()
+
+    def get(self, key: str) -> typing.Optional[str]:
+        row = (
+            self._connect()
+            .execute("SELECT value FROM page WHERE key = ?", (key,))
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def set(self, key: str, value: str):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO page (key, value) VALUES (?, ?)", (key, value)
+            )
+            # Rows get increasing rowids as they are inserted (or replaced)
+            conn.execute(
+                "DELETE FROM page WHERE rowid <= (SELECT MAX(rowid) FROM page) - ?",
+                (self.max_pages,),
+            )
+
+    def get_generation(self) -> typing.Tuple[int, datetime]:
+        """Return the generation and the time at which it started."""
+        value, started_at = (
+            self._connect()
+            .execute("SELECT value, started_at FROM generation")
+            .fetchone()
+        )
+        return value, datetime.fromisoformat(started_at)
+
+    def increment_generation(self):
+        """Increment the generation and delete all pages, which are now stale."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE generation SET value = value + 1, started_at = ?",
+                (datetime.now().isoformat(),),
+            )
+            conn.execute("DELETE FROM page")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, creating the database if needed."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self._path))
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS page (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS generation (value INTEGER NOT NULL, started_at TEXT NOT NULL)"
+                )
+                conn.execute(
+                    "INSERT INTO generation (value, started_at) SELECT 0, ? WHERE NOT EXISTS (SELECT * FROM generation)",
+                    (datetime.now().isoformat(),),
+                )
+            self._local.conn = conn
+        return conn
+
+
+class PageCache:
+    """
+    A bounded LRU cache of rendered pages.
+
+    `store`: `SQLiteStore` that holds the generation, shared by all processes.
+    `max_size`: maximum number of pages kept in memory.
+    `shared`: whether to also keep the pages in `store`.
+    """
+
+    def __init__(self, store: SQLiteStore, max_size: int = 256, shared: bool = False):
+        self.store = store
+        self.invalidations = 0
+        self._pages = RenderCache(max_size, store if shared else None)
+
+    @property
+    def generation(self) -> int:
+        return self.get_version()[1]
+
+    def get_version(self) -> typing.Tuple[str, int, datetime]:
+        """
+        Return a string identifying the current generation, the generation
+        number, and the time at which the generation started (i.e. the time
+        of the last invalidation).
+
+        Within a request, the generation is only read from the store once.
+        """
+        if has_request_context() and VERSION_ENVIRON_KEY in request.environ:
+            return request.environ[VERSION_ENVIRON_KEY]
+        generation, started_at = self.store.get_generation()
+        version = f"generation-{generation}", generation, started_at
+        if has_request_context():
+            request.environ[VERSION_ENVIRON_KEY] = version
+        return version
+
+    def make_key(self, url: str) -> str:
+        """
+        Make the key for the page at `url`. Create the key *before* rendering
+        the page, so that a page rendered during an invalidation is stored
+        under the old generation.
+        """
+        return make_key(url, f"page:{self.get_version()[0]}")
+
+    def get(self, key: str) -> typing.Optional[str]:
+        return self._pages.get(key)
+
+    def set(self, key: str, page: str):
+        self._pages.set(key, page)
+
+    def invalidate(self):
+        """Make all cached pages stale."""
+        self.store.increment_generation()
+        self.invalidations += 1
+        if has_request_context():
+            request.environ.pop(VERSION_ENVIRON_KEY, None)
+
+    def get_metrics(self) -> typing.Dict[str, int]:
+        return {
+            "hits": self._pages.hits,
+            "misses": self._pages.misses,
+            "evictions": self._pages.evictions,
+            "size": len(self._pages),
+            "invalidations": self.invalidations,
+            "generation": self.generation,
+        }
+
+
+def cached(f: typing.Callable):
+    """
+    Decorator that serves the page from the cache, if possible, and otherwise
+    caches the page returned by the view. Only string responses are cached.
+
+    The query string is not part of the key, as the cached views don't read
+    it. Otherwise, any client could fill the cache with arbitrary URLs.
+
+    Place it below `logged_visit` so that cached visits are still logged.
+    """
+
+    @functools.wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_app.config[ConfigKeys.PAGE_CACHE_ENABLED]:
+            return f(*args, **kwargs)
+        key = current_app.page_cache.make_key(request.base_url)
+        page = current_app.page_cache.get(key)
+        if page is None:
+            page = f(*args, **kwargs)
+            if isinstance(page, str):
+                current_app.page_cache.set(key, page)
+        return page
+
+    return decorated_function
+
+
+def invalidate():
+    """
+    Invalidate all cached pages. Must be called after any change to content
+    that is shown on the public pages.
+    """
+    current_app.page_cache.invalidate()
@@ -0,0 +1,172 @@
+"""
+Keyset ("cursor") pagination.
+
+Rather than skipping a number of rows with `OFFSET`, the next page is
+requested with an opaque cursor that encodes the sort key of the last
+item on the current page. The page is then selected with a `WHERE` on
+the sort key, which stays fast however deep the page is. The sort key must
+be unique, so it should end with the primary key.
+
+`get_numbered_page()` provides numbered pages (e.g. for the /posts pages)
+on top of this.
+"""
+import base64
+import dataclasses as dc
+import json
+import math
+import typing
+from datetime import datetime
+
+import flask
+from sqlalchemy import and_, desc, func, or_
+
+
+class InvalidCursor(ValueError):
+    """Exception thrown when a cursor can't be decoded."""
+
+
+def encode_cursor(*values: typing.Union[datetime, int, str, None]) -> str:
+    """Encode the sort key of an item as a URL-safe cursor."""
+    _json = json.dumps(
+        [
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in values
+        ]
+    )
+    return base64.urlsafe_b64encode(_json.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: typing.Callable) -> typing.Tuple:
+    """
+    Decode a cursor made by `encode_cursor()`, converting each value with
+    the corresponding callable in `types` (e.g. `datetime.fromisoformat`).
+    None values are not converted. Raises InvalidCursor.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise InvalidCursor("Invalid cursor")
+        return tuple(
+            None if value is None else _type(value)
+            for value, _type in zip(values, types)
+        )
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+
+
+def after(columns: typing.Sequence, values: typing.Sequence):
+    """
+    Return a filter that selects the rows that come after `values` when
+    ordered by `columns` in descending order.
+    """
+    column, value = columns[0], values[0]
+    if len(columns) == 1:
+        return column < value
+    return or_(column < value, and_(column == value, after(columns[1:], values[1:])))
+
+
+def make_next_headers(endpoint: str, cursor: str) -> typing.Dict[str, str]:
+    """
+    Return the headers that point to the next page of the current request:
+    its URL in `Link` (with the request's other arguments) and its cursor
+    in `X-Next-Cursor`.
+    """
+    args = {**flask.request.args.to_dict(), "cursor": cursor}
+    args.pop("offset", None)
+    next_url = flask.url_for(endpoint, _external=True, **args)
+    return {"Link": f'<{next_url}>; rel="next"', "X-Next-Cursor": cursor}
+
+
+@dc.dataclass
+class NumberedPage:
+    """
+    A page of items, numbered from 1. Has the attributes of Flask-SQLAlchemy's
+    `Pagination` that templates use.
+    """
+
+    items: typing.List
+    page: int
+    per_page: int
+    total: int
+
+    @property
+    def pages(self) -> int:
+        return math.ceil(self.total / self.per_page)
+
+    @property
+    def has_prev(self) -> bool:
+        return self.page > 1
+
+    @property
+    def prev_num(self) -> typing.Optional[int]:
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def has_next(self) -> bool:
+        return self.page < self.pages
+
+    @property
+    def next_num(self) -> typing.Optional[int]:
+        return self.page + 1 if self.has_next else None
+
+    def iter_pages(
+        self,
+        left_edge: int = 2,
+        left_current: int = 2,
+        right_current: int = 4,
+        right_edge: int = 2,
+    ) -> typing.Iterator[typing.Optional[int]]:
+        """
+        Yield the page numbers to link to: those at the edges and around the
+        current page. None stands for a gap in the numbers.
+        """
+        pages_end = self.pages + 1
+        left_end = min(1 + left_edge, pages_end)
+        yield from range(1, left_end)
+        if left_end == pages_end:
+            return
+        mid_start = max(left_end, self.page - left_current)
+        mid_end = min(self.page + right_current + 1, pages_end)
+        if mid_start > left_end:
+            yield None
+        yield from range(mid_start, mid_end)
+        if mid_end == pages_end:
+            return
+        right_start = max(mid_end, pages_end - right_edge)
+        if right_start > mid_end:
+            yield None
+        yield from range(right_start, pages_end)
+
+
+def get_numbered_page(
+    query,
+    columns: typing.Sequence,
+    page: int,
+    per_page: int,
+    options: typing.Sequence = (),
+) -> NumberedPage:
+    """
+    Return page number `page` of `query`, ordered by `columns` in descending
+    order, with loader `options` applied to the items.
+
+    Rather than loading the page's items with `OFFSET`, only the sort key of
+    the last item of the previous page is looked up with `OFFSET` (which can
+    be done from an index). The page is then selected by key.
+    """
+    order_by = [desc(column) for column in columns]
+    total = query.with_entities(func.count()).order_by(None).scalar()
+    start = (page - 1) * per_page
+    if page < 1 or start >= total:
+        return NumberedPage([], page, per_page, total)
+    if start > 0:
+        key = (
+            query.with_entities(*columns)
+            .order_by(*order_by)
+            .offset(start - 1)
+            .limit(1)
+            .one()
+        )
+        query = query.filter(after(columns, key))
+    items = query.options(*options).order_by(*order_by).limit(per_page).all()
+    return NumberedPage(items, page, per_page, total)
@@ -6,14 +6,19 @@ from typing import Optional
 import sqlalchemy
 import stefan_on_software.contracts.constants as constants
 from flask import current_app
-from stefan_on_software import email_provider, image_validator, sitemapper
+from stefan_on_software import (
+    email_provider,
+    image_validator,
+    page_cache,
+    sitemapper,
+    tag_manager,
+)
 from stefan_on_software.contracts.create_post import CreatePostContract
 from stefan_on_software.contracts.update_post import UpdatePostContract
 from stefan_on_software.database import db
 from stefan_on_software.models.post import Post
 from stefan_on_software.models.user import User
 from stefan_on_software.site_config import ConfigKeys
-from stefan_on_software_renderer import renderer
 
 # TODO: still not sure about exception handling and whether/when to use custom classes
 
@@ -56,12 +61,11 @@ def create_post(contract: CreatePostContract, author: User) -> Post:
     newest_post = Post.query.order_by(sqlalchemy.desc(Post.id)).limit(1).first()
     expected_id = newest_post.id + 1 if newest_post else 1
 
-    if not image_validator.is_featured_image_valid(contract.featured_image):
-        raise InvalidFile(contract.featured_image)
-    if not image_validator.is_banner_image_valid(contract.banner_image):
-        raise InvalidFile(contract.banner_image)
-    if not image_validator.is_thumbnail_image_valid(contract.thumbnail_image):
-        raise InvalidFile(contract.thumbnail_image)
+    invalid_image = image_validator.find_invalid_image(
+        contract.featured_image, contract.banner_image, contract.thumbnail_image
+    )
+    if invalid_image:
+        raise InvalidFile(invalid_image)
 
     post = Post(
         author=author,
@@ -75,6 +79,7 @@ def create_post(contract: CreatePostContract, author: User) -> Post:
     )
     db.session.add(post)
     db.session.commit()
+    page_cache.invalidate()
 
     # Initialize post path and content file
     post.get_directory().mkdir(exist_ok=True)
@@ -103,12 +108,11 @@ def update_post(post_id: int, contract: UpdatePostContract, user: User) -> Post:
     if user != post.author:
         raise InsufficientPermission()
 
-    if not image_validator.is_featured_image_valid(contract.featured_image):
-        raise InvalidFile(contract.featured_image)
-    if not image_validator.is_banner_image_valid(contract.banner_image):
-        raise InvalidFile(contract.banner_image)
-    if not image_validator.is_thumbnail_image_valid(contract.thumbnail_image):
-        raise InvalidFile(contract.thumbnail_image)
+    invalid_image = image_validator.find_invalid_image(
+        contract.featured_image, contract.banner_image, contract.thumbnail_image
+    )
+    if invalid_image:
+        raise InvalidFile(invalid_image)
 
     post.slug = contract.slug
     post.title = contract.title
@@ -119,6 +123,9 @@ def update_post(post_id: int, contract: UpdatePostContract, user: User) -> Post:
     post.last_modified = datetime.now()
 
     db.session.commit()
+    # Re-render the post's HTML, as it may contain URLs that have changed
+    post.prerender()
+    page_cache.invalidate()
     # Update sitemap
     sitemapper.update_sitemap()
     current_app.logger.info(f"Updated post with id={post.id}")
@@ -148,7 +155,11 @@ def delete_post(post_id: int, user: User):
         )
 
     db.session.delete(post)
+    db.session.flush()
+    Post.update_neighbors()
     db.session.commit()
+    tag_manager.invalidate_post_counts()
+    page_cache.invalidate()
     # Update the sitemap
     sitemapper.update_sitemap()
     current_app.logger.info(f"Deleted post with id={post_id}")
@@ -163,11 +174,20 @@ def set_content(post_id: int, content: bytes):
         markdown = content.decode("utf-8", errors="strict")
     except UnicodeError as e:
         raise InvalidMarkdown(f"Error reading Markdown in UTF-8: {e}")
-    if not renderer.is_markdown_valid(markdown):
-        raise InvalidMarkdown("Provided Markdown is invalid")
+    # Render the post's HTML now so that it doesn't need to be rendered on
+    # page view. This also validates the Markdown.
+    try:
+        result, is_complete = post.render(markdown)
+    except ValueError as e:
+        raise InvalidMarkdown(f"Provided Markdown is invalid: {e}")
+    for warning in result.warnings:
+        current_app.logger.warning(f"Post with id={post.id}: {warning}")
     post.write_content(markdown)
     post.last_modified = datetime.now()
     db.session.commit()
+    # Store the HTML only after the Markdown, so that it isn't considered stale
+    post.store_rendered(result.html, is_complete)
+    page_cache.invalidate()
     # Add Markdown file to the search engine index
     current_app.search_engine.index_string(markdown, str(post.id), allow_overwrite=True)
     current_app.search_engine.commit()
@@ -177,7 +197,6 @@ def set_content(post_id: int, content: bytes):
 
 
 def publish(post_id: int, send_email: bool, publish_date: Optional[datetime] = None):
-    # TODO: currently, email sending fails silently. Should this be the case?
     post = Post.query.filter_by(id=post_id).first()
     if not post:
         raise NoSuchPost()
@@ -187,16 +206,19 @@ def publish(post_id: int, send_email: bool, publish_date: Optional[datetime] = N
     current_app.logger.info(f"Publishing {post.slug} with publish_date {publish_date}")
     post.is_published = True
     post.publish_date = publish_date if publish_date else datetime.now()
+    db.session.flush()
+    Post.update_neighbors()
     db.session.commit()
+    tag_manager.invalidate_post_counts()
+    page_cache.invalidate()
     # Update the sitemap
     sitemapper.update_sitemap()
 
     if send_email:
         if current_app.config[ConfigKeys.USE_EMAIL_LIST]:
-            try:
-                email_provider.get_email_provider().broadcast_new_post(post)
-            except ValueError as e:
-                current_app.logger.error(f"Error while sending email broadcast: {e}")
+            # Sent in the background. Failures are retried and can be
+            # inspected via `flask jobs list`.
+            email_provider.queue_broadcast(post)
         else:
             current_app.logger.warn(
                 "send_email=True but no email service is configured"
@@ -209,7 +231,11 @@ def unpublish(post_id: str):
         raise NoSuchPost()
     post.is_published = False
     post.publish_date = None
+    db.session.flush()
+    Post.update_neighbors()
     db.session.commit()
+    tag_manager.invalidate_post_counts()
+    page_cache.invalidate()
 
 
 def set_featured(post_id: str, is_featured: bool):
@@ -218,6 +244,7 @@ def set_featured(post_id: str, is_featured: bool):
         raise NoSuchPost()
     post.is_featured = is_featured
     db.session.commit()
+    page_cache.invalidate()
 
 
 def is_slug_valid(slug: str) -> bool:
@@ -3,6 +3,8 @@ import os
 import typing
 from typing import Dict
 
+from stefan_on_software_renderer import renderer
+
 
 class ConfigKeys:
     """
@@ -25,9 +27,31 @@ class ConfigKeys:
     USE_EMAIL_LIST = "USE_EMAIL_LIST"
     EMAIL_API_KEY = "EMAIL_API_KEY"
     EMAIL_LIST_ID = "EMAIL_LIST_ID"
+    EMAIL_PROVIDER = "EMAIL_PROVIDER"
+    EMAIL_CONNECT_TIMEOUT = "EMAIL_CONNECT_TIMEOUT"
+    EMAIL_READ_TIMEOUT = "EMAIL_READ_TIMEOUT"
+    JOB_WORKER_ENABLED = "JOB_WORKER_ENABLED"
     SQLALCHEMY_TRACK_MODIFICATIONS = "SQLALCHEMY_TRACK_MODIFICATIONS"
     PAGINATE_POSTS_PER_PAGE = "PAGINATE_POSTS_PER_PAGE"
     SITEMAP_PATH = "SITEMAP_PATH"
+    RENDER_CACHE_SIZE = "RENDER_CACHE_SIZE"
+    RENDER_CACHE_ON_DISK = "RENDER_CACHE_ON_DISK"
+    RENDER_CACHE_PATH = "RENDER_CACHE_PATH"
+    CODE_STYLE = "CODE_STYLE"
+    CODE_CSS_CLASSES = "CODE_CSS_CLASSES"
+    POST_LOADING_STRATEGY = "POST_LOADING_STRATEGY"
+    PAGE_CACHE_ENABLED = "PAGE_CACHE_ENABLED"
+    PAGE_CACHE_SIZE = "PAGE_CACHE_SIZE"
+    PAGE_CACHE_SHARED = "PAGE_CACHE_SHARED"
+    PAGE_CACHE_PATH = "PAGE_CACHE_PATH"
+    TRAFFIC_QUEUE_SIZE = "TRAFFIC_QUEUE_SIZE"
+    TRAFFIC_LOG_MAX_BYTES = "TRAFFIC_LOG_MAX_BYTES"
+    TRAFFIC_LOG_MAX_DAYS = "TRAFFIC_LOG_MAX_DAYS"
+    SITEMAP_UPDATE_DELAY = "SITEMAP_UPDATE_DELAY"
+    SITEMAP_PING_INTERVAL = "SITEMAP_PING_INTERVAL"
+    SITEMAP_PING_PATH = "SITEMAP_PING_PATH"
+    SITE_ANALYTICS_TIMEOUT = "SITE_ANALYTICS_TIMEOUT"
+    IMAGE_WORKERS = "IMAGE_WORKERS"
 
 
 @dc.dataclass
@@ -58,6 +82,15 @@ class SiteConfig:
     # Settings for the Site-Analytics API. Only relevant if use_site_analytics = true
     site_analytics_url: typing.Optional[str] = None
     site_analytics_key: typing.Optional[str] = None
+    # Number of seconds after which a request to the SiteAnalytics API times out
+    site_analytics_timeout: float = 2.0
+    # Maximum number of visits waiting to be logged. Further visits are
+    # dropped until the queue has room again.
+    traffic_queue_size: int = 1000
+    # The traffic log is rotated and compressed once it reaches this size
+    # (in bytes) or once its oldest visit is this many days old
+    traffic_log_max_bytes: int = 10_000_000
+    traffic_log_max_days: int = 1
 
     # Whether to provide an email list via Sendinblue
     use_email_list: bool = False
@@ -66,12 +99,58 @@ class SiteConfig:
     email_api_key: typing.Optional[str] = None
     # ID of the email list to use
     email_list_id: typing.Optional[int] = None
+    # "sendinblue", or "fake" to record emails instead of sending them
+    email_provider: str = "sendinblue"
+    # Number of seconds after which connecting to, or waiting for a
+    # response from, the Sendinblue API times out
+    email_connect_timeout: float = 3.0
+    email_read_timeout: float = 10.0
+
+    # Whether to run background jobs (e.g. sending emails) in a thread of
+    # the web app, started by its first request. Only enable this for a
+    # single worker process; otherwise, run `flask jobs work` instead.
+    job_worker_enabled: bool = False
 
     # SQLAlchemy setting: whether to track modifications
     sql_alchemy_track_modifications: bool = False
     # Number of posts to show per page in results (used for pagination)
     paginate_posts_per_page = 8
 
+    # Maximum number of rendered documents and code blocks to keep in memory
+    render_cache_size: int = 128
+    # Whether to also store rendered output on disk (in the instance folder),
+    # which allows it to be shared by multiple worker processes
+    render_cache_on_disk: bool = False
+
+    # Pygments style used to highlight code in posts (https://pygments.org/styles/)
+    code_style: str = renderer.DEFAULT_CODE_STYLE
+    # Whether to highlight code with CSS classes and a shared stylesheet,
+    # rather than inlining the style of every token
+    code_css_classes: bool = False
+
+    # Number of processes that process uploaded images. If 0, images are
+    # processed on the thread handling the upload.
+    image_workers: int = 2
+
+    # How to load the images of posts when querying lists of posts:
+    # "selectin" (one extra query per image type) or "joined" (JOINs)
+    post_loading_strategy: str = "selectin"
+
+    # Number of seconds without further changes after which the sitemap is
+    # regenerated, so that a burst of changes causes a single regeneration
+    sitemap_update_delay: float = 5.0
+    # Minimum number of seconds between two pings to Google about sitemap changes
+    sitemap_ping_interval: int = 3600
+
+    # Whether to cache the rendered public pages
+    page_cache_enabled: bool = True
+    # Maximum number of pages to keep in memory
+    page_cache_size: int = 256
+    # Whether to share cached pages between worker processes via a SQLite
+    # database in the instance folder. The cache's generation is always kept
+    # there, so that every process sees invalidations.
+    page_cache_shared: bool = False
+
     def check_validity(self):
         """
         Run basic checks to ensure there are no obvious problems in the config.
@@ -79,10 +158,22 @@ class SiteConfig:
         """
         if not self.secret_key:
             raise ValueError(f"{ConfigKeys.SECRET_KEY} is unset")
-        if self.use_email_list and not (self.email_api_key and self.email_list_id):
+        if self.email_provider not in ("sendinblue", "fake"):
+            raise ValueError(
+                f'{ConfigKeys.EMAIL_PROVIDER} must be "sendinblue" or "fake"'
+            )
+        if (
+            self.use_email_list
+            and self.email_provider == "sendinblue"
+            and not (self.email_api_key and self.email_list_id)
+        ):
             raise ValueError(
                 f"{ConfigKeys.USE_EMAIL_LIST} = True but {ConfigKeys.EMAIL_API_KEY} and {ConfigKeys.EMAIL_LIST_ID} are not both configured"
             )
+        if self.email_connect_timeout <= 0 or self.email_read_timeout <= 0:
+            raise ValueError(
+                f"{ConfigKeys.EMAIL_CONNECT_TIMEOUT} and {ConfigKeys.EMAIL_READ_TIMEOUT} must be positive"
+            )
         if self.use_site_analytics and not (
             self.site_analytics_key and self.site_analytics_url
         ):
@@ -93,6 +184,32 @@ class SiteConfig:
             raise ValueError(f'{ConfigKeys.INSTANCE_PATH} must not start with "/"')
         if self.rel_static_path and self.rel_static_path.startswith("/"):
             raise ValueError(f'{ConfigKeys.STATIC_PATH} must not start with "/"')
+        if self.render_cache_size < 1:
+            raise ValueError(f"{ConfigKeys.RENDER_CACHE_SIZE} must be at least 1")
+        if not renderer.is_code_style_valid(self.code_style):
+            raise ValueError(
+                f'{ConfigKeys.CODE_STYLE} "{self.code_style}" is not a Pygments style'
+            )
+        if self.page_cache_size < 1:
+            raise ValueError(f"{ConfigKeys.PAGE_CACHE_SIZE} must be at least 1")
+        if self.traffic_queue_size < 1:
+            raise ValueError(f"{ConfigKeys.TRAFFIC_QUEUE_SIZE} must be at least 1")
+        if self.traffic_log_max_bytes < 1:
+            raise ValueError(f"{ConfigKeys.TRAFFIC_LOG_MAX_BYTES} must be at least 1")
+        if self.traffic_log_max_days < 1:
+            raise ValueError(f"{ConfigKeys.TRAFFIC_LOG_MAX_DAYS} must be at least 1")
+        if self.site_analytics_timeout <= 0:
+            raise ValueError(f"{ConfigKeys.SITE_ANALYTICS_TIMEOUT} must be positive")
+        if self.sitemap_update_delay < 0:
+            raise ValueError(f"{ConfigKeys.SITEMAP_UPDATE_DELAY} must not be negative")
+        if self.sitemap_ping_interval < 0:
+            raise ValueError(f"{ConfigKeys.SITEMAP_PING_INTERVAL} must not be negative")
+        if self.image_workers < 0:
+            raise ValueError(f"{ConfigKeys.IMAGE_WORKERS} must not be negative")
+        if self.post_loading_strategy not in ("selectin", "joined"):
+            raise ValueError(
+                f'{ConfigKeys.POST_LOADING_STRATEGY} must be "selectin" or "joined"'
+            )
 
     def to_dict(self) -> Dict:
         """Return parameters as a dictionary."""
@@ -105,10 +222,29 @@ class SiteConfig:
             ConfigKeys.USE_EMAIL_LIST: self.use_email_list,
             ConfigKeys.SITE_ANALYTICS_URL: self.site_analytics_url,
             ConfigKeys.SITE_ANALYTICS_KEY: self.site_analytics_key,
+            ConfigKeys.SITE_ANALYTICS_TIMEOUT: self.site_analytics_timeout,
+            ConfigKeys.TRAFFIC_QUEUE_SIZE: self.traffic_queue_size,
+            ConfigKeys.TRAFFIC_LOG_MAX_BYTES: self.traffic_log_max_bytes,
+            ConfigKeys.TRAFFIC_LOG_MAX_DAYS: self.traffic_log_max_days,
             ConfigKeys.EMAIL_API_KEY: self.email_api_key,
             ConfigKeys.EMAIL_LIST_ID: self.email_list_id,
+            ConfigKeys.EMAIL_PROVIDER: self.email_provider,
+            ConfigKeys.EMAIL_CONNECT_TIMEOUT: self.email_connect_timeout,
+            ConfigKeys.EMAIL_READ_TIMEOUT: self.email_read_timeout,
+            ConfigKeys.JOB_WORKER_ENABLED: self.job_worker_enabled,
             ConfigKeys.SQLALCHEMY_TRACK_MODIFICATIONS: self.sql_alchemy_track_modifications,
             ConfigKeys.PAGINATE_POSTS_PER_PAGE: self.paginate_posts_per_page,
+            ConfigKeys.RENDER_CACHE_SIZE: self.render_cache_size,
+            ConfigKeys.RENDER_CACHE_ON_DISK: self.render_cache_on_disk,
+            ConfigKeys.CODE_STYLE: self.code_style,
+            ConfigKeys.CODE_CSS_CLASSES: self.code_css_classes,
+            ConfigKeys.POST_LOADING_STRATEGY: self.post_loading_strategy,
+            ConfigKeys.IMAGE_WORKERS: self.image_workers,
+            ConfigKeys.SITEMAP_UPDATE_DELAY: self.sitemap_update_delay,
+            ConfigKeys.SITEMAP_PING_INTERVAL: self.sitemap_ping_interval,
+            ConfigKeys.PAGE_CACHE_ENABLED: self.page_cache_enabled,
+            ConfigKeys.PAGE_CACHE_SIZE: self.page_cache_size,
+            ConfigKeys.PAGE_CACHE_SHARED: self.page_cache_shared,
         }
 
     @staticmethod
@@ -131,12 +267,42 @@ class SiteConfig:
             kwargs["site_analytics_url"] = os.environ[ConfigKeys.SITE_ANALYTICS_URL]
         if ConfigKeys.SITE_ANALYTICS_KEY in os.environ:
             kwargs["site_analytics_url"] = os.environ[ConfigKeys.SITE_ANALYTICS_KEY]
+        if ConfigKeys.SITE_ANALYTICS_TIMEOUT in os.environ:
+            kwargs["site_analytics_timeout"] = float(
+                os.environ[ConfigKeys.SITE_ANALYTICS_TIMEOUT]
+            )
+        if ConfigKeys.TRAFFIC_QUEUE_SIZE in os.environ:
+            kwargs["traffic_queue_size"] = int(
+                os.environ[ConfigKeys.TRAFFIC_QUEUE_SIZE]
+            )
+        if ConfigKeys.TRAFFIC_LOG_MAX_BYTES in os.environ:
+            kwargs["traffic_log_max_bytes"] = int(
+                os.environ[ConfigKeys.TRAFFIC_LOG_MAX_BYTES]
+            )
+        if ConfigKeys.TRAFFIC_LOG_MAX_DAYS in os.environ:
+            kwargs["traffic_log_max_days"] = int(
+                os.environ[ConfigKeys.TRAFFIC_LOG_MAX_DAYS]
+            )
         if ConfigKeys.USE_EMAIL_LIST in os.environ:
             kwargs["use_email_list"] = os.environ[ConfigKeys.USE_EMAIL_LIST]
         if ConfigKeys.EMAIL_API_KEY in os.environ:
             kwargs["email_api_key"] = os.environ[ConfigKeys.EMAIL_API_KEY]
         if ConfigKeys.EMAIL_LIST_ID in os.environ:
             kwargs["email_list_id"] = os.environ[ConfigKeys.EMAIL_LIST_ID]
+        if ConfigKeys.EMAIL_PROVIDER in os.environ:
+            kwargs["email_provider"] = os.environ[ConfigKeys.EMAIL_PROVIDER]
+        if ConfigKeys.EMAIL_CONNECT_TIMEOUT in os.environ:
+            kwargs["email_connect_timeout"] = float(
+                os.environ[ConfigKeys.EMAIL_CONNECT_TIMEOUT]
+            )
+        if ConfigKeys.EMAIL_READ_TIMEOUT in os.environ:
+            kwargs["email_read_timeout"] = float(
+                os.environ[ConfigKeys.EMAIL_READ_TIMEOUT]
+            )
+        if ConfigKeys.JOB_WORKER_ENABLED in os.environ:
+            kwargs["job_worker_enabled"] = (
+                os.environ[ConfigKeys.JOB_WORKER_ENABLED].lower() == "true"
+            )
         if ConfigKeys.SQLALCHEMY_TRACK_MODIFICATIONS in os.environ:
             kwargs["sql_alchemy_track_modifications"] = os.environ[
                 ConfigKeys.SQLALCHEMY_TRACK_MODIFICATIONS
@@ -145,5 +311,41 @@ class SiteConfig:
             kwargs["paginate_posts_per_page"] = os.environ[
                 ConfigKeys.PAGINATE_POSTS_PER_PAGE
             ]
+        if ConfigKeys.RENDER_CACHE_SIZE in os.environ:
+            kwargs["render_cache_size"] = int(os.environ[ConfigKeys.RENDER_CACHE_SIZE])
+        if ConfigKeys.RENDER_CACHE_ON_DISK in os.environ:
+            kwargs["render_cache_on_disk"] = (
+                os.environ[ConfigKeys.RENDER_CACHE_ON_DISK].lower() == "true"
+            )
+        if ConfigKeys.CODE_STYLE in os.environ:
+            kwargs["code_style"] = os.environ[ConfigKeys.CODE_STYLE]
+        if ConfigKeys.CODE_CSS_CLASSES in os.environ:
+            kwargs["code_css_classes"] = (
+                os.environ[ConfigKeys.CODE_CSS_CLASSES].lower() == "true"
+            )
+        if ConfigKeys.POST_LOADING_STRATEGY in os.environ:
+            kwargs["post_loading_strategy"] = os.environ[
+                ConfigKeys.POST_LOADING_STRATEGY
+            ]
+        if ConfigKeys.IMAGE_WORKERS in os.environ:
+            kwargs["image_workers"] = int(os.environ[ConfigKeys.IMAGE_WORKERS])
+        if ConfigKeys.SITEMAP_UPDATE_DELAY in os.environ:
+            kwargs["sitemap_update_delay"] = float(
+                os.environ[ConfigKeys.SITEMAP_UPDATE_DELAY]
+            )
+        if ConfigKeys.SITEMAP_PING_INTERVAL in os.environ:
+            kwargs["sitemap_ping_interval"] = int(
+                os.environ[ConfigKeys.SITEMAP_PING_INTERVAL]
+            )
+        if ConfigKeys.PAGE_CACHE_ENABLED in os.environ:
+            kwargs["page_cache_enabled"] = (
+                os.environ[ConfigKeys.PAGE_CACHE_ENABLED].lower() == "true"
+            )
+        if ConfigKeys.PAGE_CACHE_SIZE in os.environ:
+            kwargs["page_cache_size"] = int(os.environ[ConfigKeys.PAGE_CACHE_SIZE])
+        if ConfigKeys.PAGE_CACHE_SHARED in os.environ:
+            kwargs["page_cache_shared"] = (
+                os.environ[ConfigKeys.PAGE_CACHE_SHARED].lower() == "true"
+            )
 
         return SiteConfig(os.environ[ConfigKeys.SECRET_KEY], **kwargs)
@@ -1,40 +1,254 @@
 import datetime
 import functools
+import logging
+import queue
+import threading
 import typing
 
 import requests
 from flask import current_app, request
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-from .site_config import ConfigKeys
+from .traffic_log import TrafficLog, Visit
+
+# Sentinel put on a queue to stop the thread processing it
+_STOP = object()
+
+
+class TrafficLogger:
+    """
+    Logs visits to the traffic log file and sends them to the SiteAnalytics
+    API (if `analytics_url` is set) from background threads, so that
+    neither slows down requests.
+
+    Visits are buffered in a queue of at most `max_queue_size` visits. If
+    the queue is full, new visits are dropped and counted in `dropped`. The
+    writer thread takes up to `batch_size` visits off the queue at a time
+    and appends them to the log with a single write. The log is rotated
+    once it is `max_log_bytes` large or `max_log_age` old (see `TrafficLog`).
+
+    Written visits are then queued again for a separate sender thread,
+    which sends them to SiteAnalytics over a pooled connection, so that a
+    slow or unreachable SiteAnalytics doesn't hold up the log. Requests
+    time out after `timeout` seconds and are retried with exponential
+    backoff. Visits that don't fit in the sender's queue (also at most
+    `max_queue_size` visits) are counted in `failed`.
+
+    `start()` must be called before visits are processed.
+    """
+
+    def __init__(
+        self,
+        log_path: str,
+        analytics_url: typing.Optional[str] = None,
+        analytics_key: typing.Optional[str] = None,
+        max_queue_size: int = 1000,
+        batch_size: int = 100,
+        timeout: float = 2.0,
+        max_retries: int = 3,
+        max_log_bytes: int = 10_000_000,
+        max_log_age: datetime.timedelta = datetime.timedelta(days=1),
+        logger: typing.Optional[logging.Logger] = None,
+    ):
+        self.traffic_log = TrafficLog(log_path, max_log_bytes, max_log_age)
+        self.analytics_url = analytics_url
+        self.analytics_key = analytics_key
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.logger = logger if logger else logging.getLogger(__name__)
+        # Counters, reported via `get_metrics()`
+        self.written = 0
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        # Visits to write, and written visits to send
+        self._queue = queue.Queue(max_queue_size)
+        self._send_queue = queue.Queue(max_queue_size)
+        self._threads: typing.List[typing.Tuple[threading.Thread, queue.Queue]] = []
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            max_retries=Retry(
+                total=max_retries,
+                backoff_factor=0.5,
+                status_forcelist=(500, 502, 503, 504),
+                # Also retry POSTs: a visit that is recorded twice is
+                # preferable to one that is lost
+                allowed_methods=None,
+                raise_on_status=False,
+            )
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def start(self):
+        """Start the writer thread and, if needed, the sender thread."""
+        with self._lock:
+            if self._threads:
+                return
+            workers = [("traffic-logger", self._queue, self._process_written)]
+            if self.analytics_url:
+                workers.append(("traffic-sender", self._send_queue, self._send))
+            for name, _queue, process in workers:
+                thread = threading.Thread(
+                    target=self._run, args=(_queue, process), name=name, daemon=True
+                )
+                thread.start()
+                self._threads.append((thread, _queue))
+
+    def log(self, visit: Visit) -> bool:
+        """
+        Queue the visit to be logged. Never blocks. Returns False if the
+        visit was dropped because the queue is full.
+        """
+        try:
+            self._queue.put_nowait(visit)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+    def flush(self):
+        """Block until all queued visits have been written and sent."""
+        self._queue.join()
+        if self.analytics_url:
+            self._send_queue.join()
+
+    def close(self, timeout: float = 5.0):
+        """
+        Process the queued visits, then stop the threads. Visits that are
+        still queued after `timeout` seconds are discarded, and counted in
+        `dropped` (if not yet written) or `failed` (if not yet sent).
+        """
+        with self._lock:
+            threads, self._threads = self._threads, []
+        # The writer is stopped first, as it queues visits for the sender
+        for thread, _queue in threads:
+            try:
+                _queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                num_discarded = self._discard(_queue)
+                with self._lock:
+                    if _queue is self._queue:
+                        self.dropped += num_discarded
+                    else:
+                        self.failed += num_discarded
+                self.logger.warning(
+                    f"Discarded {num_discarded} queued visits on shutdown"
+                )
+                _queue.put_nowait(_STOP)
+            thread.join(timeout)
+        self._session.close()
+
+    def get_metrics(self) -> typing.Dict[str, int]:
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "sending": self._send_queue.qsize(),
+                "written": self.written,
+                "sent": self.sent,
+                "failed": self.failed,
+                "dropped": self.dropped,
+            }
+
+    def _run(
+        self,
+        _queue: queue.Queue,
+        process: typing.Callable[[typing.List[Visit]], None],
+    ):
+        """Process batches of visits taken off `_queue` until stopped."""
+        while True:
+            batch = [_queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(_queue.get_nowait())
+                except queue.Empty:
+                    break
+            visits = [item for item in batch if item is not _STOP]
+            try:
+                if visits:
+                    process(visits)
+            except Exception as e:
+                self.logger.error(f"Couldn't log {len(visits)} visits: {e}")
+            finally:
+                for _ in batch:
+                    _queue.task_done()
+            if len(visits) < len(batch):
+                return
+
+    def _discard(self, _queue: queue.Queue) -> int:
+        """Discard all visits in `_queue` and return their number."""
+        num_discarded = 0
+        while True:
+            try:
+                _queue.get_nowait()
+            except queue.Empty:
+                return num_discarded
+            _queue.task_done()
+            num_discarded += 1
+
+    def _process_written(self, visits: typing.List[Visit]):
+        self._write(visits)
+        if not self.analytics_url:
+            return
+        for i, visit in enumerate(visits):
+            try:
+                self._send_queue.put_nowait(visit)
+            except queue.Full:
+                with self._lock:
+                    self.failed += len(visits) - i
+                self.logger.error(
+                    f"Couldn't queue {len(visits) - i} visits for SiteAnalytics"
+                )
+                return
+
+    def _write(self, visits: typing.List[Visit]):
+        self.traffic_log.write(visits)
+        with self._lock:
+            self.written += len(visits)
+
+    def _send(self, visits: typing.List[Visit]):
+        # SiteAnalytics takes one visit per request. Sending the batch over
+        # the same session reuses the connection.
+        for i, visit in enumerate(visits):
+            try:
+                response = self._session.post(
+                    self.analytics_url,
+                    params={
+                        "url": visit.url,
+                        "ip_addr": visit.ip_address,
+                        "user_agent": visit.user_agent,
+                        "secret": self.analytics_key,
+                    },
+                    timeout=self.timeout,
+                )
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                # Don't wait for the rest of the batch to time out as well
+                with self._lock:
+                    self.failed += len(visits) - i
+                self.logger.error(f"Couldn't send visits to SiteAnalytics: {e}")
+                return
+            with self._lock:
+                self.sent += 1
 
 
 def log_visit():
-    """Logs a visit to local file and notifies traffic API, if configured."""
-    timestamp = datetime.datetime.now().strftime(r"%m-%d-%Y-%H:%M:%S:%f")[:-3]
-    url = request.path
+    """Queues a visit to be logged to file and sent to the traffic API, if configured."""
     # https://stackoverflow.com/questions/3759981/get-ip-address-of-visitors-using-flask-for-python
     ip_address = request.environ.get(
         "HTTP_X_FORWARDED_FOR", request.environ["REMOTE_ADDR"]
     )
-    user_agent = request.environ.get("HTTP_USER_AGENT", "")
-
-    with open(current_app.config[ConfigKeys.TRAFFIC_LOG_PATH], "a") as log_file:
-        log_file.write(f"{timestamp},{url},{ip_address},{user_agent}\n")
-
-    if current_app.config[ConfigKeys.USE_SITE_ANALYTICS]:
-        # Send data to site-analytics
-        try:
-            requests.post(
-                current_app.config[ConfigKeys.SITE_ANALYTICS_URL],
-                params={
-                    "url": request.path,
-                    "ip_addr": ip_address,
-                    "user_agent": request.environ["HTTP_USER_AGENT"],
-                    "secret": current_app.config[ConfigKeys.SITE_ANALYTICS_KEY],
-                },
-            )
-        except requests.exceptions.ConnectionError:
-            current_app.logger.error("Couldn't connect to SiteAnalytics")
+    current_app.traffic_logger.log(
+        Visit(
+            datetime.datetime.now(),
+            request.path,
+            ip_address,
+            request.environ.get("HTTP_USER_AGENT", ""),
+        )
+    )
 
 
 def logged_visit(f: typing.Callable):
@@ -1,30 +1,183 @@
 """Functionality for the generation and management of a sitemap."""
+import contextlib
+import gzip
+import itertools
+import os
+import tempfile
+import threading
+import time
+from datetime import date
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
 import flask
 import requests
+from stefan_on_software.database import db
 from stefan_on_software.models.post import Post
 from stefan_on_software.models.tag import Tag
 from stefan_on_software.site_config import ConfigKeys
 
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where the site can only run one process
+    fcntl = None
 
-def generate_sitemap(posts: Iterable[Post], tags: Iterable[Tag]) -> str:
-    return flask.render_template(
-        "blog/sitemap.xml",
-        posts=posts,
-        tags=tags,
+# Number of seconds after which the ping to Google times out
+PING_TIMEOUT = 5.0
+# Maximum number of URLs in one sitemap, as defined by the sitemap protocol
+MAX_URLS_PER_SITEMAP = 50_000
+# Number of posts loaded from the database at a time
+QUERY_BATCH_SIZE = 1000
+
+
+class SitemapUrl(NamedTuple):
+    loc: str
+    lastmod: Optional[date] = None
+
+
+def iter_urls() -> Iterator[SitemapUrl]:
+    """
+    Yield the URLs of all public pages. Posts are streamed from the
+    database, rather than loaded all at once.
+    """
+    for endpoint in (
+        "blog.index",
+        "blog.posts_page",
+        "blog.portfolio_page",
+        "blog.about_page",
+        "blog.search_page",
+    ):
+        yield SitemapUrl(flask.url_for(endpoint, _external=True))
+    for (slug,) in db.session.query(Tag.slug).order_by(Tag.slug):
+        yield SitemapUrl(flask.url_for("blog.tag_view", slug=slug, _external=True))
+    posts = (
+        db.session.query(Post.slug, Post.last_modified)
+        .filter(Post.is_published)
+        .order_by(Post.id)
+        .yield_per(QUERY_BATCH_SIZE)
     )
+    for slug, last_modified in posts:
+        yield SitemapUrl(
+            flask.url_for("blog.post_view", slug=slug, _external=True),
+            last_modified.date(),
+        )
 
 
-def generate_and_write_sitemap(output_path: Path):
+def get_part_path(output_path: Path, number: int) -> Path:
+    """Return the path of the `number`th sitemap listed in the sitemap index."""
+    return output_path.with_name(f"{output_path.stem}-{number}{output_path.suffix}")
+
+
+def _write_temporary(directory: Path, chunks: Iterable[str]) -> Tuple[str, str]:
+    """
+    Write `chunks` to a new temporary file in `directory`, and a gzipped
+    copy to another. Returns the paths of both files, which are unique, so
+    that several processes can write a sitemap at the same time.
+    """
+    paths = []
+    for suffix in (".tmp", ".gz.tmp"):
+        fd, tmp_path = tempfile.mkstemp(
+            dir=directory, prefix=".sitemap-", suffix=suffix
+        )
+        os.close(fd)
+        # The sitemap is public (mkstemp only makes it readable by the owner)
+        os.chmod(tmp_path, 0o644)
+        paths.append(tmp_path)
+    tmp_path, tmp_gz_path = paths
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as out, gzip.open(
+            tmp_gz_path, "wt", encoding="utf-8"
+        ) as out_gz:
+            for chunk in chunks:
+                out.write(chunk)
+                out_gz.write(chunk)
+    except BaseException:
+        _remove_temporary([(tmp_path, tmp_gz_path)])
+        raise
+    return tmp_path, tmp_gz_path
+
+
+def _remove_temporary(written: List[Tuple[str, str]]):
+    for paths in written:
+        for path in paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+def generate_and_write_sitemap(output_path: Path, max_urls: int = MAX_URLS_PER_SITEMAP):
     """
     Dynamically generates the sitemap based on the current posts and tags.
-    Writes the sitemap file to `output_path`.
+    Writes the sitemap file to `output_path`, along with a gzipped copy.
+
+    If there are more than `max_urls` URLs, they are split over several
+    sitemaps, which are listed in a sitemap index written to `output_path`
+    (see https://www.sitemaps.org/protocol.html#index).
+
+    All files are written to temporary files first and then moved into
+    place, so that readers never see a partially-written file.
     """
-    with open(output_path, "w+", encoding="utf-8") as out:
-        out.write(generate_sitemap(Post.query.all(), Tag.query.all()))
-    flask.current_app.logger.info("Updated and wrote sitemap.")
+    output_path = Path(output_path)
+    urls = iter_urls()
+    # Temporary files of the sitemaps written so far
+    written: List[Tuple[str, str]] = []
+    try:
+        while True:
+            written.append(
+                _write_temporary(
+                    output_path.parent,
+                    flask.stream_template(
+                        "blog/sitemap.xml", urls=itertools.islice(urls, max_urls)
+                    ),
+                )
+            )
+            next_url = next(urls, None)
+            if next_url is None:
+                break
+            urls = itertools.chain([next_url], urls)
+
+        if len(written) == 1:
+            # Everything fits in a single sitemap: no index necessary
+            destinations = [output_path]
+            num_parts = 0
+        else:
+            num_parts = len(written)
+            destinations = [
+                get_part_path(output_path, number) for number in range(1, num_parts + 1)
+            ]
+            written.append(
+                _write_temporary(
+                    output_path.parent,
+                    flask.stream_template(
+                        "blog/sitemap_index.xml",
+                        sitemaps=[
+                            flask.url_for(
+                                "blog.sitemap_part", number=number, _external=True
+                            )
+                            for number in range(1, num_parts + 1)
+                        ],
+                    ),
+                )
+            )
+            # The index is moved into place last, once its sitemaps exist
+            destinations.append(output_path)
+    except BaseException:
+        _remove_temporary(written)
+        raise
+    for (tmp_path, tmp_gz_path), path in zip(written, destinations):
+        os.replace(tmp_gz_path, f"{path}.gz")
+        os.replace(tmp_path, path)
+    # Remove sitemaps left over from a previous, larger index
+    for path in output_path.parent.glob(f"{output_path.stem}-*{output_path.suffix}*"):
+        number = path.name[len(output_path.stem) + 1 :].split(".")[0]
+        if number.isdigit() and int(number) > num_parts:
+            # Another process may have removed it already
+            path.unlink(missing_ok=True)
+    flask.current_app.logger.info(
+        f"Updated and wrote sitemap ({max(num_parts, 1)} files)."
+    )
 
 
 def ping_google():
@@ -33,19 +186,233 @@ def ping_google():
     See https://developers.google.com/search/docs/crawling-indexing/sitemaps/build-sitemap#addsitemap.
     """
     res = requests.get(
-        f"https://www.google.com/ping?sitemap={flask.url_for('blog.sitemap', _external=True)}"
+        f"https://www.google.com/ping?sitemap={flask.url_for('blog.sitemap', _external=True)}",
+        timeout=PING_TIMEOUT,
     )
     flask.current_app.logger.info(
         f"Notified Google about sitemap change. Response = {res.content}"
     )
 
 
-def update_sitemap():
+class PingRecord:
     """
-    Dynamically generates the sitemap and writes it to the path defined
-    in the site config. Will create the sitemap if it doesn't exist yet.
-    Will notify Google about the change if TESTING=false.
+    Records the time of the last ping to Google in the file at `path`, so
+    that it is shared by all processes of the site.
     """
-    generate_and_write_sitemap(Path(flask.current_app.config[ConfigKeys.SITEMAP_PATH]))
-    if not flask.current_app.config[ConfigKeys.TESTING]:
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock_path = self.path.with_name(f".{self.path.name}.lock")
+
+    def claim(self, interval: float) -> float:
+        """
+        If no ping has been recorded in the last `interval` seconds, record
+        one now and return 0. Otherwise, return the number of seconds until
+        a ping may be sent.
+        """
+        with self._locked():
+            now = time.time()
+            last_ping_at = self.get_last_ping()
+            if last_ping_at is not None:
+                # Also bounded in case the clock was set back
+                wait = min(last_ping_at + interval - now, interval)
+                if wait > 0:
+                    return wait
+            self._write(now)
+        return 0.0
+
+    def get_last_ping(self) -> Optional[float]:
+        """Return the time of the last ping (see `time.time()`), if any."""
+        try:
+            return float(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write(self, timestamp: float):
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(repr(timestamp))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Hold the lock on the record, which is shared by all processes."""
+        with open(self._lock_path, "a") as lock_file:
+            if fcntl:
+                # Released when the file is closed
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+
+class SitemapScheduler:
+    """
+    Regenerates the sitemap in a background thread.
+
+    Updates are debounced: the sitemap is regenerated once no update has
+    been requested for `delay` seconds, but at most `max_delay` seconds
+    after the first request. A burst of changes (e.g. uploading many posts)
+    therefore causes a single regeneration.
+
+    After a regeneration, Google is pinged, unless TESTING is set. Pings
+    are sent at most once every `ping_interval` seconds; a ping that would
+    be sent earlier is postponed until the interval has passed. The time of
+    the last ping is kept in the file at SITEMAP_PING_PATH, so that this
+    holds across all processes of the site.
+    """
+
+    def __init__(
+        self,
+        app: flask.Flask,
+        delay: float = 5.0,
+        max_delay: float = 60.0,
+        ping_interval: float = 3600.0,
+    ):
+        self.app = app
+        self.delay = delay
+        self.max_delay = max_delay
+        self.ping_interval = ping_interval
+        # Number of regenerations and pings, for monitoring and tests
+        self.num_updates = 0
+        self.num_pings = 0
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        # Time of the first update request since the last regeneration
+        self._first_requested_at: Optional[float] = None
+        # Time at which the sitemap should be regenerated
+        self._update_at: Optional[float] = None
+        self._ping_pending = False
+        # Time before which no ping may be sent
+        self._next_ping_at = 0.0
+        # Root URL of the site, used to build external URLs outside of requests
+        self._base_url: Optional[str] = None
+
+    def schedule(self):
+        """Request that the sitemap be regenerated. Returns immediately."""
+        base_url = flask.request.host_url if flask.has_request_context() else None
+        with self._cond:
+            if self._closed:
+                return
+            now = time.monotonic()
+            if self._first_requested_at is None:
+                self._first_requested_at = now
+            self._update_at = min(
+                now + self.delay, self._first_requested_at + self.max_delay
+            )
+            if base_url:
+                self._base_url = base_url
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="sitemap-scheduler", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify()
+
+    def close(self, run_pending: bool = True):
+        """
+        Stop the background thread. If `run_pending`, regenerate the sitemap
+        now if an update is pending. Pending pings are not sent.
+        """
+        with self._cond:
+            self._closed = True
+            thread = self._thread
+            is_pending = self._update_at is not None
+            self._update_at = None
+            self._cond.notify()
+        if thread is not None:
+            thread.join()
+        if run_pending and is_pending:
+            self._update()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        return
+                    now = time.monotonic()
+                    deadline = self._get_deadline()
+                    if deadline is not None and deadline <= now:
+                        break
+                    self._cond.wait(None if deadline is None else deadline - now)
+                do_update = self._update_at is not None and self._update_at <= now
+                if do_update:
+                    self._update_at = None
+                    self._first_requested_at = None
+                else:
+                    self._ping_pending = False
+            if do_update:
+                self._update()
+            else:
+                self._ping()
+
+    def _get_deadline(self) -> Optional[float]:
+        deadlines = []
+        if self._update_at is not None:
+            deadlines.append(self._update_at)
+        if self._ping_pending:
+            deadlines.append(self._next_ping_at)
+        return min(deadlines) if deadlines else None
+
+    def _update(self):
+        with self._request_context():
+            try:
+                generate_and_write_sitemap(
+                    Path(self.app.config[ConfigKeys.SITEMAP_PATH])
+                )
+            except Exception as e:
+                self.app.logger.error(f"Couldn't update the sitemap: {e}")
+                return
+        with self._cond:
+            self.num_updates += 1
+            if not self.app.config[ConfigKeys.TESTING]:
+                self._ping_pending = True
+                self._cond.notify()
+
+    def _ping(self):
+        record = PingRecord(Path(self.app.config[ConfigKeys.SITEMAP_PING_PATH]))
+        try:
+            wait = record.claim(self.ping_interval)
+        except OSError as e:
+            self.app.logger.error(f"Couldn't record the ping to Google: {e}")
+            wait = 0.0
+        with self._cond:
+            self._next_ping_at = time.monotonic() + (wait or self.ping_interval)
+            if wait:
+                # Another process pinged recently: ping once its interval is over
+                self._ping_pending = True
+                return
+        with self._request_context():
+            try:
+                self._send_ping()
+            except requests.exceptions.RequestException as e:
+                self.app.logger.error(f"Couldn't notify Google about the sitemap: {e}")
+                return
+        with self._cond:
+            self.num_pings += 1
+
+    def _send_ping(self):
         ping_google()
+
+    def _request_context(self):
+        # Allows building external URLs from the background thread
+        return self.app.test_request_context(base_url=self._base_url)
+
+
+def update_sitemap():
+    """
+    Schedules the sitemap to be regenerated and written to the path defined
+    in the site config, and Google to be notified about the change (see
+    `SitemapScheduler`). If TESTING=true, the sitemap is regenerated
+    immediately instead, and Google is not notified.
+    """
+    if flask.current_app.config[ConfigKeys.TESTING]:
+        generate_and_write_sitemap(
+            Path(flask.current_app.config[ConfigKeys.SITEMAP_PATH])
+        )
+    else:
+        flask.current_app.sitemap_scheduler.schedule()
@@ -0,0 +1,87 @@
+import threading
+import time
+from typing import Dict, Optional
+
+import stefan_on_software.models.relations as relations
+from flask import current_app
+from sqlalchemy import func
+from stefan_on_software.database import db
+from stefan_on_software.models.post import Post
+
+# Number of seconds for which the post counts are cached. The cache is also
+# invalidated whenever the counts change, so this is only a safety net.
+POST_COUNTS_TTL = 300
+
+
+class PostCountsCache:
+    """
+    Caches the number of published posts per tag.
+
+    The counts are stored with the page cache generation they were computed
+    in, which is shared by all worker processes. They are recomputed if the
+    generation has changed since (i.e. any process invalidated the page
+    cache), if they are older than `ttl` seconds, or if `invalidate()` has
+    been called since they were computed.
+    """
+
+    def __init__(self, ttl: float = POST_COUNTS_TTL):
+        self.ttl = ttl
+        self._counts: Optional[Dict[str, int]] = None
+        self._generation: Optional[int] = None
+        self._computed_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, generation: int) -> Optional[Dict[str, int]]:
+        with self._lock:
+            if (
+                self._counts is None
+                or self._generation != generation
+                or time.monotonic() - self._computed_at > self.ttl
+            ):
+                return None
+            return self._counts
+
+    def set(self, counts: Dict[str, int], generation: int):
+        with self._lock:
+            self._counts = counts
+            self._generation = generation
+            self._computed_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._counts = None
+
+
+def get_post_counts() -> Dict[str, int]:
+    """
+    Return the number of published posts that each tag appears in, keyed
+    by tag slug. Tags that don't appear in any published post are omitted.
+
+    The counts are computed with a single aggregate query and cached until
+    `invalidate_post_counts()` is called, or the page cache is invalidated
+    by any process.
+    """
+    # Read before computing, so that counts computed during an invalidation
+    # are stored under the old generation
+    generation = current_app.page_cache.generation
+    counts = current_app.post_counts_cache.get(generation)
+    if counts is None:
+        tag_column = relations.posts_to_tags.c.tag
+        counts = dict(
+            db.session.query(tag_column, func.count(Post.id))
+            .join(Post, Post.id == relations.posts_to_tags.c.post)
+            .filter(Post.is_published)
+            .group_by(tag_column)
+            .all()
+        )
+        current_app.post_counts_cache.set(counts, generation)
+    return counts
+
+
+def invalidate_post_counts():
+    """
+    Invalidate the cached post counts. Must be called whenever a post is
+    published, unpublished or deleted, or a tag is added to or removed from
+    a post.
+    """
+    current_app.post_counts_cache.invalidate()
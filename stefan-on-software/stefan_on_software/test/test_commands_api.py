@@ -1,6 +1,10 @@
 """Unit tests for the Commands API."""
+from typing import Dict, Tuple
+
 import stefan_on_software.test.test_util as util
+from flask import Flask
 from flask.testing import FlaskClient
+from stefan_on_software.models.post import Post
 from stefan_on_software.test.conftest import DEFAULT_USER, INVALID_USER
 
 
@@ -54,3 +58,39 @@ def test_auth(client: FlaskClient):
     )
     assert util.feature_post(client, INVALID_USER, 123).status == "403 FORBIDDEN"
     assert util.unfeature_post(client, INVALID_USER, 123).status == "403 FORBIDDEN"
+
+
+def test_neighbors(app: Flask):
+    """Publishing, unpublishing and deleting posts should keep prev/next up-to-date."""
+    client = app.test_client()
+    post_ids = [util.create_post(client, DEFAULT_USER).json["id"] for _ in range(4)]
+    # Leave the last post as a draft
+    for post_id in post_ids[:3]:
+        util.publish_post(client, DEFAULT_USER, post_id, False)
+
+    def get_neighbors() -> Dict[int, Tuple]:
+        with app.app_context():
+            return {
+                post.id: (post.prev_id, post.next_id)
+                for post in Post.query.filter(Post.id.in_(post_ids))
+            }
+
+    assert get_neighbors() == {
+        post_ids[0]: (None, post_ids[1]),
+        post_ids[1]: (post_ids[0], post_ids[2]),
+        post_ids[2]: (post_ids[1], None),
+        post_ids[3]: (None, None),
+    }
+    util.unpublish_post(client, DEFAULT_USER, post_ids[1], False)
+    assert get_neighbors() == {
+        post_ids[0]: (None, post_ids[2]),
+        post_ids[1]: (None, None),
+        post_ids[2]: (post_ids[0], None),
+        post_ids[3]: (None, None),
+    }
+    util.delete_post(client, DEFAULT_USER, post_ids[0])
+    assert get_neighbors() == {
+        post_ids[1]: (None, None),
+        post_ids[2]: (None, None),
+        post_ids[3]: (None, None),
+    }
@@ -1,10 +1,21 @@
+import concurrent.futures
 import hashlib
+import io
 import pathlib
 from enum import Enum
 
+import stefan_on_software.file_manager as file_manager
 import stefan_on_software.test.test_util as util
+from flask import Flask
 from flask.testing import FlaskClient
-from stefan_on_software.test.conftest import DEFAULT_USER, INVALID_USER
+from PIL import Image
+from stefan_on_software import db, image_pipeline
+from stefan_on_software.models.file import File, FileDerivative
+from stefan_on_software.test.conftest import (
+    DEFAULT_USER,
+    INVALID_USER,
+    make_auth_headers,
+)
 
 # Path to the root of the `test` folder
 TEST_ROOT = pathlib.Path(__file__).parent
@@ -49,6 +60,54 @@ def test_get_all(client: FlaskClient):
     assert response3.json in response_get.json
 
 
+def test_get_paginated(client: FlaskClient):
+    """Files should be returned most recent first, following the `Link` to the next page."""
+    file_ids = [
+        util.upload_file(client, DEFAULT_USER, get_example_file(file_type)).json["id"]
+        for file_type in ExampleFileType
+    ]
+
+    response = util.get_all_files(client, DEFAULT_USER, {"limit": 2})
+    assert response.status == "200 OK"
+    assert [file["id"] for file in response.json] == file_ids[:0:-1]
+    assert response.headers["Link"].endswith('>; rel="next"')
+    next_url = response.headers["Link"][1 : response.headers["Link"].index(">")]
+    assert "limit=2" in next_url
+
+    response = client.get(next_url, headers=make_auth_headers(DEFAULT_USER))
+    assert [file["id"] for file in response.json] == file_ids[:1]
+    assert "Link" not in response.headers
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_get_filtered(client: FlaskClient):
+    """Files can be filtered, and the returned fields can be selected."""
+    txt = util.upload_file(client, DEFAULT_USER, get_example_file(ExampleFileType.Txt))
+    jpg = util.upload_file(client, DEFAULT_USER, get_example_file(ExampleFileType.Jpg))
+
+    response = util.get_all_files(
+        client, DEFAULT_USER, {"filetype": "IMAGE", "fields": "id,url"}
+    )
+    assert response.json == [{"id": jpg.json["id"], "url": jpg.json["url"]}]
+    response = util.get_all_files(client, DEFAULT_USER, {"hash": txt.json["hash"]})
+    assert response.json == [txt.json]
+    response = util.get_all_files(
+        client, DEFAULT_USER, {"uploaded_after": "2100-01-01T00:00:00"}
+    )
+    assert response.json == []
+
+
+def test_get_invalid_parameters(client: FlaskClient):
+    for params in (
+        {"cursor": "invalid"},
+        {"limit": 0},
+        {"fields": "id,password"},
+        {"filetype": "VIDEO"},
+    ):
+        response = util.get_all_files(client, DEFAULT_USER, params)
+        assert response.status == "400 BAD REQUEST"
+
+
 def test_upload_text(client: FlaskClient):
     """Test uploading a text file."""
     file = get_example_file(ExampleFileType.Txt)
@@ -100,6 +159,19 @@ def test_upload_png(client: FlaskClient):
     assert response.json["hash"] == hashlib.md5(stored_file).hexdigest()
 
 
+def test_upload_timeout(app: Flask, monkeypatch):
+    """An image that takes too long to process should be rejected."""
+
+    def time_out(*args):
+        raise concurrent.futures.TimeoutError()
+
+    monkeypatch.setattr(app.image_pipeline, "process", time_out)
+    res = util.upload_file(
+        app.test_client(), DEFAULT_USER, get_example_file(ExampleFileType.Jpg)
+    )
+    assert res.status == "400 BAD REQUEST"
+
+
 def test_upload_duplicate(client: FlaskClient):
     """Upload the same file twice."""
     file = get_example_file(ExampleFileType.Png)
@@ -111,6 +183,49 @@ def test_upload_duplicate(client: FlaskClient):
     assert response1.json == response2.json
 
 
+def test_upload_duplicate_not_processed(client: FlaskClient, monkeypatch):
+    """A re-uploaded image should be recognized before it is processed again."""
+    file = get_example_file(ExampleFileType.Png)
+    response1 = util.upload_file(client, DEFAULT_USER, file)
+
+    def fail(*args):
+        raise AssertionError("Duplicate was processed")
+
+    monkeypatch.setattr(file_manager, "_process_file", fail)
+    response2 = util.upload_file(client, DEFAULT_USER, file)
+    assert response2.status == "200 OK"
+    assert response1.json == response2.json
+
+
+def test_upload_makes_derivatives(app: Flask):
+    """Uploading an image should store smaller copies of it in modern formats."""
+    client = app.test_client()
+    buffer = io.BytesIO()
+    Image.new("RGB", (1000, 500), (255, 0, 0)).save(buffer, format="JPEG")
+    file = util.ExampleFile(buffer.getvalue(), "image.jpg")
+    file_id = util.upload_file(client, DEFAULT_USER, file).json["id"]
+
+    with app.app_context(), app.test_request_context():
+        stored = db.session.get(File, file_id)
+        assert (stored.width, stored.height) == (1000, 500)
+        derivatives = {(d.width, d.format) for d in stored.derivatives}
+        for width in (200, 400, 800):
+            for format in image_pipeline.get_derivative_formats():
+                assert (width, format) in derivatives
+        assert (1000, "webp") in derivatives
+        assert (1000, "jpeg") not in derivatives
+        for derivative in stored.derivatives:
+            with Image.open(derivative.get_path()) as image:
+                assert image.size == (derivative.width, derivative.height)
+        assert stored.get_srcset("image/jpeg").endswith(f"{stored.relative_url} 1000w")
+        paths = [d.get_path() for d in stored.derivatives]
+
+    assert util.delete_file(client, DEFAULT_USER, file_id).status == "204 NO CONTENT"
+    assert not any(path.exists() for path in paths)
+    with app.app_context():
+        assert FileDerivative.query.count() == 0
+
+
 def test_missing_extension(client: FlaskClient):
     """Upload a file whose filename doesn't have an extension."""
     file = get_example_file(ExampleFileType.Txt)
@@ -139,6 +254,24 @@ def test_download(client: FlaskClient):
     assert response_download.data == file.contents
 
 
+def test_download_not_modified(client: FlaskClient):
+    """Downloading a file with a matching ETag should return a 304."""
+    file = get_example_file(ExampleFileType.Txt)
+    response_upload = util.upload_file(client, DEFAULT_USER, file)
+    response_download = util.download_file(
+        client, DEFAULT_USER, response_upload.json["id"]
+    )
+    assert response_download.headers["ETag"] == f'"{response_upload.json["hash"]}"'
+    response_cached = client.get(
+        f"/api/v1/files/{response_upload.json['id']}",
+        headers={
+            **make_auth_headers(DEFAULT_USER),
+            "If-None-Match": response_download.headers["ETag"],
+        },
+    )
+    assert response_cached.status == "304 NOT MODIFIED"
+
+
 def test_download_nonexistent(client: FlaskClient):
     """Try to download a file that doesn't exist."""
     response = util.download_file(client, DEFAULT_USER, "test-nonexistent")
@@ -184,3 +317,44 @@ def test_auth(client: FlaskClient):
     assert util.download_file(client, INVALID_USER, "123").status == "403 FORBIDDEN"
     assert util.delete_file(client, INVALID_USER, "123").status == "403 FORBIDDEN"
     assert util.get_file_metadata(client, INVALID_USER, "123").status == "403 FORBIDDEN"
+
+
+def test_post_images_validated_from_metadata(app: Flask, monkeypatch):
+    """A post's images should be validated from the metadata recorded on upload."""
+    client = app.test_client()
+    buffer = io.BytesIO()
+    Image.new("RGB", (400, 400), (0, 0, 255)).save(buffer, format="PNG")
+    file = util.ExampleFile(buffer.getvalue(), "thumbnail.png")
+    file_id = util.upload_file(client, DEFAULT_USER, file).json["id"]
+    with app.app_context():
+        stored = db.session.get(File, file_id)
+        assert (stored.width, stored.height, stored.image_format) == (400, 400, "JPEG")
+
+    def fail(*args):
+        raise AssertionError("Image read from disk")
+
+    monkeypatch.setattr(image_pipeline.Image, "open", fail)
+    res = util.create_post(client, DEFAULT_USER, thumbnail_id=file_id)
+    assert res.status == "201 CREATED"
+    res = util.create_post(client, DEFAULT_USER, featured_id=file_id)
+    assert res.status == "400 BAD REQUEST"
+
+
+def test_backfill_images(app: Flask):
+    """`flask backfill-images` should record the metadata of older uploads."""
+    client = app.test_client()
+    file_id = util.upload_file(
+        client, DEFAULT_USER, get_example_file(ExampleFileType.Jpg)
+    ).json["id"]
+    with app.app_context():
+        stored = db.session.get(File, file_id)
+        expected = (stored.width, stored.height, stored.image_format)
+        stored.width = stored.height = stored.image_format = None
+        db.session.commit()
+
+    res = app.test_cli_runner().invoke(args=["backfill-images"])
+    assert res.exit_code == 0
+    assert "Backfilled 1 images (0 failed)" in res.output
+    with app.app_context():
+        stored = db.session.get(File, file_id)
+        assert (stored.width, stored.height, stored.image_format) == expected
@@ -0,0 +1,137 @@
+"""Tests for conditional GET requests."""
+import io
+from typing import List, Tuple
+
+import pytest
+import stefan_on_software.contracts.constants as constants
+import stefan_on_software.test.test_util as util
+from flask import Flask
+from flask.testing import FlaskClient
+from PIL import Image
+from stefan_on_software.page_cache import PageCache, SQLiteStore
+from stefan_on_software.site_config import ConfigKeys
+from stefan_on_software.test.conftest import DEFAULT_USER, make_auth_headers
+
+
+def upload_image(client: FlaskClient, width: int, height: int) -> str:
+    """Upload a blank JPEG image with the given dimensions and return its ID."""
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (width % 256, height % 256, 0)).save(
+        buffer, format="JPEG"
+    )
+    image = util.ExampleFile(buffer.getvalue(), f"image-{width}x{height}.jpg")
+    return util.upload_file(client, DEFAULT_USER, image).json["id"]
+
+
+def make_post(client: FlaskClient) -> Tuple[int, List[str]]:
+    """
+    Create and publish a post with slug "post-1", tagged with "tag-1".
+    Returns the ID of the post and the IDs of its featured, banner and
+    thumbnail images.
+    """
+    image_ids = [
+        upload_image(
+            client, constants.FEATURED_IMAGE_WIDTH, constants.FEATURED_IMAGE_HEIGHT
+        ),
+        upload_image(client, constants.BANNER_WIDTH, constants.BANNER_HEIGHT),
+        upload_image(client, constants.THUMBNAIL_WIDTH, constants.THUMBNAIL_HEIGHT),
+    ]
+    post_id = util.create_post(
+        client, DEFAULT_USER, "post-1", None, None, *image_ids
+    ).json["id"]
+    util.create_tag(client, DEFAULT_USER, "Tag 1", "tag-1", "")
+    util.add_tag_to_post(client, DEFAULT_USER, post_id, "tag-1")
+    util.publish_post(client, DEFAULT_USER, post_id, False)
+    return post_id, image_ids
+
+
+@pytest.mark.parametrize("url", ["/", "/posts", "/post/post-1", "/tag/tag-1"])
+def test_not_modified(app: Flask, url: str):
+    """Pages should answer conditional requests with a 304."""
+    client = app.test_client()
+    make_post(client)
+    res = client.get(url)
+    assert res.status == "200 OK"
+    assert res.headers["ETag"]
+    assert res.headers["Last-Modified"]
+
+    res_etag = client.get(url, headers={"If-None-Match": res.headers["ETag"]})
+    assert res_etag.status == "304 NOT MODIFIED"
+    assert res_etag.data == b""
+    assert res_etag.headers["ETag"] == res.headers["ETag"]
+
+    res_date = client.get(
+        url, headers={"If-Modified-Since": res.headers["Last-Modified"]}
+    )
+    assert res_date.status == "304 NOT MODIFIED"
+
+
+def test_modified_after_change(app: Flask):
+    """Changing a post should change the ETag of the pages that show it."""
+    client = app.test_client()
+    post_id, image_ids = make_post(client)
+    etag = client.get("/post/post-1").headers["ETag"]
+    util.update_post(
+        client,
+        DEFAULT_USER,
+        post_id,
+        "post-1",
+        "New Title",
+        "",
+        *image_ids,
+    )
+    res = client.get("/post/post-1", headers={"If-None-Match": etag})
+    assert res.status == "200 OK"
+    assert b"New Title" in res.data
+    assert res.headers["ETag"] != etag
+
+
+def test_same_validators_in_other_process(app: Flask):
+    """
+    Another worker process, or the same one after a restart, should give the
+    same validators, until the content is invalidated by any process.
+    """
+    client = app.test_client()
+    make_post(client)
+    res = client.get("/post/post-1")
+    other_cache = PageCache(SQLiteStore(app.config[ConfigKeys.PAGE_CACHE_PATH]))
+    app.page_cache = other_cache
+    res_other = client.get("/post/post-1")
+    assert res_other.headers["ETag"] == res.headers["ETag"]
+    assert res_other.headers["Last-Modified"] == res.headers["Last-Modified"]
+
+    other_cache.invalidate()
+    res_other = client.get(
+        "/post/post-1", headers={"If-None-Match": res.headers["ETag"]}
+    )
+    assert res_other.status == "200 OK"
+
+
+def test_missing_page(client: FlaskClient):
+    """Pages that don't exist should still return a 404, without validators."""
+    res = client.get("/post/nonexistent")
+    assert res.status == "404 NOT FOUND"
+    assert "ETag" not in res.headers
+    assert client.get("/tag/nonexistent").status == "404 NOT FOUND"
+
+
+def test_sitemap_not_modified(client: FlaskClient):
+    res = client.get("/sitemap.xml")
+    assert res.status == "200 OK"
+    res = client.get("/sitemap.xml", headers={"If-None-Match": res.headers["ETag"]})
+    assert res.status == "304 NOT MODIFIED"
+
+
+def test_content_not_modified(client: FlaskClient):
+    post_id, _ = make_post(client)
+    util.set_content(client, DEFAULT_USER, post_id, b"# Heading")
+    res = util.get_content(client, DEFAULT_USER, post_id)
+    assert res.status == "200 OK"
+    res = client.get(
+        f"/api/v1/posts/{post_id}/content",
+        headers={
+            **make_auth_headers(DEFAULT_USER),
+            "If-None-Match": res.headers["ETag"],
+        },
+    )
+    assert res.status == "304 NOT MODIFIED"
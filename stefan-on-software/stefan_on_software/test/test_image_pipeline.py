@@ -0,0 +1,97 @@
+import concurrent.futures
+import io
+import multiprocessing
+import time
+from pathlib import Path
+
+import pytest
+import stefan_on_software.contracts.constants as constants
+from PIL import Image
+from stefan_on_software.image_pipeline import (
+    ImagePipeline,
+    InvalidImage,
+    get_derivative_formats,
+)
+
+
+def make_jpg(width: int, height: int) -> io.BytesIO:
+    contents = io.BytesIO()
+    Image.new("RGB", (width, height), color=(200, 50, 50)).save(contents, "JPEG")
+    contents.seek(0)
+    return contents
+
+
+@pytest.mark.parametrize("max_workers", [0, 1])
+def test_bound_large_image(tmp_path: Path, max_workers: int):
+    """A large photo should be scaled down to fit MAX_IMG_WIDTH x MAX_IMG_HEIGHT."""
+    pipeline = ImagePipeline(max_workers)
+    try:
+        pipeline.process(make_jpg(4000, 2000), tmp_path / "out.jpg")
+    finally:
+        pipeline.close()
+    with Image.open(tmp_path / "out.jpg") as image:
+        assert image.format == "JPEG"
+        assert image.size == (constants.MAX_IMG_WIDTH, constants.MAX_IMG_WIDTH // 2)
+    # The temporary copy handed to the worker is removed
+    assert [path.name for path in tmp_path.iterdir()] == ["out.jpg"]
+
+
+def test_keep_small_image(tmp_path: Path):
+    pipeline = ImagePipeline(0)
+    pipeline.process(make_jpg(300, 200), tmp_path / "out.jpg")
+    with Image.open(tmp_path / "out.jpg") as image:
+        assert image.size == (300, 200)
+
+
+@pytest.mark.parametrize("max_workers", [0, 1])
+def test_invalid_image(tmp_path: Path, max_workers: int):
+    pipeline = ImagePipeline(max_workers)
+    try:
+        with pytest.raises(InvalidImage):
+            pipeline.process(io.BytesIO(b"not an image"), tmp_path / "out.jpg")
+    finally:
+        pipeline.close()
+
+
+@pytest.mark.parametrize("max_workers", [0, 1])
+def test_make_derivatives(tmp_path: Path, max_workers: int):
+    """Copies should only be made at widths narrower than the image."""
+    (tmp_path / "image.jpg").write_bytes(make_jpg(600, 300).getvalue())
+    pipeline = ImagePipeline(max_workers)
+    try:
+        derivatives = pipeline.make_derivatives(tmp_path / "image.jpg")
+    finally:
+        pipeline.close()
+    formats = get_derivative_formats()
+    assert {(d.width, d.height) for d in derivatives} == {
+        (200, 100),
+        (400, 200),
+        (600, 300),
+    }
+    # The image itself is the JPG at full width
+    assert len(derivatives) == 3 * len(formats) - 1
+    for derivative in derivatives:
+        assert (tmp_path / derivative.filename).stat().st_size == derivative.size
+
+
+def run_forever(*args):
+    while True:
+        time.sleep(1)
+
+
+def test_timeout(tmp_path: Path):
+    """A call that times out should have its pool terminated, and not affect later images."""
+    pipeline = ImagePipeline(1, timeout=5)
+    try:
+        with pytest.raises(concurrent.futures.TimeoutError):
+            pipeline._run(run_forever)
+        # The runaway process is terminated
+        deadline = time.monotonic() + 5
+        while multiprocessing.active_children():
+            assert time.monotonic() < deadline, "Process not terminated"
+            time.sleep(0.01)
+        pipeline.timeout = 30
+        pipeline.process(make_jpg(300, 200), tmp_path / "out.jpg")
+    finally:
+        pipeline.close()
+    assert (tmp_path / "out.jpg").exists()
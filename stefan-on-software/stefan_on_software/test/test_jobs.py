@@ -0,0 +1,141 @@
+"""Tests for background jobs, using the fake email provider."""
+from datetime import datetime, timedelta
+
+import pytest
+import stefan_on_software.test.test_util as util
+from flask import Flask
+from flask.testing import FlaskCliRunner
+from stefan_on_software import job_queue
+from stefan_on_software.email_provider import (
+    EmailProvider,
+    FakeEmailProvider,
+    close_email_provider,
+    get_email_provider,
+)
+from stefan_on_software.models.job import Job, JobStatus
+from stefan_on_software.site_config import ConfigKeys
+from stefan_on_software.test.conftest import DEFAULT_USER
+
+
+@pytest.fixture()
+def email_app(app: Flask) -> Flask:
+    """An app that sends emails via the fake email provider."""
+    app.config[ConfigKeys.USE_EMAIL_LIST] = True
+    app.config[ConfigKeys.EMAIL_PROVIDER] = "fake"
+    return app
+
+
+def get_provider(app: Flask) -> FakeEmailProvider:
+    with app.app_context():
+        return get_email_provider()
+
+
+def get_jobs(app: Flask):
+    with app.app_context():
+        return [(job.kind, job.status, job.attempts) for job in Job.query.all()]
+
+
+def test_register_email(email_app: Flask):
+    """Registering an email address should queue a job that registers it."""
+    res = email_app.test_client().post(
+        "/api/v1/email/register", json={"address": "reader@test.com"}
+    )
+    assert res.status == "200 OK"
+    assert get_provider(email_app).contacts == []
+    assert get_jobs(email_app) == [("register_email", JobStatus.Pending, 0)]
+
+    with email_app.app_context():
+        assert job_queue.run_pending() == 1
+    assert get_provider(email_app).contacts == ["reader@test.com"]
+    assert get_provider(email_app).welcome_emails == ["reader@test.com"]
+    assert get_jobs(email_app) == [("register_email", JobStatus.Succeeded, 1)]
+
+
+def test_broadcast_once(email_app: Flask):
+    """A post's campaign should only be sent once, even if it is published again."""
+    client = email_app.test_client()
+    post_id = util.create_post(client, DEFAULT_USER, slug="post-1").json["id"]
+    util.publish_post(client, DEFAULT_USER, post_id, True)
+    util.unpublish_post(client, DEFAULT_USER, post_id, False)
+    util.publish_post(client, DEFAULT_USER, post_id, True)
+    with email_app.app_context():
+        assert job_queue.run_pending() == 1
+    provider = get_provider(email_app)
+    assert provider.campaigns == {1: "post-1"}
+    assert provider.sent_campaigns == [1]
+
+
+def test_retry_with_backoff(email_app: Flask, monkeypatch: pytest.MonkeyPatch):
+    """A failed job should be retried later, without repeating the steps that succeeded."""
+    client = email_app.test_client()
+    post_id = util.create_post(client, DEFAULT_USER, slug="post-1").json["id"]
+    util.publish_post(client, DEFAULT_USER, post_id, True)
+    provider = get_provider(email_app)
+
+    def fail(campaign_id: int):
+        raise ValueError("Unavailable")
+
+    # The campaign is created, but sending it fails
+    monkeypatch.setattr(provider, "send_campaign", fail)
+
+    with email_app.app_context():
+        assert job_queue.run_pending() == 1
+        job = Job.query.one()
+        assert job.status == JobStatus.Pending
+        assert job.last_error == "ValueError: Unavailable"
+        assert job.run_after > datetime.now()
+        # Not retried before the backoff has passed
+        assert job_queue.run_pending() == 0
+
+        monkeypatch.undo()
+        later = datetime.now() + job_queue.get_backoff(1) + timedelta(seconds=1)
+        assert job_queue.run_pending(now=later) == 1
+        assert Job.query.one().status == JobStatus.Succeeded
+    assert provider.campaigns == {1: "post-1"}
+    assert provider.sent_campaigns == [1]
+
+
+def test_fail_permanently(email_app: Flask, runner: FlaskCliRunner):
+    """A job should be marked as failed after its last attempt, and can be retried via the CLI."""
+    email_app.test_client().post(
+        "/api/v1/email/register", json={"address": "reader@test.com"}
+    )
+    get_provider(email_app).num_failures = job_queue.DEFAULT_MAX_ATTEMPTS
+    now = datetime.now()
+    with email_app.app_context():
+        for _ in range(job_queue.DEFAULT_MAX_ATTEMPTS):
+            now += job_queue.MAX_BACKOFF
+            assert job_queue.run_pending(now=now) == 1
+    assert get_jobs(email_app) == [
+        ("register_email", JobStatus.Failed, job_queue.DEFAULT_MAX_ATTEMPTS)
+    ]
+
+    res = runner.invoke(args=["jobs", "list", "--status", "failed"])
+    assert res.exit_code == 0
+    assert "register_email" in res.output
+    assert "Simulated failure" in res.output
+
+    res = runner.invoke(args=["jobs", "retry", "1"])
+    assert res.exit_code == 0
+    res = runner.invoke(args=["jobs", "work", "--once"])
+    assert res.exit_code == 0
+    assert "Ran 1 jobs" in res.output
+    assert get_jobs(email_app) == [("register_email", JobStatus.Succeeded, 1)]
+    assert get_provider(email_app).contacts == ["reader@test.com"]
+
+
+def test_email_provider_is_shared(email_app: Flask):
+    """The email provider and its pooled API client should be reused until closed."""
+    email_app.config[ConfigKeys.EMAIL_PROVIDER] = "sendinblue"
+    email_app.config[ConfigKeys.EMAIL_API_KEY] = "key"
+    email_app.config[ConfigKeys.EMAIL_LIST_ID] = 1
+    with email_app.app_context():
+        provider = get_email_provider()
+    with email_app.app_context():
+        assert get_email_provider() is provider
+    assert isinstance(provider, EmailProvider)
+    assert provider._timeout == (3.0, 10.0)
+
+    close_email_provider(email_app)
+    with email_app.app_context():
+        assert get_email_provider() is not provider
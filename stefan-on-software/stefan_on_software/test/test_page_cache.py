@@ -0,0 +1,106 @@
+"""Tests for the cache of rendered public pages."""
+import stefan_on_software.test.test_util as util
+from flask import Flask
+from stefan_on_software.page_cache import PageCache, SQLiteStore
+from stefan_on_software.test.conftest import DEFAULT_USER, make_auth_headers
+
+
+def get_metrics(app: Flask) -> dict:
+    res = app.test_client().get(
+        "/metrics/caches", headers=make_auth_headers(DEFAULT_USER)
+    )
+    assert res.status == "200 OK"
+    return res.json["page_cache"]
+
+
+def test_cache_hit(app: Flask):
+    """Requesting the same page twice should serve it from the cache."""
+    client = app.test_client()
+    res1 = client.get("/about")
+    res2 = client.get("/about")
+    assert res1.data == res2.data
+    metrics = get_metrics(app)
+    assert metrics["misses"] == 1
+    assert metrics["hits"] == 1
+    # Query strings are not part of the key
+    client.get("/about?ref=test")
+    assert get_metrics(app)["hits"] == 2
+
+
+def test_invalidate_on_change(app: Flask):
+    """Changing a post via the API should invalidate the cached pages."""
+    client = app.test_client()
+    post_id = util.create_post(client, DEFAULT_USER, title="First Title").json["id"]
+    util.publish_post(client, DEFAULT_USER, post_id, False)
+    assert b"First Title" in client.get("/posts").data
+
+    util.update_post(
+        client,
+        DEFAULT_USER,
+        post_id,
+        "new-post-1",
+        "Second Title",
+        "",
+        None,
+        None,
+        None,
+    )
+    res = client.get("/posts")
+    assert b"Second Title" in res.data
+    assert b"First Title" not in res.data
+
+    util.unpublish_post(client, DEFAULT_USER, post_id, False)
+    assert b"Second Title" not in client.get("/posts").data
+
+
+def test_shared_store(tmp_path):
+    """Caches sharing a SQLite store should share pages and invalidations."""
+    store_path = tmp_path / "page-cache.sqlite"
+    cache_1 = PageCache(SQLiteStore(store_path), shared=True)
+    cache_2 = PageCache(SQLiteStore(store_path), shared=True)
+
+    cache_1.set(cache_1.make_key("http://localhost/about"), "<p>About</p>")
+    assert cache_2.get(cache_2.make_key("http://localhost/about")) == "<p>About</p>"
+
+    cache_2.invalidate()
+    assert cache_1.generation == cache_2.generation == 1
+    assert cache_1.get(cache_1.make_key("http://localhost/about")) is None
+
+
+def test_invalidate_other_processes(tmp_path):
+    """Invalidating one process's cache should make the pages cached in memory by others stale."""
+    store_path = tmp_path / "page-cache.sqlite"
+    cache_1 = PageCache(SQLiteStore(store_path))
+    cache_2 = PageCache(SQLiteStore(store_path))
+
+    cache_1.set(cache_1.make_key("http://localhost/about"), "<p>About</p>")
+    # Pages are kept in memory, not shared
+    assert cache_2.get(cache_2.make_key("http://localhost/about")) is None
+
+    cache_2.invalidate()
+    assert cache_1.get(cache_1.make_key("http://localhost/about")) is None
+
+
+def test_shared_store_size(tmp_path):
+    """The shared store should only keep the most recently stored pages."""
+    store = SQLiteStore(tmp_path / "page-cache.sqlite", max_pages=2)
+    for i in range(5):
+        store.set(f"page-{i}", f"<p>{i}</p>")
+    assert [store.get(f"page-{i}") for i in range(5)] == [
+        None,
+        None,
+        None,
+        "<p>3</p>",
+        "<p>4</p>",
+    ]
+
+
+def test_generation_read_once(app: Flask):
+    """A cached page should only read the generation from the store once."""
+    client = app.test_client()
+    client.get("/")
+    reads = []
+    get_generation = app.page_cache.store.get_generation
+    app.page_cache.store.get_generation = lambda: reads.append(1) or get_generation()
+    client.get("/")
+    assert len(reads) == 1
@@ -119,6 +119,61 @@ def test_get_all_paginated(client: FlaskClient):
     assert res3.json[4]["slug"] == "slug-1"
 
 
+def test_get_all_with_cursor(client: FlaskClient):
+    """Following the cursors of the `X-Next-Cursor` header should return every post once."""
+    for i in range(1, 26):
+        util.create_post(client, DEFAULT_USER, slug=f"slug-{i}")
+
+    slugs = []
+    cursor = None
+    while True:
+        res = util.get_posts(client, DEFAULT_USER, limit=10, cursor=cursor)
+        assert res.status == "200 OK"
+        slugs += [post["slug"] for post in res.json]
+        cursor = res.headers.get("X-Next-Cursor")
+        if not cursor:
+            assert "Link" not in res.headers
+            break
+        assert "cursor=" in res.headers["Link"]
+    assert slugs == [f"slug-{i}" for i in range(25, 0, -1)]
+
+
+def test_invalid_cursor(client: FlaskClient):
+    assert (
+        util.get_posts(client, DEFAULT_USER, cursor="invalid").status
+        == "400 BAD REQUEST"
+    )
+    assert (
+        util.get_posts(client, DEFAULT_USER, offset=2, cursor="invalid").status
+        == "400 BAD REQUEST"
+    )
+
+
+def test_get_by_slug(client: FlaskClient):
+    """Posts can be looked up by one or several slugs."""
+    for i in range(1, 6):
+        util.create_post(client, DEFAULT_USER, slug=f"slug-{i}")
+
+    res = util.get_posts(client, DEFAULT_USER, slug="slug-2")
+    assert res.status == "200 OK"
+    assert [post["slug"] for post in res.json] == ["slug-2"]
+    assert util.get_posts(client, DEFAULT_USER, slug="slug-6").json == []
+
+    res = util.get_posts(client, DEFAULT_USER, slugs="slug-1,slug-4,slug-6")
+    assert sorted(post["slug"] for post in res.json) == ["slug-1", "slug-4"]
+
+
+def test_get_by_invalid_slug(client: FlaskClient):
+    for params in (
+        {"slug": "not a slug"},
+        {"slugs": "slug-1,not a slug"},
+        {"slugs": ",".join(f"slug-{i}" for i in range(101))},
+        {"slug": "slug-1", "slugs": "slug-1"},
+    ):
+        res = util.get_posts(client, DEFAULT_USER, **params)
+        assert res.status == "400 BAD REQUEST"
+
+
 def test_improper_pagination(client: FlaskClient):
     """The request should fail if the pagination goes out of range"""
     for i in range(10):
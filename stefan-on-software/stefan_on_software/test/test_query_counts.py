@@ -0,0 +1,131 @@
+"""Tests that listing posts takes a constant number of database queries."""
+import contextlib
+import typing
+import uuid
+from datetime import datetime
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+from stefan_on_software import db
+from stefan_on_software.models.file import File, FileType
+from stefan_on_software.models.post import Post
+from stefan_on_software.models.user import User
+from stefan_on_software.site_config import ConfigKeys
+from stefan_on_software.test.conftest import DEFAULT_USER, make_auth_headers
+
+
+def add_posts(app: Flask, num_posts: int):
+    """Add published posts, each with their own featured, banner and thumbnail image."""
+    with app.app_context():
+        user = User.query.first()
+        for _ in range(num_posts):
+            images = [
+                File(
+                    id=str(uuid.uuid4()),
+                    upload_name="image.jpg",
+                    upload_date=datetime.now(),
+                    uploaded_by=user,
+                    filetype=FileType.Image,
+                    filename=f"{uuid.uuid4()}.jpg",
+                    size=0,
+                    hash=str(uuid.uuid4()),
+                )
+                for _ in range(3)
+            ]
+            post_id = str(uuid.uuid4())
+            db.session.add(
+                Post(
+                    author=user,
+                    last_modified=datetime.now(),
+                    slug=post_id,
+                    title=post_id,
+                    byline="",
+                    publish_date=datetime.now(),
+                    is_published=True,
+                    featured_image=images[0],
+                    banner_image=images[1],
+                    thumbnail_image=images[2],
+                )
+            )
+        db.session.commit()
+
+
+@contextlib.contextmanager
+def count_queries(app: Flask) -> typing.Iterator[typing.List[str]]:
+    """Record the statements executed on the app's database engine."""
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+
+
+@pytest.mark.parametrize("strategy", ["selectin", "joined"])
+def test_posts_page_queries(app: Flask, strategy: str):
+    """The number of queries on the posts page should not depend on the number of posts."""
+    app.config[ConfigKeys.POST_LOADING_STRATEGY] = strategy
+    # Posts are added directly to the database, which doesn't invalidate the page cache
+    app.config[ConfigKeys.PAGE_CACHE_ENABLED] = False
+    client = app.test_client()
+    add_posts(app, 2)
+    with count_queries(app) as few_posts:
+        assert client.get("/posts").status == "200 OK"
+    add_posts(app, 3)
+    with count_queries(app) as more_posts:
+        assert client.get("/posts").status == "200 OK"
+    assert len(few_posts) == len(more_posts)
+
+
+@pytest.mark.parametrize("strategy", ["selectin", "joined"])
+def test_get_posts_queries(app: Flask, strategy: str):
+    """The number of queries to get posts via the API should not depend on the number of posts."""
+    app.config[ConfigKeys.POST_LOADING_STRATEGY] = strategy
+    client = app.test_client()
+    add_posts(app, 2)
+    with count_queries(app) as few_posts:
+        res = client.get("/api/v1/posts", headers=make_auth_headers(DEFAULT_USER))
+        assert len(res.json) == 2
+    add_posts(app, 3)
+    with count_queries(app) as more_posts:
+        res = client.get("/api/v1/posts", headers=make_auth_headers(DEFAULT_USER))
+        assert len(res.json) == 5
+    assert res.json[0]["thumbnail_image"]["filename"].endswith(".jpg")
+    assert len(few_posts) == len(more_posts)
+
+
+def test_posts_page_numbers(app: Flask):
+    """Numbered pages of posts should be selected by key rather than by skipping posts."""
+    app.config[ConfigKeys.PAGINATE_POSTS_PER_PAGE] = 2
+    client = app.test_client()
+    add_posts(app, 5)
+    with app.app_context():
+        slugs = [
+            post.slug
+            for post in Post.query.order_by(Post.publish_date.desc(), Post.id.desc())
+        ]
+    with count_queries(app) as statements:
+        res = client.get("/posts/2")
+    assert [slug for slug in slugs if slug in res.text] == slugs[2:4]
+    assert "Showing posts 3 to 4 of 5 posts" in res.text
+    # The page starts after the key of the last post on the previous page
+    assert any("post.id < ?" in statement for statement in statements)
+    # Only the key of that post is read, rather than the keys of all posts
+    key_lookups = [
+        statement
+        for statement in statements
+        if statement.startswith(
+            "SELECT post.publish_date AS post_publish_date, post.id"
+        )
+    ]
+    assert len(key_lookups) == 1 and "LIMIT" in key_lookups[0]
+    res = client.get("/posts/3")
+    assert [slug for slug in slugs if slug in res.text] == slugs[4:]
+    assert client.get("/posts/4").status == "200 OK"
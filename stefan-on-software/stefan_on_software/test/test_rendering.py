@@ -0,0 +1,182 @@
+"""Tests for the rendering of post content."""
+import io
+import os
+
+import stefan_on_software.test.test_util as util
+from flask import Flask
+from PIL import Image
+from stefan_on_software.models.post import Post
+from stefan_on_software.site_config import ConfigKeys
+from stefan_on_software.test.conftest import DEFAULT_USER, TEST_ROOT
+
+EXAMPLE_MARKDOWN = b"# Example\n\nThis is an example post."
+
+
+def test_prerender_on_set_content(app: Flask):
+    """Setting the content of a post should write the pre-rendered HTML."""
+    client = app.test_client()
+    post_id = util.create_post(client, DEFAULT_USER).json["id"]
+    res_set = util.set_content(client, DEFAULT_USER, post_id, EXAMPLE_MARKDOWN)
+    assert res_set.status == "204 NO CONTENT"
+
+    with app.app_context(), app.test_request_context():
+        post = Post.query.filter_by(id=post_id).first()
+        assert post.get_rendered_path().exists()
+        with open(post.get_rendered_path(), encoding="utf-8") as f:
+            prerendered = f.read()
+        assert "<h1>Example</h1>" in prerendered
+        assert post.render_html() == prerendered
+
+
+def test_render_stale(app: Flask):
+    """The pre-rendered HTML should be ignored once the Markdown is newer."""
+    client = app.test_client()
+    post_id = util.create_post(client, DEFAULT_USER).json["id"]
+    util.set_content(client, DEFAULT_USER, post_id, EXAMPLE_MARKDOWN)
+
+    with app.app_context(), app.test_request_context():
+        post = Post.query.filter_by(id=post_id).first()
+        with open(post.get_markdown_path(), "w", encoding="utf-8") as f:
+            f.write("# Changed")
+        # Make sure the Markdown is strictly newer than the rendered HTML
+        rendered_mtime = post.get_rendered_path().stat().st_mtime_ns
+        os.utime(
+            post.get_markdown_path(),
+            ns=(rendered_mtime + 10**9, rendered_mtime + 10**9),
+        )
+        assert "<h1>Changed</h1>" in post.render_html()
+
+
+def test_render_options_changed(app: Flask):
+    """The pre-rendered HTML should be ignored once the render options change."""
+    client = app.test_client()
+    post_id = util.create_post(client, DEFAULT_USER).json["id"]
+    code = b'<x-code language="python">x = 1</x-code>'
+    util.set_content(client, DEFAULT_USER, post_id, code)
+
+    app.config[ConfigKeys.CODE_CSS_CLASSES] = True
+    with app.app_context(), app.test_request_context():
+        html = Post.query.filter_by(id=post_id).first().render_html()
+    assert '<span class="n">x</span>' in html
+
+
+def test_delete_file_clears_referencing_posts(app: Flask):
+    """Deleting a file should only clear the pre-rendered posts that reference it."""
+    client = app.test_client()
+    with open(TEST_ROOT / "example_file.jpg", "rb") as f:
+        example_file = util.ExampleFile(f.read(), "example_file.jpg")
+    res = util.upload_file(client, DEFAULT_USER, example_file)
+    file_id, filename = res.json["id"], res.json["filename"]
+    referencing_id = util.create_post(client, DEFAULT_USER).json["id"]
+    markdown = f"<x-image><path>{filename}</path></x-image>"
+    util.set_content(client, DEFAULT_USER, referencing_id, markdown.encode())
+    other_id = util.create_post(client, DEFAULT_USER).json["id"]
+    util.set_content(client, DEFAULT_USER, other_id, EXAMPLE_MARKDOWN)
+
+    assert util.delete_file(client, DEFAULT_USER, file_id).status == "204 NO CONTENT"
+    with app.app_context(), app.test_request_context():
+        assert (
+            not Post.query.filter_by(id=referencing_id)
+            .first()
+            .get_rendered_path()
+            .exists()
+        )
+        assert Post.query.filter_by(id=other_id).first().get_rendered_path().exists()
+
+
+def test_render_missing(app: Flask):
+    """Posts without pre-rendered HTML should be rendered live and then stored."""
+    client = app.test_client()
+    post_id = util.create_post(client, DEFAULT_USER).json["id"]
+    util.set_content(client, DEFAULT_USER, post_id, EXAMPLE_MARKDOWN)
+
+    with app.app_context(), app.test_request_context():
+        post = Post.query.filter_by(id=post_id).first()
+        post.clear_prerendered()
+        assert not post.get_rendered_path().exists()
+        assert "<h1>Example</h1>" in post.render_html()
+        assert post.get_rendered_path().exists()
+
+
+def test_render_code_css_classes(app: Flask):
+    """With CODE_CSS_CLASSES, code should use classes from the shared stylesheet."""
+    app.config[ConfigKeys.CODE_CSS_CLASSES] = True
+    client = app.test_client()
+    post_id = util.create_post(client, DEFAULT_USER).json["id"]
+    code = b'<x-code language="python">x = 1</x-code>'
+    util.set_content(client, DEFAULT_USER, post_id, code)
+
+    with app.app_context(), app.test_request_context():
+        post = Post.query.filter_by(id=post_id).first()
+        html = post.render_html()
+    assert '<span class="n">x</span>' in html
+    assert "style=" not in html
+
+    res = client.get("/code.css")
+    assert res.status == "200 OK"
+    assert res.mimetype == "text/css"
+    assert b".highlight .n" in res.data
+
+
+def test_set_content_renders_once(app: Flask):
+    """Validating and pre-rendering new content should take a single render."""
+    client = app.test_client()
+    post_id = util.create_post(client, DEFAULT_USER).json["id"]
+    app.render_cache.clear()
+    util.set_content(client, DEFAULT_USER, post_id, EXAMPLE_MARKDOWN)
+    assert app.render_cache.misses == 1
+    assert app.render_cache.hits == 0
+
+
+def test_set_content_invalid(app: Flask):
+    """Invalid content should be rejected without touching the existing content."""
+    client = app.test_client()
+    post_id = util.create_post(client, DEFAULT_USER).json["id"]
+    util.set_content(client, DEFAULT_USER, post_id, EXAMPLE_MARKDOWN)
+    res = util.set_content(client, DEFAULT_USER, post_id, b"<x-code>unclosed")
+    assert res.status == "400 BAD REQUEST"
+
+    with app.app_context(), app.test_request_context():
+        post = Post.query.filter_by(id=post_id).first()
+        assert "<h1>Example</h1>" in post.render_html()
+
+
+def test_render_file_references(app: Flask):
+    """Image paths should be resolved to URLs, and missing files should prevent storing."""
+    client = app.test_client()
+    with open(TEST_ROOT / "example_file.jpg", "rb") as f:
+        example_file = util.ExampleFile(f.read(), "example_file.jpg")
+    filename = util.upload_file(client, DEFAULT_USER, example_file).json["filename"]
+    post_id = util.create_post(client, DEFAULT_USER).json["id"]
+    markdown = (
+        f"<x-image><path>{filename}</path></x-image>\n"
+        f"<x-image><path>{filename}</path></x-image>\n"
+        "<x-image><path>missing.jpg</path></x-image>"
+    )
+    util.set_content(client, DEFAULT_USER, post_id, markdown.encode("utf-8"))
+
+    with app.app_context(), app.test_request_context():
+        post = Post.query.filter_by(id=post_id).first()
+        html = post.render_html()
+        assert html.count(f'src="/static/{filename}"') == 2
+        assert 'src="missing.jpg"' in html
+        assert not post.get_rendered_path().exists()
+
+
+def test_render_responsive_images(app: Flask):
+    """Images with copies should be rendered as a <picture> with a `srcset`."""
+    client = app.test_client()
+    buffer = io.BytesIO()
+    Image.new("RGB", (1000, 500), (255, 0, 0)).save(buffer, format="JPEG")
+    image = util.ExampleFile(buffer.getvalue(), "image.jpg")
+    filename = util.upload_file(client, DEFAULT_USER, image).json["filename"]
+    post_id = util.create_post(client, DEFAULT_USER).json["id"]
+    markdown = f"<x-image><path>{filename}</path><alt>Red</alt></x-image>"
+    util.set_content(client, DEFAULT_USER, post_id, markdown.encode())
+
+    with app.app_context(), app.test_request_context():
+        html = Post.query.filter_by(id=post_id).first().render_html()
+    stem = filename.split(".")[0]
+    assert "<picture>" in html
+    assert f"{stem}-400w.webp 400w" in html
+    assert f"{stem}-400w.jpg 400w" in html
@@ -0,0 +1,197 @@
+"""Tests for logging visits in the background."""
+import threading
+import time
+import typing
+import urllib.parse
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from flask import Flask
+from stefan_on_software.site_config import ConfigKeys
+from stefan_on_software.site_logger import TrafficLogger, Visit
+from stefan_on_software.test.conftest import DEFAULT_USER, make_auth_headers
+
+
+class SiteAnalyticsStandIn(ThreadingHTTPServer):
+    """
+    A local HTTP server that stands in for the SiteAnalytics API.
+
+    Records the query parameters of every request in `requests`. The first
+    `num_failures` requests are answered with a 503. Requests are only
+    answered while `available` is set.
+    """
+
+    def __init__(self, num_failures: int = 0):
+        self.requests: typing.List[typing.Dict[str, str]] = []
+        self.num_failures = num_failures
+        self.available = threading.Event()
+        self.available.set()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(handler):
+                self.available.wait()
+                query = urllib.parse.urlparse(handler.path).query
+                self.requests.append(dict(urllib.parse.parse_qsl(query)))
+                failed = len(self.requests) <= self.num_failures
+                handler.send_response(503 if failed else 200)
+                handler.send_header("Content-Length", "0")
+                handler.end_headers()
+
+            def log_message(handler, *args):
+                pass
+
+        super().__init__(("127.0.0.1", 0), Handler)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/api/v1/traffic"
+
+
+@pytest.fixture()
+def site_analytics() -> typing.Iterator[SiteAnalyticsStandIn]:
+    server = SiteAnalyticsStandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.available.set()
+    server.shutdown()
+    server.server_close()
+
+
+def make_visit(url: str = "/about") -> Visit:
+    return Visit(datetime.now(), url, "127.0.0.1", "Mozilla/5.0")
+
+
+def wait_for_metrics(logger: TrafficLogger, **expected: int):
+    """Wait until the logger's metrics have the expected values."""
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        metrics = logger.get_metrics()
+        if all(metrics[name] == value for name, value in expected.items()):
+            return
+        time.sleep(0.01)
+    raise AssertionError(f"Expected metrics {expected}, got {metrics}")
+
+
+def test_log_visit(app: Flask, site_analytics: SiteAnalyticsStandIn):
+    """Visiting a page should log the visit to file and send it to SiteAnalytics."""
+    app.traffic_logger.close()
+    app.traffic_logger = TrafficLogger(
+        app.config[ConfigKeys.TRAFFIC_LOG_PATH], site_analytics.url, "secret"
+    )
+    app.traffic_logger.start()
+
+    client = app.test_client()
+    client.get("/about", headers={"User-Agent": "Mozilla/5.0"})
+    client.get("/portfolio", headers={"User-Agent": "Mozilla/5.0"})
+    app.traffic_logger.flush()
+
+    with open(app.config[ConfigKeys.TRAFFIC_LOG_PATH]) as f:
+        lines = f.read().splitlines()
+    assert [line.split(",")[1] for line in lines] == ["/about", "/portfolio"]
+    assert site_analytics.requests == [
+        {
+            "url": "/about",
+            "ip_addr": "127.0.0.1",
+            "user_agent": "Mozilla/5.0",
+            "secret": "secret",
+        },
+        {
+            "url": "/portfolio",
+            "ip_addr": "127.0.0.1",
+            "user_agent": "Mozilla/5.0",
+            "secret": "secret",
+        },
+    ]
+
+    res = client.get("/metrics/traffic", headers=make_auth_headers(DEFAULT_USER))
+    assert res.json == {
+        "queued": 0,
+        "sending": 0,
+        "written": 2,
+        "sent": 2,
+        "failed": 0,
+        "dropped": 0,
+    }
+
+
+def test_retry(tmp_path, site_analytics: SiteAnalyticsStandIn):
+    """Requests that fail with a server error should be retried."""
+    site_analytics.num_failures = 1
+    logger = TrafficLogger(str(tmp_path / "traffic.txt"), site_analytics.url, "secret")
+    logger.start()
+    logger.log(make_visit())
+    logger.flush()
+    logger.close()
+    assert len(site_analytics.requests) == 2
+    assert logger.get_metrics()["sent"] == 1
+
+
+def test_unreachable(tmp_path):
+    """If SiteAnalytics can't be reached, visits should still be logged to file."""
+    logger = TrafficLogger(
+        str(tmp_path / "traffic.txt"),
+        "http://127.0.0.1:1/api/v1/traffic",
+        "secret",
+        max_retries=0,
+    )
+    logger.start()
+    logger.log(make_visit())
+    logger.log(make_visit())
+    logger.flush()
+    logger.close()
+    metrics = logger.get_metrics()
+    assert metrics["written"] == 2
+    assert metrics["failed"] == 2
+
+
+def test_drop_when_full(tmp_path):
+    """Visits should be dropped, rather than block, if the queue is full."""
+    logger = TrafficLogger(str(tmp_path / "traffic.txt"), max_queue_size=2)
+    assert logger.log(make_visit("/1"))
+    assert logger.log(make_visit("/2"))
+    assert not logger.log(make_visit("/3"))
+    assert logger.get_metrics()["dropped"] == 1
+
+    logger.start()
+    logger.flush()
+    logger.close()
+    with open(tmp_path / "traffic.txt") as f:
+        assert [line.split(",")[1] for line in f.read().splitlines()] == ["/1", "/2"]
+
+
+def test_slow_analytics(tmp_path, site_analytics: SiteAnalyticsStandIn):
+    """Visits should be written to file while SiteAnalytics is slow to respond."""
+    site_analytics.available.clear()
+    logger = TrafficLogger(str(tmp_path / "traffic.txt"), site_analytics.url, "secret")
+    logger.start()
+    logger.log(make_visit("/1"))
+    logger.log(make_visit("/2"))
+    wait_for_metrics(logger, written=2, sent=0)
+
+    site_analytics.available.set()
+    logger.flush()
+    logger.close()
+    assert logger.get_metrics()["sent"] == 2
+
+
+def test_close_when_full(tmp_path, site_analytics: SiteAnalyticsStandIn):
+    """Closing should discard the queued visits, rather than fail, if the queue stays full."""
+    site_analytics.available.clear()
+    logger = TrafficLogger(
+        str(tmp_path / "traffic.txt"),
+        site_analytics.url,
+        "secret",
+        max_queue_size=1,
+        batch_size=1,
+    )
+    logger.start()
+    # The first visit is being sent, the second fills the sender's queue
+    logger.log(make_visit("/1"))
+    wait_for_metrics(logger, written=1, sending=0)
+    logger.log(make_visit("/2"))
+    wait_for_metrics(logger, written=2, sending=1)
+
+    logger.close(timeout=0.1)
+    assert logger.get_metrics()["failed"] == 1
@@ -1,12 +1,20 @@
+import gzip
+import os
 import pathlib
+import threading
+import time
+import typing
 from typing import List
 
+import stefan_on_software.test.test_util as util
 from bs4 import BeautifulSoup
 from flask import Flask
 from flask.testing import FlaskClient
-from stefan_on_software import post_manager
+from stefan_on_software import post_manager, sitemapper
 from stefan_on_software.contracts.create_post import CreatePostContract
 from stefan_on_software.models.user import User
+from stefan_on_software.site_config import ConfigKeys
+from stefan_on_software.test.conftest import DEFAULT_USER
 
 # Path to the root of the `test` folder
 TEST_ROOT = pathlib.Path(__file__).parent
@@ -64,3 +72,138 @@ def test_update_sitemap(app: Flask):
     assert response.status == "200 OK"
     actual_urls = set(parse_sitemap(response.text))
     assert all(expected_url in actual_urls for expected_url in expected_urls)
+
+
+def test_unpublished_post(app: Flask):
+    """Unpublished posts should not be listed in the sitemap."""
+    with app.app_context(), app.test_request_context():
+        post_manager.create_post(
+            CreatePostContract(slug="draft", title="Draft", byline=""),
+            User.query.all()[0],
+        )
+    urls = parse_sitemap(app.test_client().get("/sitemap.xml").text)
+    assert "http://localhost/post/draft" not in urls
+
+
+def test_sitemap_index(app: Flask):
+    """The URLs should be split over several sitemaps if there are too many."""
+    client = app.test_client()
+    for i in range(3):
+        util.create_tag(client, DEFAULT_USER, f"Tag {i}", f"tag-{i}", "")
+    sitemap_path = pathlib.Path(app.config[ConfigKeys.SITEMAP_PATH])
+    with app.app_context(), app.test_request_context():
+        sitemapper.generate_and_write_sitemap(sitemap_path, max_urls=3)
+
+    soup = BeautifulSoup(client.get("/sitemap.xml").text, "xml")
+    sitemaps = [loc.contents[0] for loc in soup.find("sitemapindex").find_all("loc")]
+    assert sitemaps == [f"http://localhost/sitemap-{i}.xml" for i in range(1, 4)]
+    urls = []
+    for sitemap in sitemaps:
+        urls += parse_sitemap(client.get(sitemap).text)
+    assert len(urls) == 8
+    assert "http://localhost/tag/tag-2" in urls
+
+    # Parts are removed once they are no longer needed
+    with app.app_context(), app.test_request_context():
+        sitemapper.generate_and_write_sitemap(sitemap_path)
+    assert len(parse_sitemap(client.get("/sitemap.xml").text)) == 8
+    assert client.get("/sitemap-1.xml").status == "404 NOT FOUND"
+    assert not sitemapper.get_part_path(sitemap_path, 3).exists()
+
+
+def test_concurrent_writes(app: Flask):
+    """Sitemaps written at the same time should not interfere with each other."""
+    sitemap_path = pathlib.Path(app.config[ConfigKeys.SITEMAP_PATH])
+
+    def write_sitemap(max_urls: int):
+        with app.app_context(), app.test_request_context():
+            sitemapper.generate_and_write_sitemap(sitemap_path, max_urls=max_urls)
+
+    threads = [
+        threading.Thread(target=write_sitemap, args=(max_urls,))
+        for max_urls in (3, 50, 3, 50)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    text = app.test_client().get("/sitemap.xml").text
+    assert "<urlset" in text or "<sitemapindex" in text
+    assert not list(sitemap_path.parent.glob(".sitemap-*"))
+
+
+def test_sitemap_gzip(client: FlaskClient):
+    """The precompressed sitemap should be sent to clients that accept gzip."""
+    plain = client.get("/sitemap.xml")
+    compressed = client.get("/sitemap.xml", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(compressed.data) == plain.data
+
+
+class RecordingScheduler(sitemapper.SitemapScheduler):
+    """Counts pings without sending them to Google."""
+
+    def _send_ping(self):
+        pass
+
+
+def wait_for(condition: typing.Callable[[], bool], timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out"
+        time.sleep(0.01)
+
+
+def test_coalesce_updates(app: Flask):
+    """A burst of updates should regenerate the sitemap and ping Google once."""
+    app.config[ConfigKeys.TESTING] = False
+    scheduler = RecordingScheduler(app, delay=0.2, ping_interval=60)
+    with app.test_request_context():
+        for _ in range(5):
+            scheduler.schedule()
+    assert scheduler.num_updates == 0
+    wait_for(lambda: scheduler.num_pings == 1)
+    assert scheduler.num_updates == 1
+    assert os.path.exists(app.config[ConfigKeys.SITEMAP_PATH])
+
+    # The next update is regenerated, but the ping is postponed
+    with app.test_request_context():
+        scheduler.schedule()
+    wait_for(lambda: scheduler.num_updates == 2)
+    time.sleep(0.1)
+    assert scheduler.num_pings == 1
+    scheduler.close()
+
+
+def test_ping_interval_shared(app: Flask):
+    """Schedulers in different processes should ping Google at most once per interval."""
+    app.config[ConfigKeys.TESTING] = False
+    record = sitemapper.PingRecord(app.config[ConfigKeys.SITEMAP_PING_PATH])
+    # One scheduler per process
+    scheduler_1 = RecordingScheduler(app, delay=0.05, ping_interval=1)
+    scheduler_2 = RecordingScheduler(app, delay=0.05, ping_interval=1)
+    with app.test_request_context():
+        scheduler_1.schedule()
+    wait_for(lambda: scheduler_1.num_pings == 1)
+    first_ping_at = record.get_last_ping()
+
+    with app.test_request_context():
+        scheduler_2.schedule()
+    wait_for(lambda: scheduler_2.num_updates == 1)
+    time.sleep(0.1)
+    assert scheduler_2.num_pings == 0
+
+    # The postponed ping is sent once the interval has passed
+    wait_for(lambda: scheduler_2.num_pings == 1)
+    assert record.get_last_ping() >= first_ping_at + 1
+    scheduler_1.close()
+    scheduler_2.close()
+
+
+def test_close_runs_pending_update(app: Flask):
+    scheduler = RecordingScheduler(app, delay=60)
+    with app.test_request_context():
+        scheduler.schedule()
+    scheduler.close()
+    assert scheduler.num_updates == 1
@@ -1,5 +1,7 @@
 import stefan_on_software.test.test_util as util
+from flask import Flask
 from flask.testing import FlaskClient
+from stefan_on_software.tag_manager import PostCountsCache
 from stefan_on_software.test.conftest import (
     DEFAULT_USER,
     INVALID_USER,
@@ -42,6 +44,51 @@ def test_get_all(client: FlaskClient):
     assert util.TAG2_JSON in res2.json
 
 
+def test_get_all_with_counts(client: FlaskClient):
+    """Counts should only include published posts and follow changes to posts' tags."""
+    util.create_tag(client, DEFAULT_USER, **util.TAG_JSON)
+    util.create_tag(client, DEFAULT_USER, **util.TAG2_JSON)
+    post_ids = [util.create_post(client, DEFAULT_USER).json["id"] for _ in range(3)]
+    for post_id in post_ids:
+        util.add_tag_to_post(client, DEFAULT_USER, post_id, util.TAG_SLUG)
+    util.publish_post(client, DEFAULT_USER, post_ids[0], False)
+    util.publish_post(client, DEFAULT_USER, post_ids[1], False)
+
+    def get_counts():
+        res = util.get_all_tags(client, DEFAULT_USER, with_counts=True)
+        assert res.status == "200 OK"
+        return {tag["slug"]: tag["post_count"] for tag in res.json}
+
+    assert get_counts() == {util.TAG_SLUG: 2, util.TAG2_SLUG: 0}
+    util.rmv_tag_from_post(client, DEFAULT_USER, post_ids[0], util.TAG_SLUG)
+    assert get_counts() == {util.TAG_SLUG: 1, util.TAG2_SLUG: 0}
+    util.publish_post(client, DEFAULT_USER, post_ids[2], False)
+    assert get_counts() == {util.TAG_SLUG: 2, util.TAG2_SLUG: 0}
+    util.unpublish_post(client, DEFAULT_USER, post_ids[1], False)
+    assert get_counts() == {util.TAG_SLUG: 1, util.TAG2_SLUG: 0}
+    # Counts are only included if requested
+    assert "post_count" not in util.get_all_tags(client, DEFAULT_USER).json[0]
+
+
+def test_counts_changed_by_other_process(app: Flask):
+    """Counts should follow changes made by another worker process."""
+    client = app.test_client()
+    util.create_tag(client, DEFAULT_USER, **util.TAG_JSON)
+    post_id = util.create_post(client, DEFAULT_USER).json["id"]
+    util.add_tag_to_post(client, DEFAULT_USER, post_id, util.TAG_SLUG)
+    res = util.get_all_tags(client, DEFAULT_USER, with_counts=True)
+    assert res.json[0]["post_count"] == 0
+
+    # Publish the post with the counts cache of another process, so that
+    # this process's cache only learns of it via the page cache generation
+    counts_cache = app.post_counts_cache
+    app.post_counts_cache = PostCountsCache()
+    util.publish_post(client, DEFAULT_USER, post_id, False)
+    app.post_counts_cache = counts_cache
+    res = util.get_all_tags(client, DEFAULT_USER, with_counts=True)
+    assert res.json[0]["post_count"] == 1
+
+
 def test_update(client: FlaskClient):
     """Create a tag, then update it."""
     util.create_tag(client, DEFAULT_USER, **util.TAG_JSON)
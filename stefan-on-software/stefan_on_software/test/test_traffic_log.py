@@ -0,0 +1,151 @@
+"""Tests for the rotated traffic log and the statistics computed over it."""
+import collections
+import datetime
+import random
+import threading
+
+from flask import Flask
+from flask.testing import FlaskCliRunner
+from stefan_on_software.site_config import ConfigKeys
+from stefan_on_software.traffic_log import (
+    HyperLogLog,
+    TopCounter,
+    TrafficLog,
+    Visit,
+    compute_stats,
+    get_segments,
+    read_visits,
+)
+
+
+def make_visit(
+    url: str = "/about",
+    ip_address: str = "127.0.0.1",
+    timestamp: datetime.datetime = None,
+) -> Visit:
+    return Visit(
+        timestamp if timestamp else datetime.datetime.now(),
+        url,
+        ip_address,
+        'Mozilla/5.0 (X11; Linux x86_64) "quoted", with commas',
+    )
+
+
+def test_escaping(tmp_path):
+    """Fields containing commas and quotes should be read back unchanged."""
+    visit = make_visit()
+    TrafficLog(tmp_path / "traffic.txt").write([visit])
+    assert list(read_visits(tmp_path / "traffic.txt")) == [visit]
+
+
+def test_legacy_lines(tmp_path):
+    """Lines written by previous versions should still be read."""
+    with open(tmp_path / "traffic.txt", "w") as f:
+        f.write("01-15-2023-09:30:00:123,/posts,127.0.0.1,Mozilla/5.0 (a, b)\n")
+        f.write("not a visit\n")
+    assert list(read_visits(tmp_path / "traffic.txt")) == [
+        Visit(
+            datetime.datetime(2023, 1, 15, 9, 30, 0, 123000),
+            "/posts",
+            "127.0.0.1",
+            "Mozilla/5.0 (a, b)",
+        )
+    ]
+
+
+def test_rotate_size(tmp_path):
+    """The log should be rotated and compressed once it reaches the maximum size."""
+    log = TrafficLog(tmp_path / "traffic.txt", max_bytes=200)
+    visits = [make_visit(f"/post/{i}") for i in range(10)]
+    for visit in visits:
+        log.write([visit])
+    segments = get_segments(tmp_path / "traffic.txt")
+    assert len(segments) > 2
+    assert all(segment.suffix == ".gz" for segment in segments[:-1])
+    assert segments[-1] == tmp_path / "traffic.txt"
+    assert list(read_visits(tmp_path / "traffic.txt")) == visits
+
+
+def test_rotate_age(tmp_path):
+    """The log should be rotated once its first visit is older than the maximum age."""
+    old_visit = make_visit(timestamp=datetime.datetime.now() - datetime.timedelta(2))
+    TrafficLog(tmp_path / "traffic.txt").write([old_visit])
+    # A new instance should find the age of the existing segment
+    new_visit = make_visit()
+    TrafficLog(tmp_path / "traffic.txt").write([new_visit])
+    segments = get_segments(tmp_path / "traffic.txt")
+    assert len(segments) == 2
+    assert list(read_visits(tmp_path / "traffic.txt")) == [old_visit, new_visit]
+
+
+def test_rotate_concurrently(tmp_path):
+    """Logs written by several processes at once should be rotated without losing visits."""
+    num_writers, num_visits = 4, 50
+
+    def write_visits(writer: int):
+        # Each process has its own `TrafficLog`
+        log = TrafficLog(tmp_path / "traffic.txt", max_bytes=500)
+        for i in range(num_visits):
+            log.write([make_visit(f"/{writer}/{i}")])
+
+    threads = [
+        threading.Thread(target=write_visits, args=(writer,))
+        for writer in range(num_writers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    urls = sorted(visit.url for visit in read_visits(tmp_path / "traffic.txt"))
+    assert urls == sorted(
+        f"/{writer}/{i}" for writer in range(num_writers) for i in range(num_visits)
+    )
+    assert len(get_segments(tmp_path / "traffic.txt")) > num_writers
+
+
+def test_top_counter():
+    """The most frequent values should be found, with bounded overestimates."""
+    rng = random.Random(0)
+    values = [f"/post/{min(int(rng.expovariate(0.05)), 500)}" for _ in range(20000)]
+    counter = TopCounter(capacity=50)
+    for value in values:
+        counter.add(value)
+    exact = collections.Counter(values)
+    top = counter.most_common(3)
+    assert [value for value, _ in top] == [value for value, _ in exact.most_common(3)]
+    for value, count in top:
+        assert exact[value] <= count <= exact[value] + len(values) / 50
+
+
+def test_hyperloglog():
+    counter = HyperLogLog()
+    for i in range(20000):
+        counter.add(f"10.0.{i // 256}.{i % 256}")
+        counter.add(f"10.0.{i // 256}.{i % 256}")
+    assert abs(counter.count() - 20000) < 20000 * 0.03
+
+
+def test_compute_stats():
+    day_1 = datetime.datetime(2023, 1, 15, 9, 30)
+    day_2 = datetime.datetime(2023, 1, 16, 9, 30)
+    visits = (
+        [make_visit("/", f"10.0.0.{i}", day_1) for i in range(5)]
+        + [make_visit("/posts", "10.0.0.1", day_2) for _ in range(3)]
+        + [make_visit("/about", "10.0.0.1", day_2)]
+    )
+    stats = compute_stats(visits, 2)
+    assert stats.total_hits == 9
+    assert stats.unique_ips == 5
+    assert stats.top_urls == [("/", 5), ("/posts", 3)]
+    assert stats.hits_per_day == {day_1.date(): 5, day_2.date(): 4}
+
+
+def test_traffic_stats_command(app: Flask, runner: FlaskCliRunner):
+    log = TrafficLog(app.config[ConfigKeys.TRAFFIC_LOG_PATH], max_bytes=100)
+    for i in range(3):
+        log.write([make_visit("/posts", f"10.0.0.{i}")])
+    res = runner.invoke(args=["traffic-stats", "--top", "1"])
+    assert res.exit_code == 0
+    assert "Total hits: 3" in res.output
+    assert "Unique IPs: ~3" in res.output
+    assert "/posts" in res.output
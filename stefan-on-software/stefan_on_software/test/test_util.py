@@ -55,6 +55,9 @@ def get_posts(
     featured: Optional[bool] = None,
     limit: Optional[int] = None,
     offset: Optional[int] = None,
+    cursor: Optional[str] = None,
+    slug: Optional[str] = None,
+    slugs: Optional[str] = None,
 ) -> TestResponse:
     args = {}
     if published is not None:
@@ -65,6 +68,12 @@ def get_posts(
         args["limit"] = limit
     if offset:
         args["offset"] = offset
+    if cursor:
+        args["cursor"] = cursor
+    if slug:
+        args["slug"] = slug
+    if slugs:
+        args["slugs"] = slugs
     return client.get(
         "/api/v1/posts",
         query_string=args,
@@ -329,8 +338,17 @@ def delete_tag(
     )
 
 
-def get_all_tags(client: FlaskClient, user: Optional[User]) -> TestResponse:
-    return client.get("/api/v1/tags", headers=make_auth_headers(user) if user else {})
+def get_all_tags(
+    client: FlaskClient, user: Optional[User], with_counts: Optional[bool] = None
+) -> TestResponse:
+    args = {}
+    if with_counts is not None:
+        args["with_counts"] = with_counts
+    return client.get(
+        "/api/v1/tags",
+        query_string=args,
+        headers=make_auth_headers(user) if user else {},
+    )
 
 
 @dataclass
@@ -344,8 +362,14 @@ class ExampleFile:
     filename: str
 
 
-def get_all_files(client: FlaskClient, user: Optional[User]) -> TestResponse:
-    return client.get("/api/v1/files", headers=make_auth_headers(user) if user else {})
+def get_all_files(
+    client: FlaskClient, user: Optional[User], params: Optional[Dict] = None
+) -> TestResponse:
+    return client.get(
+        "/api/v1/files",
+        query_string=params,
+        headers=make_auth_headers(user) if user else {},
+    )
 
 
 def upload_file(
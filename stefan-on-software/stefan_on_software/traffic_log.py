@@ -0,0 +1,296 @@
+"""
+The traffic log: a CSV file with one visit per line.
+
+The log is split into segments. Visits are appended to the file at
+`TRAFFIC_LOG_PATH`, which is rotated once it reaches a maximum size or age:
+it is renamed to include the time of rotation and compressed with gzip,
+e.g. "traffic.txt" becomes "traffic.20230115-093000-000000.txt.gz".
+Several processes may write the same log: appending and rotating is done
+under a lock on ".traffic.txt.lock", so that a segment is only rotated once.
+
+Lines written by previous versions, which weren't escaped and used a
+different timestamp format, can still be read.
+"""
+import contextlib
+import csv
+import dataclasses as dc
+import datetime
+import gzip
+import hashlib
+import io
+import math
+import os
+import shutil
+import typing
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where the log can only be written by one process
+    fcntl = None
+
+# Format of the timestamps in the log
+TIMESTAMP_FORMAT = r"%Y-%m-%dT%H:%M:%S.%f"
+# Format of the timestamps written by previous versions
+LEGACY_TIMESTAMP_FORMAT = r"%m-%d-%Y-%H:%M:%S:%f"
+# Format of the rotation time in the names of closed segments
+SEGMENT_TIME_FORMAT = r"%Y%m%d-%H%M%S-%f"
+
+
+@dc.dataclass
+class Visit:
+    timestamp: datetime.datetime
+    url: str
+    ip_address: str
+    user_agent: str
+
+
+class TrafficLog:
+    """
+    Appends visits to the log at `path`, rotating it once it is at least
+    `max_bytes` large or its first visit is at least `max_age` old.
+
+    Several processes (or threads, each with their own `TrafficLog`) may
+    write the same log.
+    """
+
+    def __init__(
+        self,
+        path: typing.Union[str, Path],
+        max_bytes: int = 10_000_000,
+        max_age: datetime.timedelta = datetime.timedelta(days=1),
+    ):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock_path = self.path.with_name(f".{self.path.name}.lock")
+
+    def write(self, visits: typing.List[Visit]):
+        """Append the given visits to the log, rotating it first if necessary."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        for visit in visits:
+            writer.writerow(
+                (
+                    visit.timestamp.strftime(TIMESTAMP_FORMAT),
+                    visit.url,
+                    visit.ip_address,
+                    visit.user_agent,
+                )
+            )
+        with self._locked():
+            closed_path = self._close_segment() if self._should_rotate() else None
+            with open(self.path, "a", newline="", encoding="utf-8") as f:
+                f.write(buffer.getvalue())
+        if closed_path:
+            _compress(closed_path)
+
+    def rotate(self):
+        """Close the current segment and compress it. Does nothing if it is empty."""
+        with self._locked():
+            closed_path = self._close_segment()
+        if closed_path:
+            _compress(closed_path)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Hold the lock on the log, which is shared by all processes."""
+        with open(self._lock_path, "a") as lock_file:
+            if fcntl:
+                # Released when the file is closed
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _close_segment(self) -> typing.Optional[Path]:
+        """
+        Rename the current segment to include the time of rotation and return
+        its new path, or None if it is empty. Must hold the lock.
+        """
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return None
+        now = datetime.datetime.now().strftime(SEGMENT_TIME_FORMAT)
+        closed_path = self.path.with_name(f"{self.path.stem}.{now}{self.path.suffix}")
+        suffix = 1
+        while closed_path.exists() or Path(f"{closed_path}.gz").exists():
+            closed_path = self.path.with_name(
+                f"{self.path.stem}.{now}-{suffix}{self.path.suffix}"
+            )
+            suffix += 1
+        # New visits go to a new file while the closed segment is compressed
+        os.replace(self.path, closed_path)
+        return closed_path
+
+    def _should_rotate(self) -> bool:
+        """Return whether the current segment should be rotated. Must hold the lock."""
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            return False
+        if size == 0:
+            return False
+        if size >= self.max_bytes:
+            return True
+        # The segment may have been started (or rotated) by another process,
+        # so its age is read from its first visit
+        for visit in read_segment(self.path):
+            return datetime.datetime.now() - visit.timestamp >= self.max_age
+        return False
+
+
+def _compress(path: Path):
+    """Compress the closed segment at `path` to `{path}.gz`."""
+    with open(path, "rb") as f_in, gzip.open(f"{path}.gz", "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(path)
+
+
+def get_segments(path: typing.Union[str, Path]) -> typing.List[Path]:
+    """Return the paths of all segments of the log at `path`, oldest first."""
+    path = Path(path)
+    closed = sorted(path.parent.glob(f"{path.stem}.*{path.suffix}.gz"))
+    return closed + [path] if path.exists() else closed
+
+
+def read_segment(path: Path) -> typing.Iterator[Visit]:
+    """Stream the visits in a segment. Lines that can't be parsed are skipped."""
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt", newline="", encoding="utf-8", errors="replace") as f:
+        for row in csv.reader(f):
+            visit = _parse_row(row)
+            if visit:
+                yield visit
+
+
+def read_visits(path: typing.Union[str, Path]) -> typing.Iterator[Visit]:
+    """Stream the visits in all segments of the log at `path`, oldest first."""
+    for segment in get_segments(path):
+        yield from read_segment(segment)
+
+
+def _parse_row(row: typing.List[str]) -> typing.Optional[Visit]:
+    if len(row) < 4:
+        return None
+    for timestamp_format in (TIMESTAMP_FORMAT, LEGACY_TIMESTAMP_FORMAT):
+        try:
+            timestamp = datetime.datetime.strptime(row[0], timestamp_format)
+            break
+        except ValueError:
+            pass
+    else:
+        return None
+    # Unescaped user agents in legacy lines may have been split at commas
+    return Visit(timestamp, row[1], row[2], ",".join(row[3:]))
+
+
+class HyperLogLog:
+    """
+    Estimates the number of distinct values added to it, using a fixed
+    2^`precision` bytes of memory. The standard error is about
+    1.04 / sqrt(2^precision), i.e. 0.8% for the default precision.
+    """
+
+    def __init__(self, precision: int = 14):
+        self.precision = precision
+        self._num_registers = 1 << precision
+        self._registers = bytearray(self._num_registers)
+
+    def add(self, value: str):
+        hashed = int.from_bytes(
+            hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big"
+        )
+        index = hashed >> (64 - self.precision)
+        remaining = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+
+    def count(self) -> int:
+        m = self._num_registers
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0**-r for r in self._registers)
+        num_zeros = self._registers.count(0)
+        if estimate <= 2.5 * m and num_zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / num_zeros)
+        return round(estimate)
+
+
+class TopCounter:
+    """
+    Tracks the most frequent values using the Space-Saving algorithm, with
+    at most `capacity` counters. The counts of values that are frequent
+    enough to be among the top `capacity` values are overestimated by at
+    most the total count divided by `capacity`.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self._counts: typing.Dict[str, int] = {}
+        # Values grouped by their count (the "stream summary"), so that a
+        # least frequent value can be found without scanning all counters.
+        # The inner dicts are used as ordered sets.
+        self._buckets: typing.Dict[int, typing.Dict[str, None]] = {}
+        self._min_count = 0
+
+    def add(self, value: str):
+        count = self._counts.get(value)
+        if count is not None:
+            self._remove_from_bucket(value, count)
+        elif len(self._counts) < self.capacity:
+            count = 0
+        else:
+            # Replace a least frequent value, inheriting its count
+            count = self._min_count
+            least = next(iter(self._buckets[count]))
+            self._remove_from_bucket(least, count)
+            del self._counts[least]
+        self._counts[value] = count + 1
+        self._buckets.setdefault(count + 1, {})[value] = None
+        if count == 0:
+            self._min_count = 1
+        elif count == self._min_count and count not in self._buckets:
+            self._min_count = count + 1
+
+    def _remove_from_bucket(self, value: str, count: int):
+        bucket = self._buckets[count]
+        del bucket[value]
+        if not bucket:
+            del self._buckets[count]
+
+    def most_common(self, n: int) -> typing.List[typing.Tuple[str, int]]:
+        return sorted(self._counts.items(), key=lambda item: item[1], reverse=True)[:n]
+
+
+@dc.dataclass
+class TrafficStats:
+    total_hits: int
+    unique_ips: int
+    top_urls: typing.List[typing.Tuple[str, int]]
+    hits_per_day: typing.Dict[datetime.date, int]
+
+
+def compute_stats(
+    visits: typing.Iterable[Visit], num_top_urls: int = 10
+) -> TrafficStats:
+    """
+    Compute statistics over the given visits in a single pass. Unique IPs
+    and the hits of the top URLs are estimates; memory use doesn't depend on
+    the number of visits.
+    """
+    total_hits = 0
+    unique_ips = HyperLogLog()
+    top_urls = TopCounter(max(1000, num_top_urls * 10))
+    hits_per_day: typing.Dict[datetime.date, int] = {}
+    for visit in visits:
+        total_hits += 1
+        unique_ips.add(visit.ip_address)
+        top_urls.add(visit.url)
+        day = visit.timestamp.date()
+        hits_per_day[day] = hits_per_day.get(day, 0) + 1
+    return TrafficStats(
+        total_hits,
+        unique_ips.count(),
+        top_urls.most_common(num_top_urls),
+        dict(sorted(hits_per_day.items())),
+    )
@@ -15,3 +15,28 @@ def landing():
 def logout():
     logout_user()
     return flask.redirect(flask.url_for("blog.index"))
+
+
+@BLUEPRINT.route("/metrics/caches")
+@login_required
+def cache_metrics():
+    """Report the hit/miss counters of the page and render caches."""
+    render_cache = flask.current_app.render_cache
+    return flask.jsonify(
+        {
+            "page_cache": flask.current_app.page_cache.get_metrics(),
+            "render_cache": {
+                "hits": render_cache.hits,
+                "misses": render_cache.misses,
+                "evictions": render_cache.evictions,
+                "size": len(render_cache),
+            },
+        }
+    )
+
+
+@BLUEPRINT.route("/metrics/traffic")
+@login_required
+def traffic_metrics():
+    """Report the counters of the traffic logger, including dropped visits."""
+    return flask.jsonify(flask.current_app.traffic_logger.get_metrics())
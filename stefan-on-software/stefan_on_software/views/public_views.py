@@ -1,15 +1,24 @@
 import os.path
+from pathlib import Path
 
 import flask
 import werkzeug.exceptions
 from flask_login import current_user, login_user
 from sqlalchemy import desc
-from stefan_on_software import site_logger, sitemapper
+from stefan_on_software import (
+    http_cache,
+    page_cache,
+    pagination,
+    site_logger,
+    sitemapper,
+    tag_manager,
+)
 from stefan_on_software.auth import verify_login
 from stefan_on_software.models.post import Post
 from stefan_on_software.models.tag import Tag
 from stefan_on_software.site_config import ConfigKeys
 from stefan_on_software.views.page_metadata import PageMetadata
+from stefan_on_software_renderer import renderer
 
 # Blueprint under which all views will be assigned
 BLUEPRINT = flask.Blueprint("blog", __name__)
@@ -31,26 +40,27 @@ def make_default_metadata(title: str, description: str) -> PageMetadata:
 # TODO: consistent naming of view functions.
 @BLUEPRINT.route("/")
 @site_logger.logged_visit
+@http_cache.conditional(http_cache.get_published_modified)
+@page_cache.cached
 def index():
     """Home page. Displays featured and recent posts."""
     recent_posts = (
-        Post.query.filter(Post.is_published)
+        Post.query.options(*Post.eager_loading())
+        .filter(Post.is_published)
         .order_by(desc(Post.publish_date))
         .limit(5)
         .all()
     )
     featured_posts = (
-        Post.query.filter(Post.is_featured, Post.is_published)
+        Post.query.options(*Post.eager_loading())
+        .filter(Post.is_featured, Post.is_published)
         .order_by(desc(Post.publish_date))
         .all()
     )
-    # Count the number of posts that each tag appears in.
-    # This is algorithmically inefficient, but it's difficult to do better with
-    # SQLAlchemy. Also, Tags is a small collection, and we can cache the index page.
+    # Count the number of published posts that each tag appears in.
     all_tags = Tag.query.all()
-    tag_counts = {}
-    for tag in all_tags:
-        tag_counts[tag.slug] = tag.posts.filter(Post.is_published).count()
+    post_counts = tag_manager.get_post_counts()
+    tag_counts = {tag.slug: post_counts.get(tag.slug, 0) for tag in all_tags}
     # Sort tags by the number of posts they appear in.
     all_tags.sort(key=lambda t: tag_counts[t.slug], reverse=True)
 
@@ -70,17 +80,16 @@ def index():
 @BLUEPRINT.route("/posts", defaults={"page": 1})
 @BLUEPRINT.route("/posts/<int:page>", methods=["GET"])
 @site_logger.logged_visit
+@http_cache.conditional(http_cache.get_published_modified)
+@page_cache.cached
 def posts_page(page: int = 1):
     """The "posts" page, which displays all posts on the site (paginated)."""
-    # Using pagination example from https://stackoverflow.com/a/57348599
-    posts = (
-        Post.query.filter(Post.is_published)
-        .order_by(desc(Post.publish_date))
-        .paginate(
-            page=page,
-            per_page=flask.current_app.config[ConfigKeys.PAGINATE_POSTS_PER_PAGE],
-            error_out=False,
-        )
+    posts = pagination.get_numbered_page(
+        Post.query.filter(Post.is_published),
+        (Post.publish_date, Post.id),
+        page,
+        flask.current_app.config[ConfigKeys.PAGINATE_POSTS_PER_PAGE],
+        Post.eager_loading(),
     )
     return flask.render_template(
         "blog/posts.html",
@@ -93,10 +102,16 @@ def posts_page(page: int = 1):
 
 @BLUEPRINT.route("/post/<slug>")
 @site_logger.logged_visit
+@http_cache.conditional(http_cache.get_post_modified)
+@page_cache.cached
 def post_view(slug):
     """Shows the page for the post with the specified slug."""
     # Retrieve post
-    post = Post.query.filter(Post.slug == slug, Post.is_published).first()
+    post = (
+        Post.query.options(*Post.eager_loading())
+        .filter(Post.slug == slug, Post.is_published)
+        .first()
+    )
     # Throw 404 if there is no post with the given slug in the database.
     if not post:
         werkzeug.exceptions.abort(404)
@@ -119,6 +134,8 @@ def post_view(slug):
 
 @BLUEPRINT.route("/tag/<slug>")
 @site_logger.logged_visit
+@http_cache.conditional(http_cache.get_tag_modified)
+@page_cache.cached
 def tag_view(slug):
     """
     Display all posts that have the given tag.
@@ -131,7 +148,8 @@ def tag_view(slug):
     return flask.render_template(
         "blog/tag_view.html",
         tag=tag,
-        posts=tag.posts.filter(Post.is_published)
+        posts=tag.posts.options(*Post.eager_loading())
+        .filter(Post.is_published)
         .order_by(desc(Post.publish_date))
         .all(),
         page_meta=make_default_metadata(
@@ -153,10 +171,17 @@ def search_page():
     # Run the query, which will return a list of PostIds. Retrieve them from the database.
     # TODO: would be great to have a way to unit test this. Possibly merge into the '/posts' page?
     if query:
-        posts = [
-            Post.query.filter(Post.id == int(result.slug), Post.is_published).first()
-            for result in flask.current_app.search_engine.search(query)
+        post_ids = [
+            int(result.slug) for result in flask.current_app.search_engine.search(query)
         ]
+        # Retrieve all posts in one query, then restore the order of the results
+        found_posts = {
+            post.id: post
+            for post in Post.query.options(*Post.eager_loading()).filter(
+                Post.id.in_(post_ids), Post.is_published
+            )
+        }
+        posts = [found_posts[post_id] for post_id in post_ids if post_id in found_posts]
 
     return flask.render_template(
         "blog/search.html",
@@ -171,6 +196,7 @@ def search_page():
 
 @BLUEPRINT.route("/portfolio")
 @site_logger.logged_visit
+@page_cache.cached
 def portfolio_page():
     """Show the "Portfolio" page."""
     return flask.render_template(
@@ -183,6 +209,7 @@ def portfolio_page():
 
 @BLUEPRINT.route("/about")
 @site_logger.logged_visit
+@page_cache.cached
 def about_page():
     """Show the "About" page."""
     return flask.render_template(
@@ -224,8 +251,34 @@ def sitemap():
     # As advised by https://stackoverflow.com/a/14625619, the sitemap file
     # should be stored in 'static' but be served via its own route.
     if not os.path.exists(flask.current_app.config[ConfigKeys.SITEMAP_PATH]):
-        sitemapper.update_sitemap()
-    return flask.send_file(flask.current_app.config[ConfigKeys.SITEMAP_PATH])
+        sitemapper.generate_and_write_sitemap(
+            flask.current_app.config[ConfigKeys.SITEMAP_PATH]
+        )
+    return send_sitemap_file(Path(flask.current_app.config[ConfigKeys.SITEMAP_PATH]))
+
+
+@BLUEPRINT.route("/sitemap-<int:number>.xml", methods=["GET"])
+def sitemap_part(number: int):
+    # One of the sitemaps listed in the sitemap index, if the site has too
+    # many URLs for a single sitemap
+    path = sitemapper.get_part_path(
+        Path(flask.current_app.config[ConfigKeys.SITEMAP_PATH]), number
+    )
+    if not path.exists():
+        werkzeug.exceptions.abort(404)
+    return send_sitemap_file(path)
+
+
+def send_sitemap_file(path: Path) -> flask.Response:
+    """Send the sitemap file, using its gzipped copy if the client accepts it."""
+    gz_path = Path(f"{path}.gz")
+    if "gzip" in flask.request.accept_encodings and gz_path.exists():
+        response = flask.send_file(gz_path, mimetype="application/xml")
+        response.content_encoding = "gzip"
+    else:
+        response = flask.send_file(path)
+    response.vary.add("Accept-Encoding")
+    return response
 
 
 @BLUEPRINT.route("/robots.txt", methods=["GET"])
@@ -234,6 +287,18 @@ def robots():
     return f"Sitemap: {flask.url_for('blog.sitemap', _external=True)}"
 
 
+@BLUEPRINT.route("/code.css", methods=["GET"])
+def code_stylesheet():
+    # Stylesheet for code highlighted with CSS classes (see `CODE_CSS_CLASSES`)
+    response = flask.Response(
+        renderer.get_code_stylesheet(flask.current_app.config[ConfigKeys.CODE_STYLE]),
+        mimetype="text/css",
+    )
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response
+
+
 @BLUEPRINT.route("/login", methods=["POST"])
 def login_auth():
     email = flask.request.form.get("email")